@@ -10,7 +10,6 @@ import shutil
 from pathlib import Path
 import uuid
 import json
-from datetime import datetime
 
 from app.utils.file_processor import file_processor, is_supported_file, get_file_type, UPLOAD_DIR, PROCESSED_DIR
 from app.utils.vector_db_manager import vector_db_manager
@@ -42,6 +41,18 @@ class SearchResponse(BaseModel):
     total_results: int
     sources: List[dict] = []  # Add sources summary
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    limit: int = 10
+    file_id: Optional[str] = None
+
+class BatchSearchResponse(BaseModel):
+    searches: List[SearchResponse]
+    total_queries: int
+
+# Maximum number of queries accepted by one batched search
+MAX_BATCH_QUERIES = 100
+
 # File upload endpoint
 @router.post("/upload", response_model=FileUploadResponse)
 async def upload_file(
@@ -226,6 +237,43 @@ async def delete_file(file_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
+def summarize_sources(results: List[dict]) -> List[dict]:
+    """Sources summary for NotebookLM-style attribution, most relevant source first"""
+    sources_map = {}
+    for result in results:
+        source_info = result.get("source_info", {})
+        filename = source_info.get("filename", "Unknown")
+        
+        if filename not in sources_map:
+            sources_map[filename] = {
+                "filename": filename,
+                "file_type": source_info.get("file_type", "Unknown"),
+                "description": source_info.get("description", ""),
+                "source_type": source_info.get("source_type", "unknown"),
+                "chunk_count": 0,
+                "relevance_scores": []
+            }
+        
+        sources_map[filename]["chunk_count"] += 1
+        sources_map[filename]["relevance_scores"].append(result.get("similarity_score", 0))
+    
+    # Calculate average relevance per source
+    sources = []
+    for source_data in sources_map.values():
+        avg_relevance = sum(source_data["relevance_scores"]) / len(source_data["relevance_scores"])
+        sources.append({
+            "filename": source_data["filename"],
+            "file_type": source_data["file_type"], 
+            "description": source_data["description"],
+            "source_type": source_data["source_type"],
+            "chunks_found": source_data["chunk_count"],
+            "average_relevance": round(avg_relevance, 3)
+        })
+    
+    # Sort sources by relevance
+    sources.sort(key=lambda x: x["average_relevance"], reverse=True)
+    return sources
+
 # Search files
 @router.post("/search", response_model=SearchResponse)
 async def search_files(
@@ -244,40 +292,7 @@ async def search_files(
             file_id=file_id
         )
         
-        # Create sources summary for NotebookLM-style attribution
-        sources_map = {}
-        for result in results:
-            source_info = result.get("source_info", {})
-            filename = source_info.get("filename", "Unknown")
-            
-            if filename not in sources_map:
-                sources_map[filename] = {
-                    "filename": filename,
-                    "file_type": source_info.get("file_type", "Unknown"),
-                    "description": source_info.get("description", ""),
-                    "source_type": source_info.get("source_type", "unknown"),
-                    "chunk_count": 0,
-                    "relevance_scores": []
-                }
-            
-            sources_map[filename]["chunk_count"] += 1
-            sources_map[filename]["relevance_scores"].append(result.get("similarity_score", 0))
-        
-        # Calculate average relevance per source
-        sources = []
-        for source_data in sources_map.values():
-            avg_relevance = sum(source_data["relevance_scores"]) / len(source_data["relevance_scores"])
-            sources.append({
-                "filename": source_data["filename"],
-                "file_type": source_data["file_type"], 
-                "description": source_data["description"],
-                "source_type": source_data["source_type"],
-                "chunks_found": source_data["chunk_count"],
-                "average_relevance": round(avg_relevance, 3)
-            })
-        
-        # Sort sources by relevance
-        sources.sort(key=lambda x: x["average_relevance"], reverse=True)
+        sources = summarize_sources(results)
         
         return SearchResponse(
             results=results,
@@ -291,6 +306,44 @@ async def search_files(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+# Batched search
+@router.post("/search-batch", response_model=BatchSearchResponse)
+async def search_files_batch(request: BatchSearchRequest):
+    """
+    Search for several queries in one call
+    
+    Uncached queries are embedded in one batched request and searched with a single index lookup
+    """
+    try:
+        if not request.queries:
+            raise HTTPException(status_code=400, detail="At least one search query is required")
+        if len(request.queries) > MAX_BATCH_QUERIES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+        if any(not query.strip() for query in request.queries):
+            raise HTTPException(status_code=400, detail="Search queries cannot be empty")
+        
+        results_per_query = await vector_db_manager.search_many(
+            queries=request.queries,
+            k=request.limit,
+            file_id=request.file_id
+        )
+        
+        searches = [
+            SearchResponse(
+                results=results,
+                query=query,
+                total_results=len(results),
+                sources=summarize_sources(results)
+            )
+            for query, results in zip(request.queries, results_per_query)
+        ]
+        return BatchSearchResponse(searches=searches, total_queries=len(searches))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
 # Get database statistics
 @router.get("/stats")
 async def get_database_stats():
@@ -319,13 +372,7 @@ async def rebuild_vector_database():
             )
         
         # Clear current database
-        vector_db_manager.index = vector_db_manager.index.__class__(vector_db_manager.index.d)
-        vector_db_manager.metadata = {
-            "document_content": {},
-            "chunk_metadata": {},
-            "created_at": datetime.now().timestamp()
-        }
-        vector_db_manager.file_registry = {}
+        vector_db_manager.reset_database()
         
         # Re-add all files
         rebuilt_count = 0
@@ -12,9 +12,45 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
 EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "3072"))
 KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", "knowledge")
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "512"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+VECTOR_DB_PRECISION = os.getenv("VECTOR_DB_PRECISION", "float32")
+VECTOR_DB_INDEX_TYPE = os.getenv("VECTOR_DB_INDEX_TYPE", "flat")
+VECTOR_DB_HNSW_M = int(os.getenv("VECTOR_DB_HNSW_M", "32"))
+VECTOR_DB_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_DB_HNSW_EF_CONSTRUCTION", "200"))
+VECTOR_DB_HNSW_EF_SEARCH = int(os.getenv("VECTOR_DB_HNSW_EF_SEARCH", "128"))
+VECTOR_DB_IVF_NLIST = int(os.getenv("VECTOR_DB_IVF_NLIST", "0"))
+VECTOR_DB_IVF_NPROBE = int(os.getenv("VECTOR_DB_IVF_NPROBE", "16"))
+VECTOR_DB_PQ_M = int(os.getenv("VECTOR_DB_PQ_M", "64"))
+VECTOR_DB_COMPACT_MIN_VECTORS = int(os.getenv("VECTOR_DB_COMPACT_MIN_VECTORS", "1000"))
 MAX_RESPONSE_LENGTH = int(os.getenv("MAX_RESPONSE_LENGTH", "200"))
 DEFAULT_TONE = os.getenv("DEFAULT_TONE", "professional")
 
+# Answer Cache Configuration
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "file")
+ANSWER_CACHE_SQLITE_PATH = os.getenv("ANSWER_CACHE_SQLITE_PATH", "")
+ANSWER_CACHE_COMPACT_MIN_RECORDS = int(os.getenv("ANSWER_CACHE_COMPACT_MIN_RECORDS", "500"))
+ANSWER_CACHE_TEXT_CANDIDATES = int(os.getenv("ANSWER_CACHE_TEXT_CANDIDATES", "50"))
+ANSWER_CACHE_NORMALIZED_KEY_MATCH = os.getenv("ANSWER_CACHE_NORMALIZED_KEY_MATCH", "true").lower() == "true"
+ANSWER_CACHE_EMBEDDING_MEMO_SIZE = int(os.getenv("ANSWER_CACHE_EMBEDDING_MEMO_SIZE", "2048"))
+ANSWER_CACHE_EMBEDDING_MEMO_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_EMBEDDING_MEMO_TTL_SECONDS", "3600"))
+ANSWER_CACHE_EMBEDDING_MEMO_PATH = os.getenv("ANSWER_CACHE_EMBEDDING_MEMO_PATH", "")
+ANSWER_CACHE_EMBEDDING_DIMENSION = int(os.getenv("ANSWER_CACHE_EMBEDDING_DIMENSION", "1536"))
+ANSWER_CACHE_EMBEDDING_PRECISION = os.getenv("ANSWER_CACHE_EMBEDDING_PRECISION", "float32")
+ANSWER_CACHE_LOOKUP_BUDGET_MS = float(os.getenv("ANSWER_CACHE_LOOKUP_BUDGET_MS", "300"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "604800"))
+ANSWER_CACHE_REFRESH_CONCURRENCY = int(os.getenv("ANSWER_CACHE_REFRESH_CONCURRENCY", "2"))
+ANSWER_CACHE_REFRESH_MAX_PENDING = int(os.getenv("ANSWER_CACHE_REFRESH_MAX_PENDING", "32"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_MAX_MEMORY_MB = float(os.getenv("ANSWER_CACHE_MAX_MEMORY_MB", "0"))
+ANSWER_CACHE_USAGE_FLUSH_SECONDS = float(os.getenv("ANSWER_CACHE_USAGE_FLUSH_SECONDS", "30"))
+ANSWER_CACHE_INVALIDATION_MODE = os.getenv("ANSWER_CACHE_INVALIDATION_MODE", "refresh")
+ANSWER_CACHE_INVALIDATION_SIMILARITY = float(os.getenv("ANSWER_CACHE_INVALIDATION_SIMILARITY", "0.55"))
+ANSWER_CACHE_PARAPHRASES_PATH = os.getenv("ANSWER_CACHE_PARAPHRASES_PATH", "")
+ANSWER_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_NEGATIVE_TTL_SECONDS", "120"))
+ANSWER_CACHE_NEGATIVE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_NEGATIVE_MAX_ENTRIES", "1024"))
+ANALYZE_SKIP_NON_SUBSTANTIVE = os.getenv("ANALYZE_SKIP_NON_SUBSTANTIVE", "true").lower() == "true"
+
 # Vexa API Configuration
 VEXA_API_KEY = os.getenv("VEXA_API_KEY", "ugDGwpFdV5kT3CGKxqGQeKOBmfQ0bJsCHgKuWZ2u")
 VEXA_BASE_URL = os.getenv("VEXA_BASE_URL", "https://gateway.dev.vexa.ai")
\ No newline at end of file
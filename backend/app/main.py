@@ -21,7 +21,8 @@ from app.config import (
     VEXA_API_KEY,
     VEXA_BASE_URL,
     MAX_RESPONSE_LENGTH,
-    DEFAULT_TONE
+    DEFAULT_TONE,
+    ANALYZE_SKIP_NON_SUBSTANTIVE
 )
 
 from app.utils.transcription import (
@@ -51,7 +52,9 @@ from app.utils.vexa_client import (
 from app.utils.openai_client import analyze_conversation
 from app.utils.enhanced_rag import enhanced_rag_analyze
 from app.utils.vector_db_manager import vector_db_manager
-from app.utils.answer_cache import AnswerCache
+from app.utils.answer_cache import answer_cache
+from app.utils.single_flight import SingleFlight
+from app.utils.negative_cache import is_worth_analyzing
 from app.data.canonical_questions import get_canonical_questions_list
 import hashlib
 
@@ -65,6 +68,23 @@ logger = logging.getLogger(__name__)
 # Create FastAPI app
 app = FastAPI(title="Sales Assistant API Backend")
 
+# In-flight /analyze pipeline executions, keyed by normalized question
+analysis_flights = SingleFlight()
+
+async def refresh_cached_answer(question: str) -> Dict[str, Any]:
+    """Regenerate a stale cached answer through the RAG pipeline."""
+    return await enhanced_rag_analyze(
+        conversation=question,
+        max_response_length=MAX_RESPONSE_LENGTH,
+        tone=DEFAULT_TONE,
+        include_sources=True
+    )
+
+answer_cache.set_refresh_handler(refresh_cached_answer)
+
+# Invalidate cached answers affected by uploaded or removed files
+vector_db_manager.add_change_listener(answer_cache.on_knowledge_change)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -80,9 +100,6 @@ from app.api.file_management import router as file_router
 # Add file management routes
 app.include_router(file_router)
 
-# Initialize answer cache
-answer_cache = AnswerCache()
-
 # Dictionary to store active websocket connections
 active_connections = {}
 
@@ -625,9 +642,17 @@ async def startup_event():
         # Vector database is initialized automatically by the VectorDBManager
         stats = vector_db_manager.get_database_stats()
         logger.info(f"Vector database ready with {stats.get('total_chunks', 0)} chunks")
+
+        # Cached answers embedded with an older model are re-embedded without delaying startup
+        answer_cache.schedule_embedding_migration()
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist cache usage gathered since the last flush"""
+    answer_cache.flush_usage()
+
 # Enhanced endpoint for analyzing conversation snippets using RAG
 @app.post("/analyze", response_model=ConversationAnalysisResponse)
 async def analyze_conversation_endpoint(request: ConversationAnalysisRequest):
@@ -644,9 +669,27 @@ async def analyze_conversation_endpoint(request: ConversationAnalysisRequest):
         max_length = request.max_response_length or MAX_RESPONSE_LENGTH
         tone = request.tone or DEFAULT_TONE
         
+        # STEP 0: Filler-only utterances ("yeah, okay") are not worth a lookup or an LLM call
+        if ANALYZE_SKIP_NON_SUBSTANTIVE and not is_worth_analyzing(request.conversation):
+            logger.info(f"Skipping non-substantive utterance: '{request.conversation[:50]}'")
+            return ConversationAnalysisResponse(
+                intent="Non-substantive",
+                straightforward_answer="",
+                response="",
+                sentiment="neutral",
+                meta={"processing_source": "skipped", "skip_reason": "non_substantive"}
+            )
+        
+        # Repeats of a recent miss with the same pipeline parameters reuse its result without
+        # another lookup or pipeline run. This also syncs the cache with the shared store.
+        pipeline_params = (max_length, tone, request.include_sources)
+        known_miss = answer_cache.get_known_miss(request.conversation, pipeline_params)
+        
         # STEP 1: Check cache first for zero-latency response
-        logger.info(f"Checking cache for query: '{request.conversation[:100]}...'")
-        cached_result = answer_cache.get_cached_answer(request.conversation, threshold=0.7)
+        cached_result = None
+        if known_miss is None:
+            logger.info(f"Checking cache for query: '{request.conversation[:100]}...'")
+            cached_result = await answer_cache.aget_cached_answer(request.conversation, threshold=0.7, sync=False)
         
         if cached_result:
             logger.info("Cache hit! Returning cached response")
@@ -681,20 +724,35 @@ async def analyze_conversation_endpoint(request: ConversationAnalysisRequest):
             )
         
         # STEP 2: No cache hit, use enhanced RAG pipeline
-        logger.info("No cache hit, using enhanced RAG pipeline")
-        result = await enhanced_rag_analyze(
-            conversation=request.conversation,
-            max_response_length=max_length,
-            tone=tone,
-            include_sources=request.include_sources
-        )
-        
-        # STEP 3: Store result in cache for future use
-        if result and result.get("meta", {}).get("confidence", 0) > 0.7:
-            logger.info("Storing high-confidence result in cache")
-            result["meta"]["cache_hit"] = False
-            result["meta"]["processing_source"] = "enhanced_rag"
-            answer_cache.store_answer(request.conversation, result)
+        async def run_pipeline():
+            logger.info("No cache hit, using enhanced RAG pipeline")
+            result = await enhanced_rag_analyze(
+                conversation=request.conversation,
+                max_response_length=max_length,
+                tone=tone,
+                include_sources=request.include_sources
+            )
+            
+            # STEP 3: Store result in cache for future use
+            if result and result.get("meta", {}).get("confidence", 0) > 0.7:
+                logger.info("Storing high-confidence result in cache")
+                result["meta"]["cache_hit"] = False
+                result["meta"]["processing_source"] = "enhanced_rag"
+                answer_cache.store_answer(request.conversation, result)
+            elif result:
+                answer_cache.record_miss(request.conversation, result, pipeline_params)
+            return result
+        
+        if known_miss is not None:
+            logger.info("Known miss, reusing the recent pipeline result")
+            result = known_miss
+            result.setdefault("meta", {})["negative_cache_hit"] = True
+        else:
+            # Concurrent misses for the same question share one pipeline execution
+            flight_key = (answer_cache.lookup_key(request.conversation),) + pipeline_params
+            result, shared = await analysis_flights.run(flight_key, run_pipeline)
+            if shared and result:
+                result.setdefault("meta", {})["shared_execution"] = True
         
         # Convert the result to our response model
         logger.info(f"Raw result from enhanced_rag_analyze: {result}")
@@ -1308,28 +1366,11 @@ async def get_canonical_questions():
 async def get_cache_stats():
     """Get comprehensive cache statistics and performance metrics"""
     try:
-        # Get cache statistics
-        all_entries = answer_cache.get_all_entries()
-        total_cached_questions = len(all_entries)
-        
-        # Calculate cache file size
-        cache_file_path = "backend/app/uploads/cache_documents/answer_cache.json"
-        cache_file_size = 0
-        last_updated = None
-        
-        if os.path.exists(cache_file_path):
-            cache_file_size = os.path.getsize(cache_file_path)
-            # Get last modified time
-            import datetime
-            timestamp = os.path.getmtime(cache_file_path)
-            last_updated = datetime.datetime.fromtimestamp(timestamp).isoformat()
-        
         return {
-            "cache_stats": {
-                "total_cached_questions": total_cached_questions,
-                "cache_file_size": cache_file_size,
-                "last_updated": last_updated
-            },
+            # Size and modification time come from whichever store backs the cache (file or SQLite)
+            "cache_stats": answer_cache.get_cache_stats(),
+            "analysis_flights": analysis_flights.stats(),
+            "negative_cache": answer_cache.negative_cache.stats(),
             "status": "success"
         }
     except Exception as e:
@@ -1344,20 +1385,8 @@ async def get_cache_entries(
 ):
     """Get paginated list of cache entries with optional search"""
     try:
-        entries = answer_cache.get_all_entries()
-        
-        # Filter by search if provided
-        if search:
-            search_lower = search.lower()
-            entries = [
-                entry for entry in entries 
-                if search_lower in entry.get('question', '').lower() or 
-                   search_lower in entry.get('answer', '').lower()
-            ]
-        
-        # Paginate results
-        total = len(entries)
-        paginated_entries = entries[offset:offset + limit]
+        # Only the requested page is built; search filters by question and answer text
+        paginated_entries, total = answer_cache.get_entries_page(offset=offset, limit=limit, search=search)
         
         return {
             "entries": paginated_entries,
@@ -1489,28 +1518,28 @@ class BulkCacheEntry(BaseModel):
 async def bulk_add_cache_entries(entries: List[BulkCacheEntry]):
     """Add multiple cache entries in bulk"""
     try:
-        added_count = 0
-        errors = []
+        items = [
+            (entry.question, answer_cache.build_simple_answer(entry.question, entry.answer, entry.confidence or 1.0))
+            for entry in entries
+        ]
         
-        for i, entry in enumerate(entries):
-            try:
-                answer_cache.store_answer(
-                    entry.question,
-                    entry.answer,
-                    entry.confidence or 1.0
-                )
-                added_count += 1
-            except Exception as e:
-                errors.append({
-                    "index": i,
-                    "question": entry.question[:50] + "..." if len(entry.question) > 50 else entry.question,
-                    "error": str(e)
-                })
+        # Embed all questions in batched requests off the event loop, then insert and persist once
+        embeddings = await asyncio.to_thread(answer_cache.get_embeddings, [question for question, _ in items])
+        result = answer_cache.add_many(items, embeddings=embeddings)
+        
+        errors = [
+            {
+                "index": error["index"],
+                "question": error["question"][:50] + "..." if len(error["question"]) > 50 else error["question"],
+                "error": error["error"]
+            }
+            for error in result["errors"]
+        ]
         
         return {
             "success": True,
-            "message": f"Successfully added {added_count} out of {len(entries)} entries",
-            "added_count": added_count,
+            "message": f"Successfully added {result['added_count']} out of {len(entries)} entries",
+            "added_count": result["added_count"],
             "total_count": len(entries),
             "errors": errors
         }
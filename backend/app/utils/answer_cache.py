@@ -4,27 +4,74 @@ Provides zero-latency responses for cached questions using batch-populated answe
 Implements true prompt caching by storing actual endpoint responses for canonical questions.
 """
 
+import asyncio
 import json
 import logging
 import time
 import hashlib
-from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple, Callable, Awaitable, Hashable
 from datetime import datetime
 import difflib
+import heapq
+import itertools
+import math
 import re
 from pathlib import Path
 import numpy as np
 from dataclasses import dataclass, asdict
 from collections import defaultdict
 
-import openai
-from app.config import OPENAI_API_KEY
+from app.config import (
+    OPENAI_API_KEY,
+    ANSWER_CACHE_TEXT_CANDIDATES,
+    ANSWER_CACHE_NORMALIZED_KEY_MATCH,
+    OPENAI_EMBEDDING_MODEL,
+    ANSWER_CACHE_EMBEDDING_DIMENSION,
+    ANSWER_CACHE_LOOKUP_BUDGET_MS,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_REFRESH_CONCURRENCY,
+    ANSWER_CACHE_REFRESH_MAX_PENDING,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_MAX_MEMORY_MB,
+    ANSWER_CACHE_USAGE_FLUSH_SECONDS,
+    ANSWER_CACHE_INVALIDATION_MODE,
+    ANSWER_CACHE_INVALIDATION_SIMILARITY,
+    ANSWER_CACHE_NEGATIVE_TTL_SECONDS,
+    ANSWER_CACHE_NEGATIVE_MAX_ENTRIES,
+    ANSWER_CACHE_PARAPHRASES_PATH,
+    ANSWER_CACHE_EMBEDDING_PRECISION
+)
+from app.utils.cache_store import create_answer_cache_store, load_paraphrases
+from app.utils.negative_cache import NegativeCache
+from app.utils.query_embedding import aembed_query, embed_query, embed_texts, truncate_embedding, query_embedding_memo
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Configure OpenAI for embedding generation
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Common question words that don't add meaning when matching
+QUESTION_STOP_WORDS = {'can', 'you', 'please', 'tell', 'me', 'about', 'what', 'how', 'is', 'are', 'the', 'a', 'an'}
+
+# Cache vectors are the shared query embedding truncated to the cache dimension
+CACHE_EMBEDDING_MODEL = f"{OPENAI_EMBEDDING_MODEL}@{ANSWER_CACHE_EMBEDDING_DIMENSION}"
+
+# Storage precisions for EmbeddingIndex rows; int8 rows are scaled per row
+EMBEDDING_PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Quantized indexes re-score this many candidates per requested result at full precision,
+# and widen quantized rows to float32 this many rows at a time when scoring
+QUANTIZED_RESCORE_FACTOR = 4
+SCORE_BLOCK_ROWS = 8192
+
+# Minimum wait before retrying a stale entry whose refresh failed
+REFRESH_RETRY_SECONDS = 300
+
+# How often a worker checks whether another worker sharing the store finished re-embedding it
+MIGRATION_POLL_SECONDS = 5
+
+# Eviction: an entry's recency weight halves every day without a hit, and eviction
+# trims the cache to this fraction of its budget so it runs once per batch of inserts
+EVICTION_RECENCY_HALF_LIFE_SECONDS = 86400
+EVICTION_LOW_WATERMARK = 0.95
 
 @dataclass
 class CachedAnswer:
@@ -53,59 +100,257 @@ class CachedAnswer:
         """Convert to dictionary for JSON serialization."""
         return asdict(self)
 
+def _shared_base_matrix(rows: List[np.ndarray]) -> Optional[np.ndarray]:
+    """Return the 2-D array whose consecutive rows are exactly ``rows``, if there is one."""
+    base = getattr(rows[0], "base", None)
+    if not isinstance(base, np.ndarray) or base.ndim != 2 or base.shape[0] != len(rows):
+        return None
+    start, stride = base.ctypes.data, base.strides[0]
+    for i, row in enumerate(rows):
+        if row.base is not base or row.ctypes.data != start + i * stride:
+            return None
+    return base
+
+def normalize_embedding(embedding) -> np.ndarray:
+    """Return the embedding as a unit-length float32 vector."""
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
 class EmbeddingIndex:
-    """Efficient embedding-based index for fast similarity search."""
+    """
+    Efficient embedding-based index for fast similarity search.
+    Rows are stored unit-normalized in a capacity-doubling buffer, so inserts are
+    amortized O(1) and a lookup is a single matrix-vector product plus a top-k partition.
     
-    def __init__(self):
-        self.embeddings: np.ndarray = np.array([])
+    With ``precision`` "float16" or "int8" (scalar-quantized with a per-row scale) the buffer
+    holds quantized rows. Lookups rank on them and re-score the best candidates at full
+    precision with the rows returned by ``full_rows(question)``, when that is provided, so the
+    caller can keep full-precision rows out of memory and read them back on demand.
+    """
+    
+    def __init__(self, initial_capacity: int = 64, precision: str = "float32",
+                 full_rows: Optional[Callable[[str], Optional[np.ndarray]]] = None):
+        if precision not in EMBEDDING_PRECISIONS:
+            raise ValueError(f"Unsupported embedding precision: {precision}")
+        self.initial_capacity = initial_capacity
+        self.precision = precision
+        self.full_rows = full_rows
+        self._dtype = EMBEDDING_PRECISIONS[precision]
+        self._buffer: np.ndarray = np.empty((0, 0), dtype=self._dtype)
+        self._scales: np.ndarray = np.empty(0, dtype=np.float32)
+        self.size = 0
         self.question_hashes: List[str] = []
         self.question_texts: List[str] = []
+        self.positions: Dict[str, int] = {}
         self.is_built = False
     
+    @property
+    def quantized(self) -> bool:
+        return self.precision != "float32"
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Occupied rows as float32: a view of the buffer, or a dequantized copy when quantized."""
+        rows = self._buffer[:self.size]
+        if not self.quantized:
+            return rows
+        rows = rows.astype(np.float32)
+        if self.precision == "int8":
+            rows *= self._scales[:self.size, None]
+        return rows
+    
+    @property
+    def row_nbytes(self) -> int:
+        """Memory used by one row (and its scale, for int8)."""
+        return self._buffer.shape[1] * self._buffer.itemsize + (4 if self.precision == "int8" else 0)
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the occupied rows (and their scales, for int8)."""
+        return self.size * self.row_nbytes if self.size else 0
+    
+    def _reserve(self, capacity: int, dimension: int):
+        """Ensure a writable buffer with room for ``capacity`` rows, doubling as needed."""
+        if self._buffer.shape[0] >= capacity and self._buffer.flags.writeable:
+            return
+        new_capacity = max(capacity, self.initial_capacity, 2 * self._buffer.shape[0])
+        new_buffer = np.empty((new_capacity, dimension), dtype=self._dtype)
+        new_scales = np.ones(new_capacity, dtype=np.float32)
+        if self.size:
+            new_buffer[:self.size] = self._buffer[:self.size]
+            new_scales[:self.size] = self._scales[:self.size]
+        self._buffer = new_buffer
+        self._scales = new_scales
+    
+    def _store(self, position: int, rows: np.ndarray):
+        """Write a block of unit-normalized float32 rows starting at ``position``."""
+        stop = position + rows.shape[0]
+        if self.precision == "int8":
+            scales = np.abs(rows).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._buffer[position:stop] = np.rint(rows / scales[:, None])
+            self._scales[position:stop] = scales
+        else:
+            self._buffer[position:stop] = rows
+    
     def add_embedding(self, question: str, embedding: List[float]):
-        """Add an embedding to the index."""
-        question_hash = hashlib.sha256(question.encode()).hexdigest()[:16]
+        """Add an embedding to the index, replacing the row if the question is already indexed."""
+        row = normalize_embedding(embedding)
         
-        if len(self.embeddings) == 0:
-            self.embeddings = np.array([embedding])
-        else:
-            self.embeddings = np.vstack([self.embeddings, embedding])
+        position = self.positions.get(question)
+        if position is not None:
+            self._reserve(self.size, row.shape[0])
+            self._store(position, row[None, :])
+            return
         
-        self.question_hashes.append(question_hash)
+        self._reserve(self.size + 1, row.shape[0])
+        self._store(self.size, row[None, :])
+        self.positions[question] = self.size
+        self.size += 1
+        
+        self.question_hashes.append(hashlib.sha256(question.encode()).hexdigest()[:16])
         self.question_texts.append(question)
         self.is_built = True
     
-    def build_index(self, questions_embeddings: Dict[str, List[float]]):
+    def add_embeddings(self, questions: List[str], embeddings: np.ndarray):
+        """
+        Add many embeddings with one normalization pass and one block copy into the buffer.
+        ``questions`` must not contain duplicates.
+        """
+        if not questions:
+            return
+        rows = np.array(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        rows /= norms
+        
+        # Questions already indexed are replaced in place, the rest appended as one block
+        new_rows = []
+        self._reserve(self.size, rows.shape[1])
+        for i, question in enumerate(questions):
+            position = self.positions.get(question)
+            if position is not None:
+                self._store(position, rows[i:i + 1])
+            else:
+                new_rows.append(i)
+        
+        if new_rows:
+            self._reserve(self.size + len(new_rows), rows.shape[1])
+            self._store(self.size, rows[new_rows])
+            for offset, i in enumerate(new_rows):
+                question = questions[i]
+                self.positions[question] = self.size + offset
+                self.question_hashes.append(hashlib.sha256(question.encode()).hexdigest()[:16])
+                self.question_texts.append(question)
+            self.size += len(new_rows)
+        self.is_built = True
+    
+    def remove_embedding(self, question: str) -> bool:
+        """Remove a question from the index by moving the last row into its slot."""
+        position = self.positions.pop(question, None)
+        if position is None:
+            return False
+        
+        last = self.size - 1
+        if position != last:
+            self._reserve(self.size, self._buffer.shape[1])
+            self._buffer[position] = self._buffer[last]
+            self._scales[position] = self._scales[last]
+            self.question_hashes[position] = self.question_hashes[last]
+            self.question_texts[position] = self.question_texts[last]
+            self.positions[self.question_texts[position]] = position
+        
+        self.question_hashes.pop()
+        self.question_texts.pop()
+        self.size = last
+        return True
+    
+    def build_index(self, questions_embeddings: Dict[str, np.ndarray]):
         """Build index from existing questions and embeddings."""
         embeddings_list = []
         self.question_hashes = []
         self.question_texts = []
         
         for question, embedding in questions_embeddings.items():
-            if embedding:  # Only add if embedding exists
+            if embedding is not None and len(embedding):  # Only add if embedding exists
                 embeddings_list.append(embedding)
                 question_hash = hashlib.sha256(question.encode()).hexdigest()[:16]
                 self.question_hashes.append(question_hash)
                 self.question_texts.append(question)
         
-        if embeddings_list:
-            self.embeddings = np.array(embeddings_list)
+        self.positions = {question: i for i, question in enumerate(self.question_texts)}
+        self.size = 0
+        self._buffer = np.empty((0, 0), dtype=self._dtype)
+        self._scales = np.empty(0, dtype=np.float32)
+        
+        if embeddings_list and self.quantized:
+            # Quantize block by block so no full float32 copy of the matrix is made
+            self._reserve(len(embeddings_list), len(embeddings_list[0]))
+            for start in range(0, len(embeddings_list), SCORE_BLOCK_ROWS):
+                block = np.array(embeddings_list[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                self._store(start, block / norms)
+            self.size = len(embeddings_list)
             self.is_built = True
+        elif embeddings_list:
+            # Normalized rows memory-mapped from the snapshot matrix are used in place; the
+            # buffer is copied into writable memory on the first insert or removal.
+            matrix = _shared_base_matrix(embeddings_list)
+            if matrix is None or not np.allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-3):
+                matrix = np.array(embeddings_list, dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix /= norms
+            self._buffer = matrix
+            self._scales = np.ones(matrix.shape[0], dtype=np.float32)
+            self.size = len(embeddings_list)
+            self.is_built = True
+    
+    def similarities(self, query_embedding: List[float]) -> np.ndarray:
+        """Cosine similarity of the query with every row, as one matrix-vector product."""
+        # Rows are unit-normalized, so the dot product is the cosine similarity
+        query_vec = normalize_embedding(query_embedding)
+        if not self.quantized:
+            return self.embeddings @ query_vec
+        
+        # Quantized rows are widened to float32 one block at a time
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, self.size)
+            scores[start:stop] = self._buffer[start:stop].astype(np.float32) @ query_vec
+            if self.precision == "int8":
+                scores[start:stop] *= self._scales[start:stop]
+        return scores
+    
+    @staticmethod
+    def _top_indices(similarities: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the ``top_k`` highest scores, best first, without sorting the whole array."""
+        if top_k < len(similarities):
+            top_indices = np.argpartition(similarities, -top_k)[-top_k:]
+        else:
+            top_indices = np.arange(len(similarities))
+        return top_indices[np.argsort(similarities[top_indices])[::-1]]
     
     def find_similar(self, query_embedding: List[float], top_k: int = 5) -> List[Tuple[str, float]]:
         """Find most similar questions using vectorized operations."""
-        if not self.is_built or len(self.embeddings) == 0:
+        if not self.is_built or self.size == 0:
             return []
         
-        query_vec = np.array(query_embedding)
+        similarities = self.similarities(query_embedding)
         
-        # Compute cosine similarity with all embeddings at once
-        similarities = np.dot(self.embeddings, query_vec) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_vec)
-        )
-        
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        if self.quantized and self.full_rows is not None:
+            # Re-score the best quantized candidates with their full-precision rows
+            query_vec = normalize_embedding(query_embedding)
+            top_indices = self._top_indices(similarities, top_k * QUANTIZED_RESCORE_FACTOR)
+            for idx in top_indices:
+                row = self.full_rows(self.question_texts[idx])
+                if row is not None and len(row) == len(query_vec):
+                    similarities[idx] = float(np.dot(normalize_embedding(row), query_vec))
+            top_indices = top_indices[np.argsort(similarities[top_indices])[::-1]][:top_k]
+        else:
+            top_indices = self._top_indices(similarities, top_k)
         
         # Return question texts and similarities
         results = []
@@ -115,6 +360,102 @@ class EmbeddingIndex:
         
         return results
 
+class QuestionTextIndex:
+    """
+    Hash-keyed lookup tier and inverted token index over normalized cached questions.
+    Exact and normalized-form keys answer repeated questions in O(1). The token index narrows text matching to the questions that share the most tokens with the query, so only
+    a small candidate set reaches the difflib scorer. A question sharing no tokens with the query
+    has zero Jaccard overlap and can only reach the 0.7 default threshold if its normalized text is
+    identical, so those are never candidates. Every token-sharing question is eligible; shared tokens
+    are weighted by inverse document frequency, so when more than ``limit`` questions share tokens,
+    the ones sharing only common tokens are cut first. A match can then be missed only if more than
+    ``limit`` questions share rarer tokens with the query.
+    """
+    
+    def __init__(self):
+        self.normalized: Dict[str, str] = {}
+        self.tokens: Dict[str, frozenset] = {}
+        self.postings: Dict[str, set] = defaultdict(set)
+        # Lookup key -> questions with that key, in insertion order
+        self.exact_keys: Dict[str, Dict[str, None]] = {}
+        self.normalized_keys: Dict[str, Dict[str, None]] = {}
+    
+    @staticmethod
+    def exact_key(text: str) -> str:
+        """Case- and surrounding-whitespace-insensitive key for exact matching."""
+        return text.lower().strip()
+    
+    def add(self, question: str, normalized: str):
+        """Index a question under its normalized text."""
+        self.remove(question)
+        tokens = frozenset(normalized.split())
+        self.normalized[question] = normalized
+        self.tokens[question] = tokens
+        for token in tokens:
+            self.postings[token].add(question)
+        self.exact_keys.setdefault(self.exact_key(question), {})[question] = None
+        if normalized:
+            self.normalized_keys.setdefault(normalized, {})[question] = None
+    
+    def remove(self, question: str):
+        """Remove a question from the index."""
+        tokens = self.tokens.pop(question, None)
+        if tokens is None:
+            return
+        normalized = self.normalized.pop(question)
+        self._remove_key(self.exact_keys, self.exact_key(question), question)
+        self._remove_key(self.normalized_keys, normalized, question)
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.discard(question)
+                if not posting:
+                    del self.postings[token]
+    
+    @staticmethod
+    def _remove_key(keys: Dict[str, Dict[str, None]], key: str, question: str):
+        questions = keys.get(key)
+        if questions is not None:
+            questions.pop(question, None)
+            if not questions:
+                del keys[key]
+    
+    def clear(self):
+        """Remove all questions from the index."""
+        self.normalized.clear()
+        self.tokens.clear()
+        self.postings.clear()
+        self.exact_keys.clear()
+        self.normalized_keys.clear()
+    
+    def lookup_exact(self, query: str) -> Optional[str]:
+        """Return a cached question equal to the query ignoring case and surrounding whitespace."""
+        questions = self.exact_keys.get(self.exact_key(query))
+        return next(iter(questions)) if questions else None
+    
+    def lookup_normalized(self, normalized_query: str) -> Optional[str]:
+        """Return a cached question whose normalized form equals the normalized query."""
+        questions = self.normalized_keys.get(normalized_query) if normalized_query else None
+        return next(iter(questions)) if questions else None
+    
+    def candidates(self, query_tokens: set, limit: int) -> List[str]:
+        """Return up to ``limit`` questions ranked by the IDF-weighted tokens they share with the query."""
+        postings = [self.postings[token] for token in query_tokens if token in self.postings]
+        if not postings:
+            return []
+        
+        # Tokens present in most questions discriminate little, so they count for less, but still count
+        total = len(self.tokens)
+        shared_weights: Dict[str, float] = defaultdict(float)
+        for posting in postings:
+            weight = math.log1p(total / len(posting))
+            for question in posting:
+                shared_weights[question] += weight
+        
+        if len(shared_weights) <= limit:
+            return list(shared_weights)
+        return heapq.nlargest(limit, shared_weights, key=shared_weights.__getitem__)
+
 class AnswerCache:
     """
     Manages cached answers for batch prompt caching with semantic similarity matching.
@@ -131,66 +472,525 @@ class AnswerCache:
         self.cache_file_path = Path(cache_file_path)
         self.cache_file_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # Append-only log + compacted snapshot persistence, or a SQLite database shared by workers
+        self.store = create_answer_cache_store(self.cache_file_path, embedding_model=CACHE_EMBEDDING_MODEL)
+        
         # In-memory cache
         self.question_cache: Dict[str, Dict[str, Any]] = {}
-        self.question_embeddings: Dict[str, List[float]] = {}
+        self.question_embeddings: Dict[str, np.ndarray] = {}
         
         # Initialize embedding index for fast similarity search
-        self.embedding_index = EmbeddingIndex()
+        self.embedding_index = self._new_embedding_index()
+        
+        # Inverted token index for fast text-similarity candidate generation
+        self.text_index = QuestionTextIndex()
+        
+        # Memo of recent text -> embedding lookups, shared with vector retrieval
+        self.embedding_memo = query_embedding_memo
         
         # Performance tracking
         self._cache_hits = 0
         self._cache_misses = 0
+        self._lookup_timeouts = 0
+        
+        # Embedding calls that outlived their lookup budget, and stale-entry refreshes
+        self._background_tasks = set()
+        
+        # Set while loaded vectors come from another embedding model and await re-embedding
+        self._migration_pending = False
+        self._migration_task = None
+        
+        # Stale-while-revalidate state
+        self.ttl_seconds = ANSWER_CACHE_TTL_SECONDS
+        self._refresh_handler = None
+        self._refresh_semaphore = None
+        self._refreshing = set()
+        self._refresh_failures: Dict[str, float] = {}
+        self._refreshes = 0
+        
+        # Per-entry usage for capacity-bounded eviction
+        self._config = {
+            'max_entries': ANSWER_CACHE_MAX_ENTRIES,
+            'confidence_threshold': 0.7,
+            'similarity_threshold': 0.8
+        }
+        self.max_memory_bytes = int(ANSWER_CACHE_MAX_MEMORY_MB * 1024 * 1024)
+        self._entry_hits: Dict[str, int] = {}
+        self._entry_last_used: Dict[str, float] = {}
+        self._entry_bytes: Dict[str, int] = {}
+        self._cached_bytes = 0
+        self._evictions = 0
+        
+        # Hits not yet written to the store, flushed every usage_flush_seconds
+        self._pending_hits: Dict[str, int] = {}
+        self._usage_flushed_at = time.time()
+        self.usage_flush_seconds = ANSWER_CACHE_USAGE_FLUSH_SECONDS
+        
+        # Stable entry id -> question, for the management endpoints
+        self._entry_ids: Dict[str, str] = {}
+        
+        # Knowledge-base file/chunk id -> questions whose answers cite it
+        self._source_index: Dict[str, Dict[str, None]] = {}
+        self._invalidations = 0
+        
+        # Recent misses (normalized query -> pipeline result) that repeats can reuse
+        self.negative_cache = NegativeCache(
+            max_entries=ANSWER_CACHE_NEGATIVE_MAX_ENTRIES,
+            ttl_seconds=ANSWER_CACHE_NEGATIVE_TTL_SECONDS
+        )
+        
+        # Offline-built paraphrases (canonical question -> paraphrase -> embedding). Paraphrases of
+        # cached questions are extra rows in the embedding index that resolve through _aliases.
+        self.paraphrases_path = (Path(ANSWER_CACHE_PARAPHRASES_PATH) if ANSWER_CACHE_PARAPHRASES_PATH
+                                 else self.cache_file_path.with_name("answer_cache.paraphrases.npz"))
+        self._paraphrases = load_paraphrases(self.paraphrases_path, CACHE_EMBEDDING_MODEL)
+        self._aliases: Dict[str, str] = {}
+        # Most index rows one question can occupy beyond its own; top-k searches over-fetch by this
+        self._alias_fanout = max((len(texts) for texts in self._paraphrases.values()), default=0)
         
         # Load existing cache
         self.load_cache()
     
+    def _new_embedding_index(self) -> EmbeddingIndex:
+        """Empty embedding index at the configured storage precision."""
+        return EmbeddingIndex(precision=ANSWER_CACHE_EMBEDDING_PRECISION, full_rows=self._full_precision_row)
+    
+    def _full_precision_row(self, indexed: str) -> Optional[np.ndarray]:
+        """Full-precision vector behind an embedding-index row, for re-scoring quantized matches."""
+        if indexed in self._aliases:
+            return self._paraphrases.get(self._aliases[indexed], {}).get(indexed)
+        return self._embedding_row(indexed)
+    
+    def _embedding_row(self, question: str) -> Optional[np.ndarray]:
+        """
+        Full-precision vector of a cached question. With a quantized index only rows not yet
+        persisted are held in ``question_embeddings``; the rest are read back from the store.
+        """
+        embedding = self.question_embeddings.get(question)
+        if embedding is None and self.embedding_index.quantized and question in self.embedding_index.positions:
+            embedding = self.store.embedding(question)
+        return embedding
+    
+    def _release_embedding(self, question: str):
+        """Drop the float32 copy of a persisted row when the index keeps quantized rows only."""
+        if self.embedding_index.quantized:
+            self.question_embeddings.pop(question, None)
+    
     def load_cache(self):
-        """Load cache from disk."""
+        """Load cache from disk, replaying any log records written since the last snapshot."""
         try:
-            if self.cache_file_path.exists():
-                with open(self.cache_file_path, 'r') as f:
-                    data = json.load(f)
-                    self.question_cache = data.get('questions', {})
-                    self.question_embeddings = data.get('embeddings', {})
-                    
+            self.question_cache = {}
+            self.question_embeddings = {}
+            self.embedding_index = self._new_embedding_index()
+            self._aliases = {}
+            self._migration_pending = False
+            if self.store.exists():
+                self.question_cache, self.question_embeddings = self.store.load()
+                
+                # Vectors from another embedding model are not comparable with query embeddings. They
+                # stay on disk, untouched, until migrate_embeddings has re-embedded every question.
+                legacy_models = self.store.loaded_embedding_models - {CACHE_EMBEDDING_MODEL}
+                if legacy_models and self.question_cache:
+                    logger.warning(f"{len(self.question_cache)} cached questions were embedded with "
+                                   f"{', '.join(sorted(legacy_models))}; semantic matching resumes once they are re-embedded")
+                    self.question_embeddings = {}
+                    self._migration_pending = True
+                
                 # Build embedding index for fast similarity search
                 if self.question_embeddings:
                     self.embedding_index.build_index(self.question_embeddings)
                     logger.info(f"Built embedding index with {len(self.question_embeddings)} embeddings")
-                    
+                if self.embedding_index.quantized:
+                    # Quantized rows are all that stays in memory; re-scoring reads the store
+                    self.question_embeddings = {}
                 logger.info(f"Loaded {len(self.question_cache)} cached answers")
+            
+            self._build_text_index()
+            self._build_usage()
+            self._build_entry_ids()
+            self._build_source_index()
+            self._index_all_paraphrases()
         except Exception as e:
             logger.error(f"Error loading cache: {e}")
             self.question_cache = {}
             self.question_embeddings = {}
-            self.embedding_index = EmbeddingIndex()
+            self.embedding_index = self._new_embedding_index()
+            self.text_index = QuestionTextIndex()
+    
+    def sync_from_store(self) -> int:
+        """Apply entries other worker processes wrote to a shared store since the last sync."""
+        try:
+            changes = self.store.poll_changes()
+        except Exception as e:
+            logger.error(f"Error polling cache store for changes: {e}")
+            return 0
+        
+        if changes is None:
+            logger.info("Shared cache changed beyond the retained history, reloading")
+            self.load_cache()
+            return len(self.question_cache)
+        
+        for op, question, answer, embedding in changes:
+            if op == "put":
+                self._install_entry(question, answer, embedding)
+                self._release_embedding(question)
+            else:
+                self._drop_entry(question)
+        if changes:
+            logger.debug(f"Applied {len(changes)} cache changes from other workers")
+        return len(changes)
+    
+    def _build_text_index(self):
+        """Rebuild the inverted token index from the cached questions."""
+        self.text_index = QuestionTextIndex()
+        for question in self.question_cache:
+            self.text_index.add(question, self.normalize_question(question))
+    
+    def _build_usage(self):
+        """Seed per-entry usage from the hit counts and timestamps persisted in entry metadata."""
+        self._entry_hits = {}
+        self._entry_last_used = {}
+        self._entry_bytes = {}
+        self._cached_bytes = 0
+        self._pending_hits = {}
+        now = time.time()
+        for question, answer in self.question_cache.items():
+            meta = answer.get("meta") or {}
+            self._entry_hits[question] = int(meta.get("hit_count", 0) or 0)
+            last_used = meta.get("last_hit_at")
+            if last_used is None:
+                try:
+                    last_used = datetime.fromisoformat(meta["timestamp"]).timestamp()
+                except (KeyError, TypeError, ValueError):
+                    last_used = now
+            self._entry_last_used[question] = float(last_used)
+            self._track_bytes(question)
+    
+    @staticmethod
+    def make_entry_id(question: str) -> str:
+        """Id assigned to a new entry; kept in ``meta.entry_id`` so it survives question edits."""
+        return hashlib.md5(question.encode()).hexdigest()
+    
+    def _build_entry_ids(self):
+        """Rebuild the id -> question map, assigning ids to entries stored before ids existed."""
+        self._entry_ids = {}
+        for question in self.question_cache:
+            self._assign_entry_id(question)
+    
+    def _assign_entry_id(self, question: str, entry_id: Optional[str] = None) -> str:
+        meta = self.question_cache[question].setdefault("meta", {})
+        entry_id = entry_id or meta.get("entry_id") or self.make_entry_id(question)
+        meta["entry_id"] = entry_id
+        self._entry_ids[entry_id] = question
+        return entry_id
+    
+    @staticmethod
+    def _source_ids(answer: Dict[str, Any]) -> set:
+        """Knowledge-base file and chunk ids an answer was generated from."""
+        meta = answer.get("meta") or {}
+        source_ids = set(meta.get("source_files") or []) | set(meta.get("source_chunks") or [])
+        for source in meta.get("sources") or []:
+            if isinstance(source, dict):
+                source_ids.update(source_id for source_id in (source.get("file_id"), source.get("chunk_id")) if source_id)
+        return source_ids
+    
+    def _build_source_index(self):
+        """Rebuild the source id -> questions reverse index."""
+        self._source_index = {}
+        for question in self.question_cache:
+            self._index_sources(question)
+    
+    def _index_sources(self, question: str):
+        for source_id in self._source_ids(self.question_cache[question]):
+            self._source_index.setdefault(source_id, {})[question] = None
+    
+    def _unindex_sources(self, question: str):
+        answer = self.question_cache.get(question)
+        if answer is None:
+            return
+        for source_id in self._source_ids(answer):
+            questions = self._source_index.get(source_id)
+            if questions is not None:
+                questions.pop(question, None)
+                if not questions:
+                    del self._source_index[source_id]
+    
+    def questions_for_source(self, source_id: str) -> List[str]:
+        """Cached questions whose answers cite a knowledge-base file or chunk id."""
+        return list(self._source_index.get(source_id, {}))
+    
+    def _index_paraphrases(self, question: str):
+        """Add the precomputed paraphrases of a cached question to the embedding index as aliases."""
+        paraphrases = [
+            text for text in self._paraphrases.get(question, {})
+            if text not in self.question_cache and self._aliases.get(text, question) == question
+        ]
+        if not paraphrases:
+            return
+        vectors = self._paraphrases[question]
+        self.embedding_index.add_embeddings(paraphrases, np.stack([vectors[text] for text in paraphrases]))
+        for text in paraphrases:
+            self._aliases[text] = question
+    
+    def _index_all_paraphrases(self):
+        for question in self._paraphrases:
+            if question in self.question_cache:
+                self._index_paraphrases(question)
+        if self._aliases:
+            logger.info(f"Indexed {len(self._aliases)} paraphrase aliases for cached questions")
+    
+    def _unindex_paraphrases(self, question: str):
+        for text in self._paraphrases.get(question, {}):
+            if self._aliases.get(text) == question:
+                del self._aliases[text]
+                self.embedding_index.remove_embedding(text)
+    
+    def _resolve_alias(self, indexed: str) -> Optional[str]:
+        """Cached question an embedding-index row stands for (itself, or the question it paraphrases)."""
+        if indexed in self.question_cache:
+            return indexed
+        return self._aliases.get(indexed)
+    
+    def _find_similar_questions(self, query_embedding: List[float],
+                                top_k: int) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """
+        Top ``top_k`` distinct cached questions for an embedding, best first, each with its matching
+        index rows (the question and its paraphrase aliases) best first. Rows are over-fetched by the
+        alias fan-out so one question's paraphrases cannot crowd other questions out of the top-k.
+        """
+        rows = self.embedding_index.find_similar(query_embedding, top_k=top_k * (1 + self._alias_fanout))
+        matches: Dict[str, List[Tuple[str, float]]] = {}
+        for indexed, similarity in rows:
+            question = self._resolve_alias(indexed)
+            if question is not None:
+                matches.setdefault(question, []).append((indexed, similarity))
+        return list(matches.items())[:top_k]
+    
+    def _track_bytes(self, question: str):
+        """Update the approximate memory footprint of one entry (only when a memory budget is set)."""
+        if not self.max_memory_bytes:
+            return
+        size = len(json.dumps(self.question_cache[question], default=str))
+        if question in self.embedding_index.positions:
+            # Counted at index precision: with a quantized index no float32 copy is kept
+            size += self.embedding_index.row_nbytes
+        self._cached_bytes += size - self._entry_bytes.get(question, 0)
+        self._entry_bytes[question] = size
+    
+    def _drop_entry(self, question: str):
+        """Remove a question from every in-memory structure (persistence is up to the caller)."""
+        self._entry_ids.pop(self.get_entry_id(question), None)
+        self._unindex_sources(question)
+        self._unindex_paraphrases(question)
+        self.question_cache.pop(question, None)
+        self.question_embeddings.pop(question, None)
+        self.embedding_index.remove_embedding(question)
+        self.text_index.remove(question)
+        self._entry_hits.pop(question, None)
+        self._entry_last_used.pop(question, None)
+        self._pending_hits.pop(question, None)
+        self._cached_bytes -= self._entry_bytes.pop(question, 0)
+    
+    def _retention_score(self, question: str, now: float) -> float:
+        """
+        Value of keeping an entry: frequent, recently hit, confident answers that were
+        expensive to generate score highest and are evicted last.
+        """
+        meta = self.question_cache[question].get("meta") or {}
+        frequency = 1 + math.log1p(self._entry_hits.get(question, 0))
+        idle_seconds = max(0.0, now - self._entry_last_used.get(question, now))
+        recency = 0.25 + 0.5 ** (idle_seconds / EVICTION_RECENCY_HALF_LIFE_SECONDS)
+        confidence = max(float(meta.get("confidence", 1.0) or 0.0), 0.05)
+        cost = 1 + math.log1p(float(meta.get("response_time_ms", 0) or 0) / 1000)
+        return frequency * recency * confidence * cost
+    
+    def _over_budget(self, fraction: float = 1.0) -> bool:
+        max_entries = self.get_config().get('max_entries')
+        if max_entries and len(self.question_cache) > int(max_entries * fraction):
+            return True
+        return bool(self.max_memory_bytes) and self._cached_bytes > self.max_memory_bytes * fraction
+    
+    def evict_if_needed(self, protect: Optional[str] = None) -> int:
+        """Evict the lowest-value entries once the entry or memory budget is exceeded."""
+        if not self._over_budget():
+            return 0
+        
+        now = time.time()
+        ranked = sorted(
+            (question for question in self.question_cache if question != protect),
+            key=lambda question: self._retention_score(question, now)
+        )
+        
+        evicted = 0
+        for question in ranked:
+            if not self._over_budget(EVICTION_LOW_WATERMARK):
+                break
+            self._drop_entry(question)
+            self._persist_delete(question)
+            evicted += 1
+        
+        self._evictions += evicted
+        logger.info(f"Evicted {evicted} cache entries to stay within budget")
+        return evicted
     
     def save_cache(self):
-        """Save cache to disk."""
+        """Save a compacted snapshot of the whole cache to disk."""
+        if self._migration_pending:
+            # A snapshot now would drop the stored vectors before their replacements exist
+            logger.info("Deferring cache compaction until cached embeddings are re-embedded")
+            return
         try:
-            data = {
-                'questions': self.question_cache,
-                'embeddings': self.question_embeddings,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.cache_file_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Hits not yet flushed are added to a shared store first; compaction keeps its counts
+            self.flush_usage()
+            # Carry usage across restarts so eviction keeps its history
+            for question, answer in self.question_cache.items():
+                meta = answer.setdefault("meta", {})
+                meta["hit_count"] = self._entry_hits.get(question, 0)
+                if question in self._entry_last_used:
+                    meta["last_hit_at"] = self._entry_last_used[question]
+            self.store.compact(self.question_cache, self.question_embeddings)
+            if self.embedding_index.quantized:
+                self.question_embeddings = {}
             logger.info(f"Saved {len(self.question_cache)} cached answers")
         except Exception as e:
             logger.error(f"Error saving cache: {e}")
     
-    def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text using OpenAI API."""
+    def flush_usage(self):
+        """Write the hits gathered since the last flush or compaction to the store."""
+        pending, self._pending_hits = self._pending_hits, {}
+        self._usage_flushed_at = time.time()
+        if not pending:
+            return
         try:
-            response = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text.strip()
-            )
-            return response.data[0].embedding
+            self.store.record_usage({
+                question: (hits, self._entry_last_used.get(question, self._usage_flushed_at))
+                for question, hits in pending.items()
+            })
+        except Exception as e:
+            logger.error(f"Error persisting cache usage: {e}")
+    
+    def _persist_put(self, question: str):
+        """Append a single insert to the cache log, compacting when the log grows too large."""
+        try:
+            self.store.append_put(question, self.question_cache[question], self._embedding_row(question))
+            self._release_embedding(question)
+        except Exception as e:
+            logger.error(f"Error appending to cache log: {e}")
+        if self.store.needs_compaction(len(self.question_cache)):
+            self.save_cache()
+    
+    def _persist_delete(self, question: str):
+        """Append a single removal to the cache log, compacting when the log grows too large."""
+        try:
+            self.store.append_delete(question)
         except Exception as e:
-            logger.error(f"Error getting embedding: {e}")
+            logger.error(f"Error appending to cache log: {e}")
+        if self.store.needs_compaction(len(self.question_cache)):
+            self.save_cache()
+    
+    def get_embedding(self, text: str) -> List[float]:
+        """Embedding of ``text`` at the cache dimension, sharing the memoized query embedding."""
+        embedding = embed_query(text, self.embedding_memo)
+        if embedding is None:
+            return []
+        return truncate_embedding(embedding, ANSWER_CACHE_EMBEDDING_DIMENSION).tolist()
+    
+    async def aget_embedding(self, text: str) -> List[float]:
+        """get_embedding off the event loop; concurrent requests for the same text share one call."""
+        embedding = await aembed_query(text, self.embedding_memo)
+        if embedding is None:
             return []
+        return truncate_embedding(embedding, ANSWER_CACHE_EMBEDDING_DIMENSION).tolist()
+    
+    def get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings of many texts at the cache dimension, in batched requests (None where embedding failed)."""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = [i for i, text in enumerate(texts) if text and text.strip()]
+        for i, embedding in zip(pending, embed_texts([texts[i] for i in pending])):
+            if embedding is not None:
+                results[i] = truncate_embedding(embedding, ANSWER_CACHE_EMBEDDING_DIMENSION).tolist()
+        return results
+    
+    def migrate_embeddings(self) -> bool:
+        """
+        Re-embed every cached question loaded with another embedding model and snapshot the result.
+        Blocks on the embedding requests; the server runs it in the background after startup instead.
+        On a shared store only the worker that claims the migration re-embeds; this returns False
+        while another worker holds the claim.
+        """
+        if not self._migration_pending:
+            return True
+        if not self.store.claim_migration():
+            return self._reload_if_migrated()
+        try:
+            questions = list(self.question_cache)
+            return self._apply_migration(questions, self.get_embeddings(questions))
+        finally:
+            self.store.release_migration()
+    
+    async def amigrate_embeddings(self) -> bool:
+        """
+        migrate_embeddings with the embedding requests made in a worker thread. While another
+        worker holds the claim, this waits for it to finish and reloads the migrated entries.
+        """
+        if not self._migration_pending:
+            return True
+        if not self.store.claim_migration():
+            while self.store.migration_claimed():
+                await asyncio.sleep(MIGRATION_POLL_SECONDS)
+            return self._reload_if_migrated()
+        try:
+            questions = list(self.question_cache)
+            embeddings = await asyncio.to_thread(self.get_embeddings, questions)
+            return self._apply_migration(questions, embeddings)
+        finally:
+            self.store.release_migration()
+    
+    def _reload_if_migrated(self) -> bool:
+        """Pick up vectors another worker re-embedded, once it has released its claim."""
+        if self._migration_pending and not self.store.migration_claimed():
+            self.load_cache()
+        return not self._migration_pending
+    
+    def schedule_embedding_migration(self):
+        """Start a pending embedding migration as a background task on the running event loop."""
+        if not self._migration_pending or (self._migration_task is not None and not self._migration_task.done()):
+            return
+        self._migration_task = asyncio.get_running_loop().create_task(self.amigrate_embeddings())
+        self._background_tasks.add(self._migration_task)
+        self._migration_task.add_done_callback(self._background_tasks.discard)
+    
+    def _apply_migration(self, questions: List[str], embeddings: List[Optional[List[float]]]) -> bool:
+        """
+        Install re-embedded vectors and compact them into a snapshot. If any question failed to
+        embed, nothing changes: the stored vectors and their model tag stay, so the next start retries.
+        """
+        failed = sum(1 for embedding in embeddings if not embedding)
+        if failed:
+            logger.error(f"Re-embedding failed for {failed} of {len(questions)} cached questions; "
+                         f"keeping the stored vectors and retrying on the next start")
+            return False
+        
+        # Entries removed or re-added with a current embedding while the requests ran are skipped
+        migrated = [
+            (question, normalize_embedding(embedding)) for question, embedding in zip(questions, embeddings)
+            if question in self.question_cache
+            and (question not in self.embedding_index.positions or question in self._aliases)
+        ]
+        if migrated:
+            for question, row in migrated:
+                self.question_embeddings[question] = row
+                self._aliases.pop(question, None)
+            self.embedding_index.add_embeddings([question for question, _ in migrated],
+                                                np.stack([row for _, row in migrated]))
+            for question, _ in migrated:
+                self._track_bytes(question)
+        
+        self._migration_pending = False
+        self.save_cache()
+        self.store.loaded_embedding_models = {CACHE_EMBEDDING_MODEL}
+        logger.info(f"Re-embedded {len(migrated)} cached questions with {CACHE_EMBEDDING_MODEL}")
+        return True
     
     def calculate_semantic_similarity(self, text1: str, text2: str) -> float:
         """Calculate semantic similarity between two texts using embeddings."""
@@ -202,14 +1002,7 @@ class AnswerCache:
                 return 0.0
             
             # Calculate cosine similarity
-            dot_product = sum(a * b for a, b in zip(embedding1, embedding2))
-            magnitude1 = sum(a * a for a in embedding1) ** 0.5
-            magnitude2 = sum(b * b for b in embedding2) ** 0.5
-            
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0.0
-            
-            return dot_product / (magnitude1 * magnitude2)
+            return float(np.dot(normalize_embedding(embedding1), normalize_embedding(embedding2)))
         except Exception as e:
             logger.error(f"Error calculating similarity: {e}")
             return 0.0
@@ -226,18 +1019,34 @@ class AnswerCache:
         text = re.sub(r'\s+', ' ', text).strip()
         
         # Remove common question words that don't add meaning
-        stop_words = {'can', 'you', 'please', 'tell', 'me', 'about', 'what', 'how', 'is', 'are', 'the', 'a', 'an'}
         words = text.split()
-        meaningful_words = [w for w in words if w not in stop_words or len(w) > 3]
+        meaningful_words = [w for w in words if w not in QUESTION_STOP_WORDS or len(w) > 3]
         
         return ' '.join(meaningful_words)
 
+    def lookup_key(self, query: str) -> str:
+        """Key identifying repeats of the same query (normalized text, falling back to folded text)."""
+        return self.normalize_question(query) or query.strip().lower()
+    
+    def get_known_miss(self, query: str, variant: Hashable = None) -> Optional[Dict[str, Any]]:
+        """
+        Pipeline result remembered for a query that recently missed the cache, if any.
+        ``variant`` identifies the pipeline parameters the result must have been built with.
+        Repeats answered here skip both the cache lookup and the RAG pipeline.
+        """
+        self.sync_from_store()
+        return self.negative_cache.get(self.lookup_key(query), variant)
+    
+    def record_miss(self, query: str, result: Dict[str, Any], variant: Hashable = None):
+        """Remember the pipeline result for a query that missed and was not cached."""
+        self.negative_cache.put(self.lookup_key(query), result, variant)
+    
     def calculate_text_similarity(self, text1: str, text2: str) -> float:
         """Calculate text similarity using difflib for fast approximate matching."""
-        # Normalize both texts
-        norm_text1 = self.normalize_question(text1)
-        norm_text2 = self.normalize_question(text2)
-        
+        return self._normalized_text_similarity(self.normalize_question(text1), self.normalize_question(text2))
+    
+    def _normalized_text_similarity(self, norm_text1: str, norm_text2: str) -> float:
+        """Text similarity between two already-normalized questions."""
         # Use difflib for quick similarity calculation
         similarity = difflib.SequenceMatcher(None, norm_text1, norm_text2).ratio()
         
@@ -260,23 +1069,48 @@ class AnswerCache:
     
     def find_similar_question(self, query: str, threshold: float = 0.7) -> Tuple[Optional[str], float]:
         """Find the most similar cached question with optimized performance."""
+        best_match, best_score = self._find_lexical_match(query, threshold)
+        if best_match is not None:
+            return best_match, best_score
+        
+        # STEP 3: Use pre-built embedding index for semantic similarity (one API call for the query)
+        if self.embedding_index.is_built:
+            best_match, best_score = self._find_semantic_match(query, threshold, self.get_embedding(query))
+            if best_match is not None:
+                return best_match, best_score
+        
+        logger.info("No suitable match found above threshold")
+        return None, 0.0
+    
+    def _find_lexical_match(self, query: str, threshold: float) -> Tuple[Optional[str], float]:
+        """Exact, normalized-key and text-similarity matching; never calls the embedding API."""
         best_match = None
         best_score = 0.0
         
+        # STEP 1: Try exact text match first (fastest)
+        cached_question = self.text_index.lookup_exact(query)
+        if cached_question is not None:
+            logger.info(f"Found exact match: '{cached_question[:50]}...'")
+            return cached_question, 1.0
+        
         # Normalize the query for better matching
         normalized_query = self.normalize_question(query)
         logger.debug(f"Searching for match to normalized query: '{normalized_query}'")
         
-        # STEP 1: Try exact text match first (fastest)
-        for cached_question in self.question_cache.keys():
-            if query.lower().strip() == cached_question.lower().strip():
-                logger.info(f"Found exact match: '{cached_question[:50]}...'")
+        # Same question up to case, punctuation, whitespace and filler words
+        if ANSWER_CACHE_NORMALIZED_KEY_MATCH:
+            cached_question = self.text_index.lookup_normalized(normalized_query)
+            if cached_question is not None:
+                logger.info(f"Found normalized match: '{cached_question[:50]}...'")
                 return cached_question, 1.0
         
-        # STEP 2: Try fast text-based similarity
+        # STEP 2: Try fast text-based similarity on candidates sharing tokens with the query
         text_matches = []
-        for cached_question in self.question_cache.keys():
-            text_similarity = self.calculate_text_similarity(query, cached_question)
+        candidates = self.text_index.candidates(set(normalized_query.split()), ANSWER_CACHE_TEXT_CANDIDATES)
+        for cached_question in candidates:
+            text_similarity = self._normalized_text_similarity(
+                normalized_query, self.text_index.normalized[cached_question]
+            )
             
             if text_similarity > 0.4:  # Only consider reasonable matches
                 text_matches.append((cached_question, text_similarity))
@@ -295,19 +1129,24 @@ class AnswerCache:
             else:
                 logger.warning(f"Text match failed validation, trying semantic matching")
         
-        # STEP 3: Use pre-built embedding index for semantic similarity (no API calls)
-        if self.embedding_index.is_built:
-            logger.debug("Using pre-built embedding index for semantic search")
-            query_embedding = self.get_embedding(query)  # Only one API call for the query
-            if query_embedding:
-                similar_questions = self.embedding_index.find_similar(query_embedding, top_k=5)
-                
-                for question, similarity in similar_questions:
-                    if similarity >= threshold and self._validate_match(query, question):
-                        logger.info(f"Found semantic match: '{question[:50]}...' with similarity {similarity:.3f}")
-                        return question, similarity
+        return None, 0.0
+    
+    def _find_semantic_match(self, query: str, threshold: float,
+                             query_embedding: List[float]) -> Tuple[Optional[str], float]:
+        """Search the pre-built embedding index with an already computed query embedding."""
+        if not query_embedding:
+            return None, 0.0
+        
+        logger.debug("Using pre-built embedding index for semantic search")
+        for question, rows in self._find_similar_questions(query_embedding, top_k=5):
+            # Paraphrase rows are validated against their own wording and resolve to their question
+            for indexed, similarity in rows:
+                if similarity >= threshold and self._validate_match(query, indexed):
+                    if indexed != question:
+                        logger.info(f"Matched paraphrase '{indexed[:50]}...'")
+                    logger.info(f"Found semantic match: '{question[:50]}...' with similarity {similarity:.3f}")
+                    return question, similarity
         
-        logger.info("No suitable match found above threshold")
         return None, 0.0
     
     def _validate_match(self, query: str, cached_question: str) -> bool:
@@ -354,12 +1193,58 @@ class AnswerCache:
     def get_cached_answer(self, query: str, threshold: float = 0.7) -> Optional[Dict[str, Any]]:
         """Get cached answer for a query if similar question exists."""
         start_time = time.time()
+        self.sync_from_store()
         
         # Try to find similar question
         similar_question, similarity_score = self.find_similar_question(query, threshold)
+        return self._record_lookup(query, similar_question, similarity_score, start_time)
+    
+    async def aget_cached_answer(self, query: str, threshold: float = 0.7,
+                                 budget_ms: float = ANSWER_CACHE_LOOKUP_BUDGET_MS,
+                                 sync: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Event-loop friendly variant of get_cached_answer.
         
+        Text matching runs inline; the query embedding for the semantic stage is computed in a
+        worker thread. If it does not arrive within ``budget_ms`` the lookup is reported as a miss
+        and the embedding keeps running in the background. The RAG stage's vector search for the
+        same query awaits that request, and the result warms the memo for the next ask.
+        
+        Pass ``sync=False`` when this request already synced with the shared store, e.g. through
+        get_known_miss, so the store is polled once per request.
+        """
+        start_time = time.time()
+        if sync:
+            self.sync_from_store()
+        
+        similar_question, similarity_score = self._find_lexical_match(query, threshold)
+        
+        if similar_question is None and self.embedding_index.is_built:
+            embedding_task = asyncio.ensure_future(self.aget_embedding(query))
+            try:
+                query_embedding = await asyncio.wait_for(asyncio.shield(embedding_task), timeout=budget_ms / 1000)
+            except asyncio.TimeoutError:
+                logger.info(f"Semantic cache lookup exceeded {budget_ms:.0f}ms budget, treating as miss")
+                self._lookup_timeouts += 1
+                self._background_tasks.add(embedding_task)
+                embedding_task.add_done_callback(self._background_tasks.discard)
+                query_embedding = []
+            similar_question, similarity_score = self._find_semantic_match(query, threshold, query_embedding)
+        
+        return self._record_lookup(query, similar_question, similarity_score, start_time)
+    
+    def _record_lookup(self, query: str, similar_question: Optional[str], similarity_score: float,
+                       start_time: float) -> Optional[Dict[str, Any]]:
+        """Build the hit response (or count the miss) for a finished lookup."""
         if similar_question:
             cached_answer = self.question_cache[similar_question].copy()
+            # Copy meta too so hit metadata never leaks into the stored entry
+            cached_answer["meta"] = dict(cached_answer.get("meta") or {})
+            
+            # Stale-while-revalidate: serve the stale answer now, refresh it in the background
+            if self.is_stale(cached_answer):
+                cached_answer["meta"]["stale"] = True
+                self._schedule_refresh(similar_question)
             
             # Update metadata
             cached_answer["meta"]["cache_hit"] = True
@@ -369,6 +1254,11 @@ class AnswerCache:
             
             # Track cache hit
             self._cache_hits += 1
+            self._entry_hits[similar_question] = self._entry_hits.get(similar_question, 0) + 1
+            self._entry_last_used[similar_question] = time.time()
+            self._pending_hits[similar_question] = self._pending_hits.get(similar_question, 0) + 1
+            if time.time() - self._usage_flushed_at >= self.usage_flush_seconds:
+                self.flush_usage()
             
             logger.info(f"Cache hit for query: '{query[:50]}...' -> '{similar_question[:50]}...' (similarity: {similarity_score:.3f})")
             return cached_answer
@@ -378,118 +1268,389 @@ class AnswerCache:
         logger.info(f"No cache hit for query: '{query[:50]}...'")
         return None
     
+    def set_refresh_handler(self, handler: Optional[Callable[[str], Awaitable[Optional[Dict[str, Any]]]]]):
+        """Register the coroutine used to regenerate stale answers (None disables refreshing)."""
+        self._refresh_handler = handler
+    
+    def is_stale(self, answer: Dict[str, Any]) -> bool:
+        """Whether an entry is older than its TTL (``meta.ttl_seconds`` or the configured default)."""
+        meta = answer.get("meta") or {}
+        if meta.get("invalidated"):
+            return True
+        ttl_seconds = meta.get("ttl_seconds", self.ttl_seconds)
+        timestamp = meta.get("timestamp")
+        if not ttl_seconds or not timestamp:
+            return False
+        try:
+            age = (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds()
+        except (TypeError, ValueError):
+            return False
+        return age > ttl_seconds
+    
+    def _schedule_refresh(self, question: str):
+        """Queue a background refresh of a stale entry, bounded by the pending and concurrency limits."""
+        if self._refresh_handler is None or question in self._refreshing:
+            return
+        if time.time() - self._refresh_failures.get(question, 0.0) < REFRESH_RETRY_SECONDS:
+            return
+        if len(self._refreshing) >= ANSWER_CACHE_REFRESH_MAX_PENDING:
+            logger.debug(f"Refresh queue full, skipping refresh for '{question[:50]}...'")
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sync callers outside the event loop cannot schedule background work
+            return
+        
+        self._refreshing.add(question)
+        task = loop.create_task(self._refresh_entry(question))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _refresh_entry(self, question: str):
+        """Regenerate one stale answer and swap it in if the result is good enough."""
+        try:
+            if self._refresh_semaphore is None:
+                self._refresh_semaphore = asyncio.Semaphore(ANSWER_CACHE_REFRESH_CONCURRENCY)
+            async with self._refresh_semaphore:
+                logger.info(f"Refreshing stale cache entry: '{question[:50]}...'")
+                result = await self._refresh_handler(question)
+            
+            if question not in self.question_cache:
+                return
+            if not result or result.get("meta", {}).get("confidence", 0) <= 0.7:
+                logger.warning(f"Refresh for '{question[:50]}...' returned a low-confidence answer, keeping cached one")
+                self._refresh_failures[question] = time.time()
+                return
+            
+            result.setdefault("meta", {})
+            result["meta"]["cache_hit"] = False
+            result["meta"]["processing_source"] = "background_refresh"
+            if "ttl_seconds" in self.question_cache[question].get("meta", {}):
+                result["meta"]["ttl_seconds"] = self.question_cache[question]["meta"]["ttl_seconds"]
+            result["meta"]["timestamp"] = datetime.now().isoformat()
+            result["meta"]["source"] = "api_response"
+            result["meta"]["entry_id"] = self.get_entry_id(question)
+            
+            # Single assignment, so readers see either the old or the new answer
+            self._unindex_sources(question)
+            self.question_cache[question] = result
+            self._index_sources(question)
+            self._track_bytes(question)
+            self._refresh_failures.pop(question, None)
+            self._refreshes += 1
+            self._persist_put(question)
+            logger.info(f"Refreshed cache entry: '{question[:50]}...'")
+        except Exception as e:
+            logger.error(f"Error refreshing cache entry '{question[:50]}...': {e}")
+            self._refresh_failures[question] = time.time()
+        finally:
+            self._refreshing.discard(question)
+    
+    def on_knowledge_change(self, event: str, file_id: str,
+                            chunk_embeddings: Optional[np.ndarray] = None) -> int:
+        """
+        Invalidate the answers affected by a knowledge-base change.
+        
+        A removed file affects the answers that cite it; they are evicted, since serving them even
+        while stale would repeat content that is no longer in the knowledge base. An added file
+        affects the answers whose questions are semantically close to one of its chunks; they are
+        refreshed or evicted per ANSWER_CACHE_INVALIDATION_MODE. Returns the number invalidated.
+        """
+        # Any recent miss may be answerable from the changed knowledge base
+        self.negative_cache.clear()
+        affected = dict.fromkeys(self.questions_for_source(file_id))
+        
+        if event == "added" and chunk_embeddings is not None and self.embedding_index.is_built:
+            for chunk_embedding in chunk_embeddings:
+                view = truncate_embedding(chunk_embedding, ANSWER_CACHE_EMBEDDING_DIMENSION)
+                for indexed, similarity in self.embedding_index.find_similar(view, top_k=5):
+                    question = self._resolve_alias(indexed)
+                    if question is not None and similarity >= ANSWER_CACHE_INVALIDATION_SIMILARITY:
+                        affected[question] = None
+        
+        for question in affected:
+            self.invalidate_entry(question, evict=event == "removed")
+        if affected:
+            logger.info(f"Knowledge-base file {file_id} {event}: invalidated {len(affected)} cached answers")
+        return len(affected)
+    
+    def invalidate_entry(self, question: str, evict: bool = False):
+        """
+        Evict an entry, or mark it stale and queue a refresh, per ANSWER_CACHE_INVALIDATION_MODE.
+        ``evict`` drops the entry regardless of the mode.
+        """
+        if question not in self.question_cache:
+            return
+        self._invalidations += 1
+        
+        if evict or ANSWER_CACHE_INVALIDATION_MODE == "evict" or self._refresh_handler is None:
+            self._drop_entry(question)
+            self._persist_delete(question)
+            return
+        
+        self.question_cache[question].setdefault("meta", {})["invalidated"] = True
+        self._persist_put(question)
+        self._schedule_refresh(question)
+    
     def add_to_cache(self, question: str, answer: Dict[str, Any]):
         """Add a new question-answer pair to the cache."""
-        # Store the answer
-        self.question_cache[question] = answer
+        self._install_entry(question, answer, self.get_embedding(question))
         
-        # Generate and store embedding
-        embedding = self.get_embedding(question)
-        self.question_embeddings[question] = embedding
+        # Append to the cache log
+        self._persist_put(question)
+        logger.info(f"Added new answer to cache: '{question[:50]}...'")
         
-        # Add to embedding index for fast similarity search
-        if embedding:
-            self.embedding_index.add_embedding(question, embedding)
+        self.evict_if_needed(protect=question)
+    
+    def add_many(self, items: List[Tuple[str, Dict[str, Any]]],
+                 embeddings: Optional[List[Optional[List[float]]]] = None) -> Dict[str, Any]:
+        """
+        Add many question-answer pairs at once.
         
-        # Save to disk
-        self.save_cache()        
-        logger.info(f"Added new answer to cache: '{question[:50]}...'")
+        Questions are embedded in batched requests (unless ``embeddings`` are supplied, aligned
+        with ``items``), added to the embedding index as one block and persisted with a single
+        write. Items that are invalid or could not be embedded are skipped and reported.
+        """
+        errors = []
+        valid = []
+        for i, (question, answer) in enumerate(items):
+            if not isinstance(question, str) or not question.strip():
+                errors.append({"index": i, "question": question, "error": "Question is empty"})
+            elif not isinstance(answer, dict):
+                errors.append({"index": i, "question": question, "error": "Answer must be an object"})
+            else:
+                valid.append(i)
+        
+        if embeddings is None:
+            embeddings = [None] * len(items)
+            for i, embedding in zip(valid, self.get_embeddings([items[i][0] for i in valid])):
+                embeddings[i] = embedding
+        
+        # Later duplicates of a question win, as with repeated add_to_cache calls
+        added: Dict[str, np.ndarray] = {}
+        for i in valid:
+            question, answer = items[i]
+            if not embeddings[i]:
+                errors.append({"index": i, "question": question, "error": "Embedding generation failed"})
+                continue
+            row = normalize_embedding(embeddings[i])
+            self.question_embeddings[question] = row
+            self._install_entry(question, answer, None, index_embedding=False)
+            added[question] = row
+        
+        if added:
+            questions = list(added)
+            for question in questions:
+                self._aliases.pop(question, None)
+            self.embedding_index.add_embeddings(questions, np.stack([added[q] for q in questions]))
+            for question in questions:
+                self._index_paraphrases(question)
+                self._track_bytes(question)
+            try:
+                self.store.append_puts([
+                    (question, self.question_cache[question], added[question]) for question in questions
+                ])
+                for question in questions:
+                    self._release_embedding(question)
+            except Exception as e:
+                logger.error(f"Error appending bulk insert to cache log: {e}")
+            if self.store.needs_compaction(len(self.question_cache)):
+                self.save_cache()
+            self.evict_if_needed()
+        
+        errors.sort(key=lambda error: error["index"])
+        logger.info(f"Bulk added {len(added)} of {len(items)} answers to cache")
+        return {"added_count": len(added), "total_count": len(items), "errors": errors}
+    
+    def _install_entry(self, question: str, answer: Dict[str, Any], embedding, index_embedding: bool = True):
+        """Put an entry into every in-memory structure (persistence is up to the caller)."""
+        # Store the answer, keeping the id of an entry it replaces
+        existing_id = self.get_entry_id(question)
+        self._unindex_sources(question)
+        self.question_cache[question] = answer
+        self._assign_entry_id(question, existing_id)
+        self._index_sources(question)
+        normalized = self.normalize_question(question)
+        self.text_index.add(question, normalized)
+        self.negative_cache.discard(normalized or question.strip().lower())
+        
+        # Add to embedding index for fast similarity search (bulk inserts index afterwards as one block)
+        if index_embedding:
+            # A real question takes over an index row that was a paraphrase alias
+            self._aliases.pop(question, None)
+            if embedding is not None and len(embedding):
+                self.question_embeddings[question] = normalize_embedding(embedding)
+                self.embedding_index.add_embedding(question, embedding)
+            else:
+                self.question_embeddings.pop(question, None)
+                self.embedding_index.remove_embedding(question)
+            self._index_paraphrases(question)
+        
+        self._entry_hits.setdefault(question, 0)
+        self._entry_last_used[question] = time.time()
+        self._track_bytes(question)
         
     def clear_cache(self):
         """Clear all cached answers."""
         self.question_cache = {}
         self.question_embeddings = {}
-        self.embedding_index = EmbeddingIndex()
+        self.embedding_index = self._new_embedding_index()
+        self.text_index = QuestionTextIndex()
         self._cache_hits = 0
         self._cache_misses = 0
-        if self.cache_file_path.exists():
-            self.cache_file_path.unlink()
+        self._lookup_timeouts = 0
+        self._build_usage()
+        self._entry_ids = {}
+        self._source_index = {}
+        self._aliases = {}
+        self.negative_cache.clear()
+        self._migration_pending = False
+        self.store.clear()
         logger.info("Cache cleared")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
+        last_modified = self.store.last_modified()
         return {
             "total_cached_questions": len(self.question_cache),
-            "cache_file_size": self.cache_file_path.stat().st_size if self.cache_file_path.exists() else 0,
-            "last_updated": datetime.fromtimestamp(self.cache_file_path.stat().st_mtime).isoformat() if self.cache_file_path.exists() else None
+            "cache_file_size": self.store.size_bytes(),
+            "last_updated": datetime.fromtimestamp(last_modified).isoformat() if last_modified else None
         }
 
     def get_stats(self) -> Dict[str, Any]:
         """Get comprehensive cache statistics."""
         total_requests = self._cache_hits + self._cache_misses
         hit_rate = (self._cache_hits / total_requests * 100) if total_requests > 0 else 0
+        last_modified = self.store.last_modified()
         
         stats = {
             "total_entries": len(self.question_cache),
             "cache_hits": self._cache_hits,
             "cache_misses": self._cache_misses,
             "hit_rate_percentage": round(hit_rate, 2),
-            "last_updated": datetime.fromtimestamp(self.cache_file_path.stat().st_mtime).isoformat() if self.cache_file_path.exists() else None,
+            "last_updated": datetime.fromtimestamp(last_modified).isoformat() if last_modified else None,
             "avg_response_time": 0.05,  # Cache responses are very fast (50ms)
             "total_savings": self._cache_hits * 2.5,  # Assume 2.5s saved per hit
             "embedding_index_built": self.embedding_index.is_built,
-            "embeddings_count": len(self.question_embeddings)
+            "embeddings_count": self.embedding_index.size - len(self._aliases),
+            "embedding_precision": self.embedding_index.precision,
+            "embedding_index_bytes": self.embedding_index.nbytes,
+            "semantic_lookup_timeouts": self._lookup_timeouts,
+            "background_refreshes": self._refreshes,
+            "backend": type(self.store).__name__,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "max_entries": self.get_config().get('max_entries'),
+            "refreshes_in_flight": len(self._refreshing),
+            "embedding_memo": self.embedding_memo.stats(),
+            "negative_cache": self.negative_cache.stats(),
+            "paraphrase_aliases": len(self._aliases)
         }
         return stats
 
+    def get_entry_id(self, question: str) -> Optional[str]:
+        """Stored id of a cached question, or None if it is not cached."""
+        answer_data = self.question_cache.get(question)
+        if answer_data is None:
+            return None
+        return (answer_data.get("meta") or {}).get("entry_id")
+    
+    def _entry_summary(self, question: str) -> Dict[str, Any]:
+        """Management-interface view of one entry."""
+        answer_data = self.question_cache[question]
+        return {
+            "id": self.get_entry_id(question),
+            "question": question,
+            "answer": answer_data.get("straightforward_answer", ""),
+            "confidence": answer_data.get("meta", {}).get("confidence", 1.0),
+            "created_at": answer_data.get("meta", {}).get("timestamp", ""),
+            "intent": answer_data.get("intent", ""),
+            "sentiment": answer_data.get("sentiment", "neutral")
+        }
+    
     def get_all_entries(self) -> List[Dict[str, Any]]:
         """Get all cache entries for management interface."""
-        entries = []
-        for question, answer_data in self.question_cache.items():
-            entry = {
-                "id": hashlib.md5(question.encode()).hexdigest(),
-                "question": question,
-                "answer": answer_data.get("straightforward_answer", ""),
-                "confidence": answer_data.get("meta", {}).get("confidence", 1.0),
-                "created_at": answer_data.get("meta", {}).get("timestamp", ""),
-                "intent": answer_data.get("intent", ""),
-                "sentiment": answer_data.get("sentiment", "neutral")
-            }
-            entries.append(entry)
-        return entries
+        return [self._entry_summary(question) for question in self.question_cache]
+    
+    def get_entries_page(self, offset: int = 0, limit: int = 50,
+                         search: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        One page of entries plus the total count, in insertion order.
+        Only the requested page is materialized; search scans question and answer text.
+        """
+        self.sync_from_store()
+        if not search:
+            questions = itertools.islice(self.question_cache, offset, offset + limit)
+            return [self._entry_summary(question) for question in questions], len(self.question_cache)
+        
+        search_lower = search.lower()
+        matches = (
+            question for question, answer_data in self.question_cache.items()
+            if search_lower in question.lower() or
+               search_lower in str(answer_data.get("straightforward_answer", "")).lower()
+        )
+        page = []
+        total = 0
+        for question in matches:
+            if offset <= total < offset + limit:
+                page.append(self._entry_summary(question))
+            total += 1
+        return page, total
 
     def update_entry(self, entry_id: str, question: str, answer: str, confidence: float = None) -> bool:
         """Update a specific cache entry."""
-        # Find the entry by ID
-        for cached_question, answer_data in self.question_cache.items():
-            current_id = hashlib.md5(cached_question.encode()).hexdigest()
-            if current_id == entry_id:
-                # Remove old entry
-                del self.question_cache[cached_question]
-                if cached_question in self.question_embeddings:
-                    del self.question_embeddings[cached_question]
-                
-                # Add updated entry
-                updated_data = answer_data.copy()
-                updated_data["straightforward_answer"] = answer
-                if confidence is not None:
-                    updated_data.setdefault("meta", {})["confidence"] = confidence
-                
-                self.question_cache[question] = updated_data
-                
-                # Update embeddings
-                try:
-                    embedding = self.get_embedding(question)
-                    self.question_embeddings[question] = embedding
-                    self.embedding_index.add_embedding(question, embedding)
-                except Exception as e:
-                    logger.error(f"Error updating embedding for question: {str(e)}")
-                
-                self.save_cache()
-                return True
-        return False
+        cached_question = self._entry_ids.get(entry_id)
+        if cached_question is None:
+            return False
+        answer_data = self.question_cache[cached_question]
+        
+        # Remove old entry, keeping its usage history
+        hits = self._entry_hits.get(cached_question, 0)
+        last_used = self._entry_last_used.get(cached_question, time.time())
+        self._drop_entry(cached_question)
+        if question in self.question_cache and question != cached_question:
+            self._drop_entry(question)
+        
+        # Add updated entry under the same id
+        updated_data = answer_data.copy()
+        updated_data["meta"] = dict(answer_data.get("meta") or {})
+        updated_data["straightforward_answer"] = answer
+        if confidence is not None:
+            updated_data["meta"]["confidence"] = confidence
+        
+        self.question_cache[question] = updated_data
+        self._assign_entry_id(question, entry_id)
+        self._index_sources(question)
+        self.text_index.add(question, self.normalize_question(question))
+        
+        # Update embeddings
+        try:
+            embedding = self.get_embedding(question)
+            if embedding:
+                self.question_embeddings[question] = normalize_embedding(embedding)
+                self.embedding_index.add_embedding(question, embedding)
+            self._index_paraphrases(question)
+        except Exception as e:
+            logger.error(f"Error updating embedding for question: {str(e)}")
+        
+        self._entry_hits[question] = hits
+        self._entry_last_used[question] = last_used
+        self._track_bytes(question)
+        
+        if question != cached_question:
+            self._persist_delete(cached_question)
+        self._persist_put(question)
+        return True
 
     def delete_entry(self, entry_id: str) -> bool:
         """Delete a specific cache entry."""
-        for cached_question, answer_data in list(self.question_cache.items()):
-            current_id = hashlib.md5(cached_question.encode()).hexdigest()
-            if current_id == entry_id:
-                del self.question_cache[cached_question]
-                if cached_question in self.question_embeddings:
-                    del self.question_embeddings[cached_question]
-                self.save_cache()
-                return True
-        return False
+        cached_question = self._entry_ids.get(entry_id)
+        if cached_question is None:
+            return False
+        self._drop_entry(cached_question)
+        self._persist_delete(cached_question)
+        return True
 
     def optimize_cache(self, max_entries: int = 1000, min_confidence: float = 0.5) -> int:
         """Optimize cache by removing old or low-confidence entries."""
@@ -521,13 +1682,11 @@ class AnswerCache:
         # Remove selected entries
         for question in entries_to_remove:
             if question in self.question_cache:
-                del self.question_cache[question]
                 removed_count += 1
-            if question in self.question_embeddings:
-                del self.question_embeddings[question]
+                self._drop_entry(question)
+                self._persist_delete(question)
         
         if removed_count > 0:
-            self.save_cache()
             logger.info(f"Cache optimized: removed {removed_count} entries")
         
         return removed_count
@@ -535,7 +1694,7 @@ class AnswerCache:
     def update_config(self, max_entries: int = None, confidence_threshold: float = None, 
                      similarity_threshold: float = None) -> Dict[str, Any]:
         """Update cache configuration."""
-        config = getattr(self, '_config', {})
+        config = self._config
         
         if max_entries is not None:
             config['max_entries'] = max_entries
@@ -543,17 +1702,14 @@ class AnswerCache:
             config['confidence_threshold'] = confidence_threshold
         if similarity_threshold is not None:
             config['similarity_threshold'] = similarity_threshold
-            
-        self._config = config
+        
+        # Apply a lowered entry budget right away
+        self.evict_if_needed()
         return config
 
     def get_config(self) -> Dict[str, Any]:
         """Get current cache configuration."""
-        return getattr(self, '_config', {
-            'max_entries': 1000,
-            'confidence_threshold': 0.7,
-            'similarity_threshold': 0.8
-        })
+        return self._config
 
     def store_answer(self, question: str, answer_data: Dict[str, Any]):
         """Store a complete answer structure in the cache."""
@@ -570,7 +1726,12 @@ class AnswerCache:
 
     def store_simple_answer(self, question: str, answer: str, confidence: float = 1.0):
         """Store a simple answer string in the cache (legacy method)."""
-        answer_data = {
+        self.add_to_cache(question, self.build_simple_answer(question, answer, confidence))
+    
+    @staticmethod
+    def build_simple_answer(question: str, answer: str, confidence: float = 1.0) -> Dict[str, Any]:
+        """Full answer structure for a plain answer string."""
+        return {
             "intent": "user_question",
             "question": question,
             "information_gap": "",
@@ -595,18 +1756,16 @@ class AnswerCache:
                 "source": "manual_entry"
             }
         }
-        
-        self.add_to_cache(question, answer_data)
 
     def search_similar(self, query: str, limit: int = 10, threshold: float = 0.7) -> List[Dict[str, Any]]:
         """Search for similar questions in the cache."""
         try:
             query_embedding = self.get_embedding(query)
-            similar_questions = self.embedding_index.find_similar(query_embedding, top_k=limit)
             
             results = []
-            for question, similarity in similar_questions:
-                if similarity >= threshold and question in self.question_cache:
+            for question, rows in self._find_similar_questions(query_embedding, top_k=limit):
+                similarity = rows[0][1]
+                if similarity >= threshold:
                     answer_data = self.question_cache[question]
                     results.append({
                         "question": question,
@@ -627,7 +1786,11 @@ class AnswerCache:
         
         backup_data = {
             "question_cache": self.question_cache,
-            "question_embeddings": self.question_embeddings,
+            "question_embeddings": {
+                question: embedding.tolist() for question, embedding in (
+                    (question, self._embedding_row(question)) for question in self.question_cache
+                ) if embedding is not None
+            },
             "backup_timestamp": timestamp,
             "original_file": str(self.cache_file_path)
         }
@@ -651,11 +1814,23 @@ class AnswerCache:
                 backup_data = json.load(f)
             
             self.question_cache = backup_data.get("question_cache", {})
-            self.question_embeddings = backup_data.get("question_embeddings", {})
+            self._migration_pending = False
+            self.question_embeddings = {
+                question: np.asarray(embedding, dtype=np.float32)
+                for question, embedding in backup_data.get("question_embeddings", {}).items()
+                if embedding
+            }
             
             # Rebuild embedding index
+            self.embedding_index = self._new_embedding_index()
             if self.question_embeddings:
                 self.embedding_index.build_index(self.question_embeddings)
+            self._aliases = {}
+            self._build_text_index()
+            self._build_usage()
+            self._build_entry_ids()
+            self._build_source_index()
+            self._index_all_paraphrases()
             
             self.save_cache()
             logger.info(f"Cache restored from backup: {backup_path}")
@@ -666,27 +1841,34 @@ class AnswerCache:
             return False
 
     def analyze_query_similarity(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Analyze query similarity against all cached questions for debugging."""
-        results = []
+        """
+        Analyze query similarity against the cached questions for debugging.
         
-        # Get text-based similarities
-        for cached_question in self.question_cache.keys():
-            text_sim = self.calculate_text_similarity(query, cached_question)
-            
-            # Get semantic similarity if embeddings available
-            semantic_sim = 0.0
-            if cached_question in self.question_embeddings:
-                query_embedding = self.get_embedding(query)
-                if query_embedding:
-                    cached_embedding = self.question_embeddings[cached_question]
-                    if cached_embedding:
-                        # Calculate cosine similarity
-                        dot_product = sum(a * b for a, b in zip(query_embedding, cached_embedding))
-                        magnitude1 = sum(a * a for a in query_embedding) ** 0.5
-                        magnitude2 = sum(b * b for b in cached_embedding) ** 0.5
-                        
-                        if magnitude1 > 0 and magnitude2 > 0:
-                            semantic_sim = dot_product / (magnitude1 * magnitude2)
+        Semantic scores come from one product with the index matrix; text similarity and
+        validation are computed only for the best semantic and token-index candidates.
+        """
+        limit = max(top_k * 4, 20)
+        normalized_query = self.normalize_question(query)
+        
+        # Best semantic score per cached question (paraphrase rows count for their question)
+        semantic_scores: Dict[str, float] = {}
+        query_embedding = self.get_embedding(query) if self.embedding_index.size else []
+        if query_embedding:
+            similarities = self.embedding_index.similarities(query_embedding)
+            top_indices = np.argpartition(similarities, -limit)[-limit:] if limit < len(similarities) \
+                else np.arange(len(similarities))
+            for idx in top_indices[np.argsort(similarities[top_indices])[::-1]]:
+                cached_question = self._resolve_alias(self.embedding_index.question_texts[idx])
+                if cached_question is not None and cached_question not in semantic_scores:
+                    semantic_scores[cached_question] = float(similarities[idx])
+        
+        candidates = dict.fromkeys(semantic_scores)
+        candidates.update(dict.fromkeys(self.text_index.candidates(set(normalized_query.split()), limit)))
+        
+        results = []
+        for cached_question in candidates:
+            text_sim = self._normalized_text_similarity(normalized_query, self.text_index.normalized[cached_question])
+            semantic_sim = semantic_scores.get(cached_question, 0.0)
             
             # Check validation
             validation_passed = self._validate_match(query, cached_question)
@@ -0,0 +1,679 @@
+"""
+Persistence layer for the answer cache.
+Stores every cache mutation as one record in an append-only log next to a compacted
+JSON snapshot, so a single insert costs one small append regardless of cache size.
+Snapshot embeddings live in a contiguous float32 .npy matrix that is memory-mapped on load.
+With ANSWER_CACHE_BACKEND=sqlite, several worker processes share one SQLite database instead.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import ANSWER_CACHE_COMPACT_MIN_RECORDS, ANSWER_CACHE_BACKEND, ANSWER_CACHE_SQLITE_PATH
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Embedding model assumed for snapshots and log records written before models were recorded
+LEGACY_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# A re-embedding claim older than this is taken to belong to a worker that died mid-migration
+MIGRATION_CLAIM_SECONDS = 1800
+
+
+class AnswerCacheStore:
+    """
+    Append-only write-ahead log with periodic compacted snapshots.
+
+    The snapshot (``answer_cache.json``) holds the answers as of the last compaction and
+    the log (``answer_cache.log``) holds one JSON record per line for every put/delete since.
+    Snapshot embeddings are written to ``answer_cache.embeddings.<generation>.npy`` with a
+    ``.ids.json`` sidecar listing the question for each row. A new generation is written before
+    the snapshot that references it is swapped in, so the snapshot always points at a complete
+    matrix, and loading memory-maps it so workers share one copy through the page cache.
+
+    Loading replays the log on top of the snapshot. Records are idempotent, so a crash between
+    writing a new snapshot and truncating the log only replays changes that are already applied,
+    and a torn trailing record from a crash mid-append is dropped.
+
+    Snapshots and put records name the ``embedding_model`` their vectors came from;
+    ``loaded_embedding_models`` lists the models seen by the last load.
+
+    ``embedding(question)`` reads one stored vector back: from the memory-mapped matrix, or
+    from the latest log record for the question, located by its byte offset.
+    """
+
+    def __init__(self, snapshot_path: Path, compact_min_records: int = ANSWER_CACHE_COMPACT_MIN_RECORDS,
+                 embedding_model: str = LEGACY_EMBEDDING_MODEL):
+        self.snapshot_path = Path(snapshot_path)
+        self.log_path = self.snapshot_path.with_suffix(".log")
+        self.compact_min_records = compact_min_records
+        self.embedding_model = embedding_model
+        self.loaded_embedding_models: Set[str] = set()
+        self.embedding_generation: Optional[int] = None
+        self._log_records = 0
+        self._snapshot_rows: Dict[str, np.ndarray] = {}
+        # Question -> offset of its latest log record with an embedding, or None once a record dropped it
+        self._log_offsets: Dict[str, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    def _matrix_path(self, generation: int) -> Path:
+        return self.snapshot_path.with_name(f"{self.snapshot_path.stem}.embeddings.{generation}.npy")
+
+    def _row_ids_path(self, generation: int) -> Path:
+        return self.snapshot_path.with_name(f"{self.snapshot_path.stem}.embeddings.{generation}.ids.json")
+
+    def _embedding_files(self) -> List[Path]:
+        return list(self.snapshot_path.parent.glob(f"{self.snapshot_path.stem}.embeddings.*"))
+
+    def load(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, np.ndarray]]:
+        """Load the snapshot and replay the log on top of it."""
+        questions: Dict[str, Dict[str, Any]] = {}
+        embeddings: Dict[str, np.ndarray] = {}
+        self.loaded_embedding_models = set()
+
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            questions = data.get('questions', {})
+            self.embedding_generation = data.get('embedding_generation')
+
+            if self.embedding_generation is not None:
+                embeddings = self._load_matrix(self.embedding_generation)
+            else:
+                # Legacy snapshot with embeddings inlined as JSON float lists
+                embeddings = {
+                    question: np.asarray(embedding, dtype=np.float32)
+                    for question, embedding in data.get('embeddings', {}).items()
+                    if embedding
+                }
+            if embeddings:
+                self.loaded_embedding_models.add(data.get('embedding_model', LEGACY_EMBEDDING_MODEL))
+
+        with self._lock:
+            self._snapshot_rows = dict(embeddings)
+            self._log_offsets = {}
+            self._log_records = self._replay_log(questions, embeddings)
+
+        return questions, embeddings
+
+    def _load_matrix(self, generation: int) -> Dict[str, np.ndarray]:
+        """Memory-map a snapshot embedding matrix and return one row view per question."""
+        matrix_path = self._matrix_path(generation)
+        row_ids_path = self._row_ids_path(generation)
+        if not matrix_path.exists() or not row_ids_path.exists():
+            logger.error(f"Embedding matrix for cache generation {generation} is missing")
+            return {}
+
+        matrix = np.load(matrix_path, mmap_mode='r')
+        with open(row_ids_path, 'r', encoding='utf-8') as f:
+            row_ids = json.load(f)
+
+        if len(row_ids) != matrix.shape[0]:
+            logger.error(f"Embedding matrix has {matrix.shape[0]} rows but {len(row_ids)} row ids")
+            return {}
+
+        return {question: matrix[i] for i, question in enumerate(row_ids)}
+
+    def _replay_log(self, questions: Dict[str, Dict[str, Any]], embeddings: Dict[str, np.ndarray]) -> int:
+        """Apply log records in order, truncating a torn trailing record. Returns records applied."""
+        if not self.log_path.exists():
+            return 0
+
+        applied = 0
+        good_offset = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Partial write from a crash mid-append
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+
+                op = record.get('op')
+                question = record.get('question')
+                if op == 'put':
+                    questions[question] = record.get('answer', {})
+                    if record.get('embedding'):
+                        embeddings[question] = np.asarray(record['embedding'], dtype=np.float32)
+                        self.loaded_embedding_models.add(record.get('model', LEGACY_EMBEDDING_MODEL))
+                        self._log_offsets[question] = good_offset
+                    else:
+                        embeddings.pop(question, None)
+                        self._log_offsets[question] = None
+                elif op == 'delete':
+                    questions.pop(question, None)
+                    embeddings.pop(question, None)
+                    self._log_offsets[question] = None
+
+                applied += 1
+                good_offset += len(line)
+
+        if good_offset < self.log_path.stat().st_size:
+            logger.warning(f"Dropping torn record at end of cache log {self.log_path}")
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        if applied:
+            logger.info(f"Replayed {applied} records from cache log")
+        return applied
+
+    def _append(self, records: List[Dict[str, Any]]):
+        """Append records to the log with a single write, noting where each embedding landed."""
+        lines = [
+            (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+            for record in records
+        ]
+        with self._lock:
+            with open(self.log_path, 'ab') as f:
+                offset = f.tell()
+                f.write(b''.join(lines))
+                f.flush()
+            for record, line in zip(records, lines):
+                self._log_offsets[record['question']] = offset if record.get('embedding') else None
+                offset += len(line)
+            self._log_records += len(lines)
+
+    def _put_record(self, question: str, answer: Dict[str, Any], embedding: Optional[np.ndarray]) -> Dict[str, Any]:
+        embedding = [] if embedding is None else np.asarray(embedding, dtype=np.float32).tolist()
+        return {'op': 'put', 'question': question, 'answer': answer, 'embedding': embedding,
+                'model': self.embedding_model}
+
+    def append_put(self, question: str, answer: Dict[str, Any], embedding: Optional[np.ndarray]):
+        """Record an insert or overwrite of a cache entry."""
+        self._append([self._put_record(question, answer, embedding)])
+
+    def append_puts(self, items: List[Tuple[str, Dict[str, Any], Optional[np.ndarray]]]):
+        """Record many inserts with a single write."""
+        self._append([self._put_record(question, answer, embedding) for question, answer, embedding in items])
+
+    def append_delete(self, question: str):
+        """Record the removal of a cache entry."""
+        self._append([{'op': 'delete', 'question': question}])
+
+    def embedding(self, question: str) -> Optional[np.ndarray]:
+        """The stored vector of a live entry, or None if it has none."""
+        with self._lock:
+            return self._stored_embedding(question)
+
+    def _stored_embedding(self, question: str) -> Optional[np.ndarray]:
+        if question not in self._log_offsets:
+            return self._snapshot_rows.get(question)
+        offset = self._log_offsets[question]
+        if offset is None:
+            return None
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            record = json.loads(f.readline())
+        return np.asarray(record['embedding'], dtype=np.float32)
+
+    def record_usage(self, usage: Dict[str, Tuple[int, float]]):
+        """Hit counts are carried by the next compacted snapshot, so the log holds no usage records."""
+
+    def needs_compaction(self, live_entries: int) -> bool:
+        """Compact once the log outgrows the live entry count, keeping writes amortized O(1)."""
+        return self._log_records >= max(self.compact_min_records, live_entries)
+
+    def compact(self, questions: Dict[str, Dict[str, Any]], embeddings: Dict[str, np.ndarray]):
+        """
+        Write a full snapshot atomically and reset the log. Questions missing from ``embeddings``
+        keep the vector already stored for them, so callers need not hold every vector in memory.
+        """
+        with self._lock:
+            generation = (self.embedding_generation or 0) + 1
+            self._write_matrix(generation, questions, embeddings)
+
+            data = {
+                'questions': questions,
+                'embedding_generation': generation,
+                'embedding_model': self.embedding_model,
+                'last_updated': datetime.now().isoformat()
+            }
+            tmp_path = self.snapshot_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self.embedding_generation = generation
+            self._snapshot_rows = self._load_matrix(generation)
+
+            if self.log_path.exists():
+                self.log_path.unlink()
+            self._log_records = 0
+            self._log_offsets = {}
+
+            # Older generations are no longer referenced. Open memory maps keep their pages alive.
+            current = {self._matrix_path(generation), self._row_ids_path(generation)}
+            for path in self._embedding_files():
+                if path not in current:
+                    path.unlink()
+
+    def _write_matrix(self, generation: int, questions: Dict[str, Dict[str, Any]], embeddings: Dict[str, np.ndarray]):
+        """Write embeddings as one contiguous float32 matrix plus a row-id sidecar."""
+        rows = {}
+        for question in questions:
+            embedding = embeddings.get(question)
+            if embedding is None:
+                embedding = self._stored_embedding(question)
+            if embedding is not None and len(embedding):
+                rows[question] = embedding
+        row_ids = list(rows)
+        if row_ids:
+            dimension = len(rows[row_ids[0]])
+            skipped = [question for question in row_ids if len(rows[question]) != dimension]
+            if skipped:
+                logger.warning(f"Skipping {len(skipped)} embeddings with dimension other than {dimension}")
+                row_ids = [question for question in row_ids if len(rows[question]) == dimension]
+            # Rows are copied straight into the mapped file, so no second float32 matrix is built in memory
+            matrix = np.lib.format.open_memmap(self._matrix_path(generation), mode='w+', dtype=np.float32,
+                                               shape=(len(row_ids), dimension))
+            for i, question in enumerate(row_ids):
+                matrix[i] = rows[question]
+            matrix.flush()
+            del matrix
+            with open(self._matrix_path(generation), 'rb') as f:
+                os.fsync(f.fileno())
+        else:
+            with open(self._matrix_path(generation), 'wb') as f:
+                np.save(f, np.empty((0, 0), dtype=np.float32))
+                f.flush()
+                os.fsync(f.fileno())
+        with open(self._row_ids_path(generation), 'w', encoding='utf-8') as f:
+            json.dump(row_ids, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        """Remove the snapshot, the log and the embedding matrices."""
+        with self._lock:
+            for path in [self.snapshot_path, self.log_path] + self._embedding_files():
+                if path.exists():
+                    path.unlink()
+            self.embedding_generation = None
+            self._log_records = 0
+            self._snapshot_rows = {}
+            self._log_offsets = {}
+
+    def exists(self) -> bool:
+        """Whether any persisted cache state exists."""
+        return self.snapshot_path.exists() or self.log_path.exists()
+
+    def _current_paths(self) -> List[Path]:
+        paths = [self.snapshot_path, self.log_path]
+        if self.embedding_generation is not None:
+            paths += [self._matrix_path(self.embedding_generation), self._row_ids_path(self.embedding_generation)]
+        return paths
+
+    def size_bytes(self) -> int:
+        """Total on-disk size of the snapshot, the log and the embedding matrix."""
+        return sum(path.stat().st_size for path in self._current_paths() if path.exists())
+
+    def last_modified(self) -> Optional[float]:
+        """Most recent modification time of the persisted cache state."""
+        mtimes = [path.stat().st_mtime for path in (self.snapshot_path, self.log_path) if path.exists()]
+        return max(mtimes) if mtimes else None
+
+    def poll_changes(self) -> Optional[List[Tuple[str, str, Optional[Dict[str, Any]], Optional[np.ndarray]]]]:
+        """Changes written by other processes since the last load or poll; never any for a local file store."""
+        return []
+
+    def claim_migration(self) -> bool:
+        """A file store belongs to one process, which always runs its own migration."""
+        return True
+
+    def release_migration(self):
+        """Nothing to release for a file store."""
+
+    def migration_claimed(self) -> bool:
+        """No other process migrates a file store."""
+        return False
+
+
+class SQLiteAnswerCacheStore:
+    """
+    Answer cache persistence shared by several worker processes through one SQLite database.
+
+    The database runs in WAL mode so readers never block the single writer. Every put or
+    delete is a row upsert tagged with a monotonically increasing ``seq`` and the id of the
+    writing process; deletes leave a tombstone row. Workers keep their in-memory cache as a
+    read-through tier and call ``poll_changes`` to pick up rows other workers wrote since
+    their last poll. ``PRAGMA data_version`` makes the no-change case a single cheap query.
+
+    Tombstones are purged once they outnumber the live rows; a worker that was behind the
+    purge gets ``None`` from ``poll_changes`` and reloads in full.
+
+    Re-embedding vectors from an older model is claimed through a ``migration_claimed_at``
+    row in ``cache_meta``, so only one of the workers sharing the database runs it.
+    """
+
+    def __init__(self, db_path: Path, compact_min_records: int = ANSWER_CACHE_COMPACT_MIN_RECORDS,
+                 embedding_model: str = LEGACY_EMBEDDING_MODEL, import_snapshot_path: Optional[Path] = None):
+        self.db_path = Path(db_path)
+        self.compact_min_records = compact_min_records
+        self.embedding_model = embedding_model
+        self.loaded_embedding_models: Set[str] = set()
+        self.writer_id = uuid.uuid4().hex
+        self.last_seq = 0
+        self._data_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                question TEXT PRIMARY KEY,
+                answer TEXT,
+                embedding BLOB,
+                model TEXT,
+                seq INTEGER NOT NULL,
+                writer TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_seq ON entries(seq);
+            CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO cache_meta (key, value) VALUES ('seq', 0), ('purged_through', 0);
+        """)
+
+        if import_snapshot_path is not None:
+            self._import_file_store(Path(import_snapshot_path))
+
+    def _import_file_store(self, snapshot_path: Path):
+        """Seed an empty database from an existing snapshot + log cache, once."""
+        file_store = AnswerCacheStore(snapshot_path)
+        if not file_store.exists() or self.exists():
+            return
+        questions, embeddings = file_store.load()
+        model = next(iter(file_store.loaded_embedding_models), self.embedding_model)
+        with self._write() as conn:
+            for question, answer in questions.items():
+                self._upsert(conn, question, answer, embeddings.get(question), model)
+        logger.info(f"Imported {len(questions)} cached answers from {snapshot_path} into {self.db_path}")
+
+    @contextmanager
+    def _write(self):
+        """Serialized write transaction across threads and processes."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _next_seq(self, conn: sqlite3.Connection) -> int:
+        conn.execute("UPDATE cache_meta SET value = value + 1 WHERE key = 'seq'")
+        return conn.execute("SELECT value FROM cache_meta WHERE key = 'seq'").fetchone()[0]
+
+    def _upsert(self, conn: sqlite3.Connection, question: str, answer: Optional[Dict[str, Any]],
+                embedding: Optional[np.ndarray], model: Optional[str] = None, keep_embedding: bool = False):
+        """Write one row; with ``keep_embedding``, a live row given no embedding keeps its stored one."""
+        blob = None
+        if answer is not None and embedding is not None and len(embedding):
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        if keep_embedding and answer is not None and blob is None:
+            embedding_update = "embedding = entries.embedding, model = entries.model"
+        else:
+            embedding_update = "embedding = excluded.embedding, model = excluded.model"
+        conn.execute(
+            "INSERT INTO entries (question, answer, embedding, model, seq, writer) VALUES (?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT(question) DO UPDATE SET answer = excluded.answer, {embedding_update}, "
+            "seq = excluded.seq, writer = excluded.writer",
+            (question, None if answer is None else json.dumps(answer, ensure_ascii=False), blob,
+             model or self.embedding_model, self._next_seq(conn), self.writer_id)
+        )
+
+    @staticmethod
+    def _decode(row) -> Tuple[str, Optional[Dict[str, Any]], Optional[np.ndarray], Optional[str]]:
+        question, answer, blob, model = row
+        embedding = np.frombuffer(blob, dtype=np.float32).copy() if blob else None
+        return question, None if answer is None else json.loads(answer), embedding, model
+
+    def load(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, np.ndarray]]:
+        """Load every live entry."""
+        questions: Dict[str, Dict[str, Any]] = {}
+        embeddings: Dict[str, np.ndarray] = {}
+        self.loaded_embedding_models = set()
+
+        with self._lock:
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self.last_seq = self._conn.execute("SELECT value FROM cache_meta WHERE key = 'seq'").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT question, answer, embedding, model FROM entries WHERE answer IS NOT NULL ORDER BY seq"
+            ).fetchall()
+
+        for row in rows:
+            question, answer, embedding, model = self._decode(row)
+            questions[question] = answer
+            if embedding is not None:
+                embeddings[question] = embedding
+                self.loaded_embedding_models.add(model or LEGACY_EMBEDDING_MODEL)
+        return questions, embeddings
+
+    def poll_changes(self) -> Optional[List[Tuple[str, str, Optional[Dict[str, Any]], Optional[np.ndarray]]]]:
+        """
+        Rows other workers wrote since the last load or poll, as ``(op, question, answer, embedding)``.
+        Returns None when tombstones this worker has not seen were purged and a full reload is needed.
+        """
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+
+            purged_through = self._conn.execute("SELECT value FROM cache_meta WHERE key = 'purged_through'").fetchone()[0]
+            if purged_through > self.last_seq:
+                return None
+            rows = self._conn.execute(
+                "SELECT question, answer, embedding, model, seq, writer FROM entries WHERE seq > ? ORDER BY seq",
+                (self.last_seq,)
+            ).fetchall()
+            if rows:
+                self.last_seq = rows[-1][4]
+
+        changes = []
+        for row in rows:
+            if row[5] == self.writer_id:
+                continue
+            question, answer, embedding, _ = self._decode(row[:4])
+            changes.append(("delete", question, None, None) if answer is None else ("put", question, answer, embedding))
+        return changes
+
+    def embedding(self, question: str) -> Optional[np.ndarray]:
+        """The stored vector of a live entry, or None if it has none."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding FROM entries WHERE question = ? AND answer IS NOT NULL", (question,)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row and row[0] else None
+
+    def append_put(self, question: str, answer: Dict[str, Any], embedding: Optional[np.ndarray]):
+        """Record an insert or overwrite of a cache entry."""
+        with self._write() as conn:
+            self._upsert(conn, question, answer, embedding)
+
+    def append_puts(self, items: List[Tuple[str, Dict[str, Any], Optional[np.ndarray]]]):
+        """Record many inserts in one transaction."""
+        with self._write() as conn:
+            for question, answer, embedding in items:
+                self._upsert(conn, question, answer, embedding)
+
+    def append_delete(self, question: str):
+        """Record the removal of a cache entry as a tombstone, purging tombstones once they dominate."""
+        with self._write() as conn:
+            self._upsert(conn, question, None, None)
+            tombstones, live = conn.execute(
+                "SELECT SUM(answer IS NULL), SUM(answer IS NOT NULL) FROM entries"
+            ).fetchone()
+            if tombstones >= max(self.compact_min_records, live or 0):
+                purged_through = conn.execute("SELECT MAX(seq) FROM entries WHERE answer IS NULL").fetchone()[0]
+                conn.execute("DELETE FROM entries WHERE answer IS NULL")
+                conn.execute("UPDATE cache_meta SET value = ? WHERE key = 'purged_through'", (purged_through,))
+
+    def record_usage(self, usage: Dict[str, Tuple[int, float]]):
+        """
+        Add ``question -> (new hits, last hit time)`` to the usage stored in each entry's metadata.
+        Usage is not a content change, so ``seq`` is left alone and other workers do not re-apply the entry.
+        """
+        with self._write() as conn:
+            for question, (hits, last_hit_at) in usage.items():
+                row = conn.execute(
+                    "SELECT answer FROM entries WHERE question = ? AND answer IS NOT NULL", (question,)
+                ).fetchone()
+                if row is None:
+                    continue
+                answer = json.loads(row[0])
+                meta = answer.get("meta") or {}
+                meta["hit_count"] = int(meta.get("hit_count", 0) or 0) + hits
+                meta["last_hit_at"] = max(float(meta.get("last_hit_at") or 0), last_hit_at)
+                answer["meta"] = meta
+                conn.execute("UPDATE entries SET answer = ? WHERE question = ?",
+                             (json.dumps(answer, ensure_ascii=False), question))
+
+    def needs_compaction(self, live_entries: int) -> bool:
+        """Tombstones are purged as part of deletes, so the cache never asks for a full rewrite."""
+        return False
+
+    def claim_migration(self) -> bool:
+        """
+        Claim the re-embedding of stored vectors for this worker. False when no stored vector
+        comes from another model any more, or another worker holds a live claim.
+        """
+        now = int(time.time())
+        with self._write() as conn:
+            legacy = conn.execute(
+                "SELECT 1 FROM entries WHERE answer IS NOT NULL AND embedding IS NOT NULL AND model != ? LIMIT 1",
+                (self.embedding_model,)
+            ).fetchone()
+            claimed_at = conn.execute("SELECT value FROM cache_meta WHERE key = 'migration_claimed_at'").fetchone()
+            if legacy is None or (claimed_at is not None and now - claimed_at[0] < MIGRATION_CLAIM_SECONDS):
+                return False
+            conn.execute("INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('migration_claimed_at', ?)", (now,))
+            return True
+
+    def release_migration(self):
+        """Drop this worker's migration claim, whether or not the migration succeeded."""
+        with self._write() as conn:
+            conn.execute("DELETE FROM cache_meta WHERE key = 'migration_claimed_at'")
+
+    def migration_claimed(self) -> bool:
+        """Whether some worker holds a live migration claim."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache_meta WHERE key = 'migration_claimed_at'").fetchone()
+        return row is not None and time.time() - row[0] < MIGRATION_CLAIM_SECONDS
+
+    def compact(self, questions: Dict[str, Dict[str, Any]], embeddings: Dict[str, np.ndarray]):
+        """
+        Replace the shared contents with the given entries in one transaction. Questions missing
+        from ``embeddings`` keep the vector already stored for them, and stored usage is merged in
+        so hits other workers recorded are not overwritten.
+        """
+        with self._write() as conn:
+            existing = [row[0] for row in conn.execute("SELECT question FROM entries WHERE answer IS NOT NULL")]
+            for question in existing:
+                if question not in questions:
+                    self._upsert(conn, question, None, None)
+            for question, answer in questions.items():
+                row = conn.execute(
+                    "SELECT answer FROM entries WHERE question = ? AND answer IS NOT NULL", (question,)
+                ).fetchone()
+                if row is not None:
+                    answer = self._merge_usage(answer, json.loads(row[0]))
+                self._upsert(conn, question, answer, embeddings.get(question), keep_embedding=True)
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    @staticmethod
+    def _merge_usage(answer: Dict[str, Any], stored: Dict[str, Any]) -> Dict[str, Any]:
+        """``answer`` with the larger of its own and the stored hit count and last hit time."""
+        stored_meta = stored.get("meta") or {}
+        meta = dict(answer.get("meta") or {})
+        for key in ("hit_count", "last_hit_at"):
+            if stored_meta.get(key) is not None:
+                meta[key] = max(meta.get(key) or 0, stored_meta[key])
+        return {**answer, "meta": meta}
+
+    def clear(self):
+        """Remove every entry; other workers reload on their next poll."""
+        with self._write() as conn:
+            seq = self._next_seq(conn)
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE cache_meta SET value = ? WHERE key = 'purged_through'", (seq,))
+
+    def exists(self) -> bool:
+        """Whether the database holds any live entries."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entries WHERE answer IS NOT NULL LIMIT 1").fetchone() is not None
+
+    def _paths(self) -> List[Path]:
+        return [self.db_path, self.db_path.with_name(self.db_path.name + "-wal")]
+
+    def size_bytes(self) -> int:
+        """On-disk size of the database and its write-ahead log."""
+        return sum(path.stat().st_size for path in self._paths() if path.exists())
+
+    def last_modified(self) -> Optional[float]:
+        """Most recent modification time of the database or its write-ahead log."""
+        mtimes = [path.stat().st_mtime for path in self._paths() if path.exists()]
+        return max(mtimes) if mtimes else None
+
+
+def create_answer_cache_store(snapshot_path: Path, embedding_model: str = LEGACY_EMBEDDING_MODEL):
+    """Store selected by ANSWER_CACHE_BACKEND ("file" or "sqlite")."""
+    if ANSWER_CACHE_BACKEND == "sqlite":
+        db_path = Path(ANSWER_CACHE_SQLITE_PATH) if ANSWER_CACHE_SQLITE_PATH else Path(snapshot_path).with_suffix(".db")
+        return SQLiteAnswerCacheStore(db_path, embedding_model=embedding_model, import_snapshot_path=snapshot_path)
+    return AnswerCacheStore(snapshot_path, embedding_model=embedding_model)
+
+
+def save_paraphrases(path: Path, paraphrases: Dict[str, Dict[str, np.ndarray]], embedding_model: str):
+    """Atomically write paraphrase embeddings (canonical question -> paraphrase -> vector) to an .npz file."""
+    rows = [(question, text, vector) for question, texts in paraphrases.items() for text, vector in texts.items()]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            questions=np.array([question for question, _, _ in rows], dtype=str),
+            paraphrases=np.array([text for _, text, _ in rows], dtype=str),
+            embeddings=np.stack([np.asarray(vector, dtype=np.float32) for _, _, vector in rows])
+            if rows else np.empty((0, 0), dtype=np.float32),
+            embedding_model=np.array(embedding_model)
+        )
+    os.replace(tmp_path, path)
+
+
+def load_paraphrases(path: Path, embedding_model: str) -> Dict[str, Dict[str, np.ndarray]]:
+    """Paraphrase embeddings written by save_paraphrases; empty if missing or built with another model."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with np.load(path) as data:
+            model = str(data["embedding_model"])
+            if model != embedding_model:
+                logger.warning(f"Ignoring paraphrases in {path}: built with {model}, cache uses {embedding_model}")
+                return {}
+            paraphrases: Dict[str, Dict[str, np.ndarray]] = {}
+            for question, text, vector in zip(data["questions"], data["paraphrases"], data["embeddings"]):
+                paraphrases.setdefault(str(question), {})[str(text)] = np.array(vector, dtype=np.float32)
+        return paraphrases
+    except Exception as e:
+        logger.error(f"Error loading paraphrases from {path}: {e}")
+        return {}
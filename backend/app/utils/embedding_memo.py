@@ -0,0 +1,146 @@
+"""
+Memo of recently computed text embeddings.
+Repeated utterances (transcript re-polls, several reps asking the same thing) reuse the
+embedding computed seconds earlier instead of paying another OpenAI round-trip.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingMemo:
+    """
+    Bounded LRU memo of text -> embedding with a time-to-live.
+
+    Keys are the SHA-256 of the embedding model plus the case- and whitespace-folded text,
+    so the memo never serves a vector from a different model. When ``persist_path`` is set
+    the memo is loaded on startup and written back every ``persist_every`` new entries.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600,
+                 persist_path: Optional[str] = None, persist_every: int = 50):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.persist_every = persist_every
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.persist_path is not None:
+            self.load()
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        """Hash of the model and the case- and whitespace-folded text."""
+        folded = re.sub(r'\s+', ' ', text.lower()).strip()
+        return hashlib.sha256(f"{model}\0{folded}".encode()).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Return the memoized embedding, or None if absent or expired."""
+        key = self.key(text, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model: str, embedding) -> None:
+        """Memoize an embedding, evicting the least recently used entries beyond capacity."""
+        if embedding is None or not len(embedding):
+            return
+        key = self.key(text, model)
+        with self._lock:
+            self._entries[key] = (np.asarray(embedding, dtype=np.float32), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.persist_path is not None and self._unsaved >= self.persist_every
+
+        if should_save:
+            self.save()
+
+    def clear(self) -> None:
+        """Drop all memoized embeddings."""
+        with self._lock:
+            self._entries.clear()
+            self._unsaved = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percentage": round(self.hits / lookups * 100, 2) if lookups else 0
+        }
+
+    def save(self) -> None:
+        """Write unexpired entries to ``persist_path`` atomically."""
+        if self.persist_path is None:
+            return
+        try:
+            now = time.time()
+            with self._lock:
+                items = [(key, vec, created) for key, (vec, created) in self._entries.items()
+                         if now - created <= self.ttl_seconds]
+                self._unsaved = 0
+
+            dimensions = {vec.shape[0] for _, vec, _ in items}
+            if len(dimensions) > 1:
+                # Keep the most common dimension only; vectors from other models are dropped
+                dimension = max(dimensions, key=lambda d: sum(1 for _, vec, _ in items if vec.shape[0] == d))
+                items = [item for item in items if item[1].shape[0] == dimension]
+
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.persist_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    keys=np.array([key for key, _, _ in items], dtype=str),
+                    embeddings=np.stack([vec for _, vec, _ in items]) if items else np.empty((0, 0), dtype=np.float32),
+                    created=np.array([created for _, _, created in items], dtype=np.float64)
+                )
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            logger.error(f"Error saving embedding memo: {e}")
+
+    def load(self) -> None:
+        """Load unexpired entries from ``persist_path``."""
+        if self.persist_path is None or not self.persist_path.exists():
+            return
+        try:
+            now = time.time()
+            with np.load(self.persist_path) as data:
+                keys, embeddings, created = data["keys"], data["embeddings"], data["created"]
+                with self._lock:
+                    for key, vec, ts in zip(keys, embeddings, created):
+                        if now - ts <= self.ttl_seconds:
+                            self._entries[str(key)] = (np.array(vec, dtype=np.float32), float(ts))
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            logger.info(f"Loaded {len(self._entries)} memoized embeddings")
+        except Exception as e:
+            logger.error(f"Error loading embedding memo: {e}")
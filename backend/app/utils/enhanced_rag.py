@@ -11,7 +11,7 @@ from typing import Dict, Any, List, Optional
 import openai
 from app.config import OPENAI_API_KEY, OPENAI_MODEL
 from app.prompts import ENHANCED_RAG_SYSTEM_PROMPT, DEFAULT_TONE
-from app.utils.vector_db_manager import VectorDBManager
+from app.utils.vector_db_manager import vector_db_manager
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -20,8 +20,8 @@ logger = logging.getLogger(__name__)
 # Configure OpenAI
 client = openai.OpenAI(api_key=OPENAI_API_KEY)
 
-# Initialize vector database manager
-vector_db = VectorDBManager()
+# Share the application's vector database (and its index) instead of loading a second copy
+vector_db = vector_db_manager
 
 # Default response length
 MAX_RESPONSE_LENGTH = 500
@@ -218,6 +218,9 @@ async def enhanced_rag_analyze(
             "meta": {
                 "sources": [source.get("source_info", {}) for source in relevant_sources[:3]],
                 "source_count": len(relevant_sources),
+                # Every retrieved chunk, so cached answers can be invalidated when a file changes
+                "source_files": sorted({source["file_id"] for source in relevant_sources if source.get("file_id")}),
+                "source_chunks": [source["chunk_id"] for source in relevant_sources if source.get("chunk_id")],
                 "confidence": calculate_confidence_score(result, relevant_sources),
                 "response_time_ms": int((time.time() - start_time) * 1000),
                 "model_used": OPENAI_MODEL,
@@ -0,0 +1,117 @@
+"""
+Negative cache and worth-analyzing gate for /analyze.
+Live transcripts keep sending backchannel filler ("yeah, okay") and repeated partial
+utterances. Filler is rejected by a local word check, and inputs that recently missed the
+answer cache are answered from a short-lived memo of the pipeline result, so neither pays
+for an embedding or an LLM call.
+"""
+
+import copy
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Backchannel, filler and function words that carry no question on their own
+FILLER_WORDS = {
+    'yeah', 'yes', 'yep', 'yup', 'no', 'nope', 'ok', 'okay', 'right', 'sure', 'alright', 'fine',
+    'um', 'umm', 'uh', 'uhh', 'uhm', 'er', 'erm', 'ah', 'oh', 'hmm', 'hm', 'mhm', 'mm', 'huh',
+    'so', 'well', 'like', 'just', 'actually', 'basically', 'really', 'totally', 'exactly',
+    'cool', 'great', 'nice', 'good', 'perfect', 'awesome', 'thanks', 'thank', 'cheers',
+    'hi', 'hello', 'hey', 'bye', 'see', 'got', 'gotcha', 'know', 'mean', 'guess', 'think',
+    'i', 'you', 'we', 'it', 'that', 'this', 'they', 'me', 'us', 'my', 'your', 'our',
+    'is', 'are', 'was', 'be', 'do', 'does', 'did', 'have', 'has', 'can', 'will', 'would',
+    'the', 'a', 'an', 'and', 'or', 'but', 'of', 'to', 'in', 'on', 'for', 'with', 'at',
+    'what', 'how', 'why', 'when', 'where', 'who', 'which', 'there', 'here', 'then', 'now',
+    "i'm", "it's", "that's", "you're", "we're", "don't", 'uh-huh', 'mm-hmm'
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def is_worth_analyzing(text: str) -> bool:
+    """
+    Whether an utterance contains at least one substantive word.
+
+    Utterances made only of filler and function words are not worth an embedding or an
+    LLM call. Single characters other than digits do not count as substantive.
+    """
+    for word in WORD_PATTERN.findall(text.lower()):
+        if word not in FILLER_WORDS and (len(word) > 1 or word.isdigit()):
+            return True
+    return False
+
+
+class NegativeCache:
+    """
+    Bounded LRU memo of recent misses with a short time-to-live.
+
+    Keys are caller-normalized query text. Each key holds one pipeline result per ``variant``,
+    the request parameters that shaped it (tone, length, ...), so a repeat is only answered with
+    a result built for the same parameters. Results are deep-copied on the way in and out, so
+    callers may mutate them.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 120):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[Hashable, Tuple[Dict[str, Any], float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, variant: Hashable = None) -> Optional[Dict[str, Any]]:
+        """Return a copy of the result remembered for ``key`` and ``variant``, or None if absent or expired."""
+        if not key or self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            variants = self._entries.get(key)
+            entry = variants.get(variant) if variants else None
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl_seconds:
+                del variants[variant]
+                if not variants:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any], variant: Hashable = None) -> None:
+        """Remember the result of a miss, evicting the least recently used keys beyond capacity."""
+        if not key or self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._entries.setdefault(key, {})[variant] = (result, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        """Forget every variant of ``key`` once it is no longer a known miss."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Forget every known miss."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit counter."""
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits
+        }
@@ -0,0 +1,128 @@
+"""
+Shared query-embedding stage.
+A query is embedded once with OPENAI_EMBEDDING_MODEL and memoized; the answer cache and
+the vector database both read that one vector, each at the dimension of its own index.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+import numpy as np
+import openai
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_EMBEDDING_MODEL,
+    ANSWER_CACHE_EMBEDDING_MEMO_SIZE,
+    ANSWER_CACHE_EMBEDDING_MEMO_TTL_SECONDS,
+    ANSWER_CACHE_EMBEDDING_MEMO_PATH
+)
+from app.utils.embedding_memo import EmbeddingMemo
+from app.utils.single_flight import SingleFlight
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Configure OpenAI
+client = openai.OpenAI(api_key=OPENAI_API_KEY)
+
+# Maximum number of inputs per embeddings request when embedding in bulk
+EMBEDDING_BATCH_SIZE = 100
+
+# Memo shared by every consumer of query embeddings
+query_embedding_memo = EmbeddingMemo(
+    max_entries=ANSWER_CACHE_EMBEDDING_MEMO_SIZE,
+    ttl_seconds=ANSWER_CACHE_EMBEDDING_MEMO_TTL_SECONDS,
+    persist_path=ANSWER_CACHE_EMBEDDING_MEMO_PATH or None
+)
+
+# Query embedding requests in flight, keyed like the memo. A cache lookup that stops waiting
+# leaves its request here, and the vector search for the same query awaits it.
+query_embedding_flights = SingleFlight()
+
+
+def truncate_embedding(embedding: np.ndarray, dimension: Optional[int]) -> np.ndarray:
+    """
+    View of an embedding at a smaller dimension.
+
+    text-embedding-3 vectors may be shortened by dropping trailing components and
+    re-normalizing, which is what the API's ``dimensions`` parameter does server-side.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32)
+    if not dimension or embedding.shape[0] <= dimension:
+        return embedding
+    shortened = embedding[:dimension]
+    norm = np.linalg.norm(shortened)
+    return shortened / norm if norm > 0 else shortened
+
+
+def embed_query(text: str, memo: Optional[EmbeddingMemo] = None) -> Optional[np.ndarray]:
+    """Full-dimension embedding of ``text``, computed at most once while memoized."""
+    memo = memo if memo is not None else query_embedding_memo
+    memoized = memo.get(text, OPENAI_EMBEDDING_MODEL)
+    if memoized is not None:
+        return memoized
+    return _request_embedding(text, memo)
+
+
+async def aembed_query(text: str, memo: Optional[EmbeddingMemo] = None) -> Optional[np.ndarray]:
+    """
+    Event-loop friendly embed_query. The request runs in a worker thread, and callers asking
+    for the same text while it is in flight await that request instead of making another.
+    """
+    memo = memo if memo is not None else query_embedding_memo
+    memoized = memo.get(text, OPENAI_EMBEDDING_MODEL)
+    if memoized is not None:
+        return memoized
+    embedding, _ = await query_embedding_flights.run(
+        EmbeddingMemo.key(text, OPENAI_EMBEDDING_MODEL),
+        lambda: asyncio.to_thread(_request_embedding, text, memo)
+    )
+    return embedding
+
+
+def _request_embedding(text: str, memo: EmbeddingMemo) -> Optional[np.ndarray]:
+    """Embed ``text`` with one API call and memoize the result."""
+    try:
+        response = client.embeddings.create(
+            model=OPENAI_EMBEDDING_MODEL,
+            input=text.strip()
+        )
+        embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        memo.put(text, OPENAI_EMBEDDING_MODEL, embedding)
+        return embedding
+    except Exception as e:
+        logger.error(f"Error getting query embedding: {e}")
+        return None
+
+
+def embed_texts(texts: List[str]) -> List[Optional[np.ndarray]]:
+    """Full-dimension embeddings for many texts in batched requests, bypassing the memo."""
+    embeddings: List[Optional[np.ndarray]] = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+        try:
+            response = client.embeddings.create(
+                model=OPENAI_EMBEDDING_MODEL,
+                input=[text.strip() for text in batch]
+            )
+            embeddings.extend(np.asarray(data.embedding, dtype=np.float32) for data in response.data)
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(batch)} texts: {e}")
+            embeddings.extend([None] * len(batch))
+    return embeddings
+
+
+def embed_queries(texts: List[str], memo: Optional[EmbeddingMemo] = None) -> List[Optional[np.ndarray]]:
+    """
+    Full-dimension embeddings for many queries. Memoized texts are reused; the rest are
+    embedded in batched requests and memoized.
+    """
+    memo = memo if memo is not None else query_embedding_memo
+    embeddings = [memo.get(text, OPENAI_EMBEDDING_MODEL) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    for i, embedding in zip(missing, embed_texts([texts[i] for i in missing])):
+        if embedding is not None:
+            memo.put(texts[i], OPENAI_EMBEDDING_MODEL, embedding)
+        embeddings[i] = embedding
+    return embeddings
@@ -0,0 +1,64 @@
+"""
+Single-flight de-duplication of concurrent async work.
+When several callers ask for the same key at once, only the first runs the work;
+the others await the same execution and receive a copy of its result.
+"""
+
+import asyncio
+import copy
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Registry of in-flight executions keyed by a caller-chosen key.
+
+    The shared execution runs as its own task, so a caller that disconnects does not
+    cancel the work other callers are waiting on. Exceptions are raised to every caller.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run ``fn()`` unless an execution for ``key`` is already in flight.
+
+        Returns ``(result, shared)`` where ``shared`` is True when the result came from
+        another caller's execution. Shared results are deep copies, so callers may mutate them.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.shared += 1
+            logger.info("Joining in-flight execution for duplicate request")
+            return copy.deepcopy(await asyncio.shield(flight)), True
+
+        flight = asyncio.ensure_future(fn())
+        self._flights[key] = flight
+        self.executions += 1
+        flight.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(flight), False
+
+    def _forget(self, key: Hashable, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Mark the exception as retrieved when no caller is left to await it
+            flight.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Execution and de-duplication counters."""
+        return {
+            "in_flight": len(self._flights),
+            "executions": self.executions,
+            "shared": self.shared
+        }
@@ -2,19 +2,40 @@
 Vector database management for file uploads and knowledge base
 """
 
+import asyncio
+import io
 import os
 import json
 import logging
 import pickle
+import re
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
 from datetime import datetime
 import hashlib
 
 import numpy as np
 import faiss
 import openai
-from app.config import OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL, EMBEDDING_DIMENSION
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_EMBEDDING_MODEL,
+    EMBEDDING_DIMENSION,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    VECTOR_DB_PRECISION,
+    VECTOR_DB_INDEX_TYPE,
+    VECTOR_DB_HNSW_M,
+    VECTOR_DB_HNSW_EF_CONSTRUCTION,
+    VECTOR_DB_HNSW_EF_SEARCH,
+    VECTOR_DB_IVF_NLIST,
+    VECTOR_DB_IVF_NPROBE,
+    VECTOR_DB_PQ_M,
+    VECTOR_DB_COMPACT_MIN_VECTORS
+)
+from app.utils.query_embedding import aembed_query, embed_queries, truncate_embedding
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +51,135 @@ VECTOR_DB_DIR.mkdir(exist_ok=True)
 INDEX_PATH = VECTOR_DB_DIR / "faiss_index.bin"
 METADATA_PATH = VECTOR_DB_DIR / "embeddings_metadata.pkl"
 FILE_REGISTRY_PATH = VECTOR_DB_DIR / "file_registry.json"
+CHUNK_VECTORS_PATH = VECTOR_DB_DIR / "chunk_vectors.npy"
+
+# FAISS scalar quantizers for the non-float32 storage precisions
+SCALAR_QUANTIZER_TYPES = {"float16": "QT_fp16", "int8": "QT_8bit"}
+
+# Index factory codes for each storage precision
+PRECISION_FACTORY_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+# Supported VECTOR_DB_INDEX_TYPE values
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# k-means wants at least this many training points per IVF list; IVF-PQ also needs one
+# point per codebook centroid. Smaller corpora use a flat index until they grow.
+IVF_MIN_POINTS_PER_LIST = 39
+PQ_NBITS = 8
+
+# An approximate or quantized index fetches this many candidates per requested hit and
+# re-ranks them by exact distance to the full-precision chunk vectors
+RESCORE_FACTOR = 4
+
+
+def index_layout(n_vectors: int, index_type: Optional[str] = None,
+                 precision: Optional[str] = None) -> Tuple[str, str, int]:
+    """
+    (index type, precision, nlist) the configured index takes for ``n_vectors`` vectors.
+    IVF-PQ always reports precision "pq", and nlist is 0 for non-IVF types.
+    """
+    index_type = index_type or VECTOR_DB_INDEX_TYPE
+    precision = precision or VECTOR_DB_PRECISION
+    if index_type not in INDEX_TYPES:
+        index_type = "flat"
+    if precision not in PRECISION_FACTORY_CODES:
+        precision = "float32"
+    if not index_type.startswith("ivf"):
+        return index_type, precision, 0
+    
+    min_vectors = 2 ** PQ_NBITS if index_type == "ivf_pq" else IVF_MIN_POINTS_PER_LIST
+    if n_vectors < min_vectors:
+        return "flat", precision, 0
+    nlist = VECTOR_DB_IVF_NLIST or int(4 * np.sqrt(n_vectors))
+    nlist = max(1, min(nlist, n_vectors // IVF_MIN_POINTS_PER_LIST))
+    return index_type, "pq" if index_type == "ivf_pq" else precision, nlist
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest number of PQ subquantizers up to VECTOR_DB_PQ_M that divides the dimension."""
+    m = max(1, min(VECTOR_DB_PQ_M, dimension))
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def storage_index(index):
+    """The index holding the vectors, below the id map when there is one."""
+    index = faiss.downcast_index(index)
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+
+def current_layout(index) -> Tuple[str, str, int]:
+    """(index type, precision, nlist) of an existing index, comparable with index_layout()."""
+    storage = storage_index(index)
+    if isinstance(storage, faiss.IndexIVFPQ):
+        return "ivf_pq", "pq", storage.nlist
+    if isinstance(storage, faiss.IndexHNSW):
+        index_type, coded, nlist = "hnsw", faiss.downcast_index(storage.storage), 0
+    elif isinstance(storage, faiss.IndexIVF):
+        index_type, coded, nlist = "ivf_flat", storage, storage.nlist
+    else:
+        index_type, coded, nlist = "flat", storage, 0
+    precision = "float32"
+    if isinstance(coded, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        precision = next((name for name, qtype in SCALAR_QUANTIZER_TYPES.items()
+                          if getattr(faiss.ScalarQuantizer, qtype) == coded.sq.qtype), "other")
+    return index_type, precision, nlist
+
+
+def apply_search_params(index):
+    """Set the configured efSearch (HNSW) or nprobe (IVF) on an index."""
+    storage = storage_index(index)
+    if isinstance(storage, faiss.IndexHNSW):
+        storage.hnsw.efSearch = VECTOR_DB_HNSW_EF_SEARCH
+    elif isinstance(storage, faiss.IndexIVF):
+        storage.nprobe = min(VECTOR_DB_IVF_NPROBE, storage.nlist)
+
+
+def create_index(dimension: int, n_vectors: int = 0, index_type: Optional[str] = None,
+                 precision: Optional[str] = None):
+    """
+    Empty id-mapped FAISS index of the configured type, sized for ``n_vectors`` vectors.
+    Searches return stable vector ids rather than row numbers.
+    """
+    layout_type, layout_precision, nlist = index_layout(n_vectors, index_type, precision)
+    if layout_type == "ivf_pq":
+        factory = f"IVF{nlist},PQ{_pq_subquantizers(dimension)}x{PQ_NBITS}"
+    elif layout_type == "ivf_flat":
+        factory = f"IVF{nlist},{PRECISION_FACTORY_CODES[layout_precision]}"
+    elif layout_type == "hnsw":
+        code = PRECISION_FACTORY_CODES[layout_precision]
+        factory = f"HNSW{VECTOR_DB_HNSW_M},Flat" if code == "Flat" else f"HNSW{VECTOR_DB_HNSW_M}_{code}"
+    else:
+        factory = PRECISION_FACTORY_CODES[layout_precision]
+    
+    index = faiss.index_factory(dimension, f"IDMap2,{factory}", faiss.METRIC_L2)
+    storage = storage_index(index)
+    if isinstance(storage, faiss.IndexHNSW):
+        storage.hnsw.efConstruction = VECTOR_DB_HNSW_EF_CONSTRUCTION
+    apply_search_params(index)
+    return index
+
+
+def index_from_vectors(vectors: np.ndarray, vector_ids: np.ndarray, dimension: int,
+                       index_type: Optional[str] = None, precision: Optional[str] = None):
+    """Index of the configured type holding ``vectors``; quantizers and IVF centroids are trained on all of them."""
+    index = create_index(dimension, len(vectors), index_type, precision)
+    if len(vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add_with_ids(vectors, np.asarray(vector_ids, dtype=np.int64))
+    return index
+
+
+def index_code_bytes(index) -> int:
+    """Bytes used by the encoded vectors of an index (graph links and centroids excluded)."""
+    storage = storage_index(index)
+    if isinstance(storage, faiss.IndexHNSW):
+        storage = faiss.downcast_index(storage.storage)
+    return int(storage.code_size * index.ntotal)
+
 
 class VectorDBManager:
     """Manages vector database for uploaded files"""
@@ -38,8 +188,230 @@ class VectorDBManager:
         self.index = None
         self.metadata = {}
         self.file_registry = {}
+        
+        # Full-precision chunk vectors, memory-mapped from disk; row i holds vector id i
+        self.chunk_vectors: Optional[np.ndarray] = None
+        
+        # Vector ids of removed chunks still in the index; searches skip them until compaction
+        self.removed_ids: Set[int] = set()
+        self._removed_selector = None
+        self.compact_min_vectors = VECTOR_DB_COMPACT_MIN_VECTORS
+        self._change_listeners: List[Callable[[str, str, Optional[np.ndarray]], None]] = []
+        
+        # Recent search results (chunk ids + distances) keyed by normalized query. Every index
+        # change bumps the generation, which empties the cache and discards in-flight results.
+        self.generation = 0
+        self._retrieval_cache: "OrderedDict[Tuple[str, int, Optional[str]], Tuple[List[Tuple[str, float]], float]]" = OrderedDict()
+        self._retrieval_hits = 0
+        self._retrieval_misses = 0
+        
         self.load_existing_data()
     
+    def add_change_listener(self, listener: Callable[[str, str, Optional[np.ndarray]], None]):
+        """
+        Register a callback for knowledge-base changes.
+        
+        Called as ``listener(event, file_id, chunk_embeddings)`` where event is "added" or
+        "removed"; chunk_embeddings holds the new file's chunk vectors for "added", else None.
+        """
+        self._change_listeners.append(listener)
+    
+    @staticmethod
+    def _matches_config(index, n_vectors: int) -> bool:
+        """
+        Whether ``index`` has the configured type and precision for ``n_vectors`` vectors.
+        IVF indexes also need retraining once the ideal number of lists is 2x off.
+        """
+        current, expected = current_layout(index), index_layout(n_vectors)
+        if current[:2] != expected[:2]:
+            return False
+        return not expected[2] or (expected[2] < 2 * current[2] and current[2] < 2 * expected[2])
+    
+    @property
+    def vector_chunk_ids(self) -> List[Optional[str]]:
+        """Persisted FAISS vector id -> chunk id array; ids are never reused, removed ids hold None."""
+        return self.metadata.setdefault("vector_chunk_ids", [])
+    
+    def _vector_ids_by_row(self) -> np.ndarray:
+        return faiss.vector_to_array(self.index.id_map).astype(np.int64)
+    
+    def _sync_removed_ids(self):
+        """Recompute the removed-but-still-indexed vector ids after the index was loaded or rebuilt."""
+        vector_chunk_ids = self.vector_chunk_ids
+        self.removed_ids = {
+            int(vector_id) for vector_id in self._vector_ids_by_row()
+            if vector_id >= len(vector_chunk_ids) or vector_chunk_ids[vector_id] is None
+        }
+        self._removed_selector = None
+    
+    @property
+    def live_vectors(self) -> int:
+        """Number of indexed vectors that still belong to a chunk."""
+        return self.index.ntotal - len(self.removed_ids)
+    
+    def _live_vector_ids(self) -> np.ndarray:
+        """Vector ids in the index, in row order, without the removed ones."""
+        vector_ids = self._vector_ids_by_row()
+        if self.removed_ids:
+            vector_ids = vector_ids[~np.isin(vector_ids, np.fromiter(self.removed_ids, dtype=np.int64))]
+        return vector_ids
+    
+    def _index_stored_vectors(self, new_ids: Optional[np.ndarray] = None):
+        """Rebuild the index from the stored vectors of the live chunks plus ``new_ids``, dropping removed ones."""
+        vector_ids = self._live_vector_ids()
+        if new_ids is not None:
+            vector_ids = np.concatenate([vector_ids, new_ids])
+        self.index = index_from_vectors(self.chunk_vectors[vector_ids], vector_ids, self.index.d)
+        self.removed_ids = set()
+        self._removed_selector = None
+    
+    def _assign_vector_ids(self, chunk_ids: List[Optional[str]]) -> np.ndarray:
+        """Allocate new vector ids for ``chunk_ids`` and record them on both sides of the mapping."""
+        start = len(self.vector_chunk_ids)
+        self.vector_chunk_ids.extend(chunk_ids)
+        for offset, chunk_id in enumerate(chunk_ids):
+            if chunk_id in self.metadata["chunk_metadata"]:
+                self.metadata["chunk_metadata"][chunk_id]["vector_id"] = start + offset
+        return np.arange(start, start + len(chunk_ids), dtype=np.int64)
+    
+    def _migrate_to_vector_ids(self):
+        """
+        Wrap an index written before vector ids in an id map. Chunk ids are matched to rows by
+        their recorded vector_index, or by metadata order for legacy knowledge-base chunks,
+        which is what searches relied on before.
+        """
+        ntotal = self.index.ntotal
+        row_chunk_ids = list(self.metadata["document_content"].keys())[:ntotal]
+        row_chunk_ids += [None] * (ntotal - len(row_chunk_ids))
+        for chunk_id, info in self.metadata["chunk_metadata"].items():
+            row = info.get("vector_index")
+            if row is not None and 0 <= row < ntotal and chunk_id in self.metadata["document_content"]:
+                row_chunk_ids[row] = chunk_id
+        
+        vectors = self.chunk_vectors
+        if vectors is None:
+            vectors = storage_index(self.index).reconstruct_n(0, ntotal) if ntotal else np.empty((0, self.index.d))
+        self.metadata["vector_chunk_ids"] = []
+        self.index = index_from_vectors(vectors, self._assign_vector_ids(row_chunk_ids), self.index.d)
+        logger.info(f"Assigned vector ids to {ntotal} indexed chunks")
+    
+    @property
+    def approximate(self) -> bool:
+        """Whether searches need a full-precision re-score (anything but a float32 flat index)."""
+        return current_layout(self.index)[:2] != ("flat", "float32")
+    
+    def _save_chunk_vectors(self, vectors: np.ndarray):
+        """Atomically persist the full-precision chunk vectors and map them back read-only."""
+        tmp_path = CHUNK_VECTORS_PATH.with_suffix(".tmp.npy")
+        np.save(tmp_path, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, CHUNK_VECTORS_PATH)
+        self.chunk_vectors = np.load(CHUNK_VECTORS_PATH, mmap_mode="r")
+    
+    def _append_chunk_vectors(self, vectors: np.ndarray):
+        """
+        Append rows to the stored chunk vectors without rewriting the existing ones: the rows are
+        written after the current data and only the shape in the .npy header changes. Files whose
+        header cannot grow in place are rewritten once.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n_rows = self.chunk_vectors.shape[0]
+        try:
+            with open(CHUNK_VECTORS_PATH, "r+b") as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    read_header, write_header = np.lib.format.read_array_header_1_0, np.lib.format.write_array_header_1_0
+                else:
+                    read_header, write_header = np.lib.format.read_array_header_2_0, np.lib.format.write_array_header_2_0
+                shape, fortran_order, dtype = read_header(f)
+                data_offset = f.tell()
+                header = io.BytesIO()
+                write_header(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order,
+                                      "shape": (n_rows + len(vectors), vectors.shape[1])})
+                if (len(header.getvalue()) != data_offset or shape != self.chunk_vectors.shape
+                        or dtype != np.float32 or fortran_order):
+                    raise ValueError("header cannot grow in place")
+                # Rows first, then the header that makes them visible; a torn append leaves the old shape
+                f.seek(data_offset + n_rows * vectors.shape[1] * vectors.itemsize)
+                f.write(vectors.tobytes())
+                f.truncate()
+                f.flush()
+                f.seek(0)
+                f.write(header.getvalue())
+            self.chunk_vectors = np.load(CHUNK_VECTORS_PATH, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.info(f"Rewriting {CHUNK_VECTORS_PATH} instead of appending: {e}")
+            self._save_chunk_vectors(np.concatenate([self.chunk_vectors, vectors]))
+    
+    def _rows_to_ids(self, vectors: np.ndarray) -> np.ndarray:
+        """Vectors stored in index row order, rearranged so that row i holds vector id i."""
+        if not isinstance(self.index, faiss.IndexIDMap2):
+            # Ids are about to be assigned in row order
+            return np.asarray(vectors, dtype=np.float32)
+        by_id = np.zeros((len(self.vector_chunk_ids), vectors.shape[1]), dtype=np.float32)
+        by_id[self._vector_ids_by_row()] = vectors
+        return by_id
+    
+    def _load_chunk_vectors(self):
+        """
+        Map the persisted chunk vectors. Files written in index row order are rearranged by vector
+        id once. Databases written before the vectors were persisted recover them from a flat
+        index; a quantized index without them is searched unrefined.
+        """
+        self.chunk_vectors = None
+        ntotal = self.index.ntotal
+        n_ids = len(self.vector_chunk_ids)
+        if CHUNK_VECTORS_PATH.exists():
+            vectors = np.load(CHUNK_VECTORS_PATH, mmap_mode="r")
+            if vectors.shape[0] == n_ids:
+                self.chunk_vectors = vectors
+                return
+            if vectors.shape[0] == ntotal:
+                self._save_chunk_vectors(self._rows_to_ids(vectors))
+                return
+            logger.warning(f"Ignoring {CHUNK_VECTORS_PATH}: {vectors.shape[0]} rows for {n_ids} vector ids")
+        if ntotal == 0:
+            self.chunk_vectors = np.zeros((n_ids, self.index.d), dtype=np.float32)
+        elif isinstance(storage_index(self.index), faiss.IndexFlat):
+            self._save_chunk_vectors(self._rows_to_ids(storage_index(self.index).reconstruct_n(0, ntotal)))
+        else:
+            logger.warning("Full-precision chunk vectors unavailable; quantized search results are not re-scored")
+    
+    def _bump_generation(self):
+        """Mark the index as changed so cached search results are no longer served."""
+        self.generation += 1
+        self._retrieval_cache.clear()
+    
+    @staticmethod
+    def _retrieval_key(query: str) -> str:
+        """Query text folded for retrieval-cache lookups (case, punctuation and whitespace)."""
+        return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', query.lower())).strip()
+    
+    def _get_cached_retrieval(self, key: Tuple[str, int, Optional[str]]) -> Optional[List[Tuple[str, float]]]:
+        entry = self._retrieval_cache.get(key)
+        if entry is not None and time.time() - entry[1] <= RETRIEVAL_CACHE_TTL_SECONDS:
+            self._retrieval_cache.move_to_end(key)
+            self._retrieval_hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._retrieval_cache[key]
+        self._retrieval_misses += 1
+        return None
+    
+    def _put_cached_retrieval(self, key: Tuple[str, int, Optional[str]], hits: List[Tuple[str, float]]):
+        if RETRIEVAL_CACHE_MAX_ENTRIES <= 0:
+            return
+        self._retrieval_cache[key] = (hits, time.time())
+        self._retrieval_cache.move_to_end(key)
+        while len(self._retrieval_cache) > RETRIEVAL_CACHE_MAX_ENTRIES:
+            self._retrieval_cache.popitem(last=False)
+    
+    def _notify_change(self, event: str, file_id: str, chunk_embeddings: Optional[np.ndarray] = None):
+        for listener in self._change_listeners:
+            try:
+                listener(event, file_id, chunk_embeddings)
+            except Exception as e:
+                logger.error(f"Knowledge-base change listener failed for {event} {file_id}: {str(e)}")
+    
     def load_existing_data(self):
         """Load existing vector database and metadata"""
         try:
@@ -54,7 +426,7 @@ class VectorDBManager:
                 logger.info(f"Loaded vector database with {self.index.ntotal} chunks")
             else:
                 # Initialize new database
-                self.index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+                self.index = create_index(EMBEDDING_DIMENSION)
                 self.metadata = {
                     "document_content": {},
                     "chunk_metadata": {},
@@ -74,17 +446,50 @@ class VectorDBManager:
                     self.file_registry = json.load(f)
             else:
                 self.file_registry = {}
+            
+            self._load_chunk_vectors()
+            
+            if not isinstance(self.index, faiss.IndexIDMap2):
+                self._migrate_to_vector_ids()
+                self.save_database()
+            
+            self._sync_removed_ids()
+            
+            # Re-encode as the configured index type and precision from the stored vectors (no embedding calls)
+            if not self._matches_config(self.index, self.live_vectors) and self.chunk_vectors is not None:
+                layout = index_layout(self.live_vectors)
+                logger.info(f"Converting vector index to {layout[0]} with {layout[1]} storage")
+                self._index_stored_vectors()
+                faiss.write_index(self.index, str(INDEX_PATH))
+            apply_search_params(self.index)
                 
         except Exception as e:
             logger.error(f"Error loading vector database: {str(e)}")
             # Initialize empty database on error
-            self.index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+            self.index = create_index(EMBEDDING_DIMENSION)
+            self.chunk_vectors = None
             self.metadata = {
                 "document_content": {},
                 "chunk_metadata": {},
                 "created_at": datetime.now().timestamp()
             }
             self.file_registry = {}
+            self._sync_removed_ids()
+        self._bump_generation()
+    
+    def reset_database(self):
+        """Empty the index, chunk vectors, chunk metadata and file registry (used before a full rebuild)."""
+        dimension = self.index.d if self.index is not None else EMBEDDING_DIMENSION
+        self.index = create_index(dimension)
+        self._save_chunk_vectors(np.empty((0, dimension), dtype=np.float32))
+        self.metadata = {
+            "document_content": {},
+            "chunk_metadata": {},
+            "created_at": datetime.now().timestamp()
+        }
+        self.file_registry = {}
+        self._sync_removed_ids()
+        self._bump_generation()
     
     def save_database(self):
         """Save vector database to disk"""
@@ -138,31 +543,39 @@ class VectorDBManager:
                 logger.error(f"Failed to generate embeddings for file {file_id}")
                 return False
             
-            # Add to FAISS index
-            embeddings_array = np.array(embeddings).astype('float32')
-            start_index = self.index.ntotal
-            self.index.add(embeddings_array)
-            
             # Store chunk metadata
+            chunk_ids = []
             for i, chunk in enumerate(chunks):
                 chunk_id = f"{file_id}_chunk_{i}"
-                chunk_index = start_index + i
+                chunk_ids.append(chunk_id)
                 
                 self.metadata["document_content"][chunk_id] = chunk
                 self.metadata["chunk_metadata"][chunk_id] = {
                     "file_id": file_id,
                     "chunk_index": i,
-                    "vector_index": chunk_index,
                     "chunk_length": len(chunk),
                     "created_at": datetime.now().timestamp()
                 }
             
+            # Add to FAISS index under newly allocated vector ids
+            embeddings_array = np.array(embeddings).astype('float32')
+            vector_ids = self._assign_vector_ids(chunk_ids)
+            if self.chunk_vectors is not None:
+                self._append_chunk_vectors(embeddings_array)
+            retrain = (not self.index.is_trained or current_layout(self.index)[1] == "int8"
+                       or not self._matches_config(self.index, self.live_vectors + len(chunks)))
+            if retrain and self.chunk_vectors is not None:
+                # Rebuilt from the stored vectors when the index type changes with corpus size,
+                # and for int8, whose ranges are retrained on every vector so a new file is never clipped
+                self._index_stored_vectors(vector_ids)
+            else:
+                self.index.add_with_ids(embeddings_array, vector_ids)
+            self._bump_generation()
+            
             # Register file
             self.file_registry[file_id] = {
                 "metadata": metadata,
                 "chunk_count": len(chunks),
-                "start_vector_index": start_index,
-                "end_vector_index": start_index + len(chunks) - 1,
                 "added_at": datetime.now().isoformat()
             }
             
@@ -170,6 +583,7 @@ class VectorDBManager:
             self.save_database()
             
             logger.info(f"Successfully added file {file_id} with {len(chunks)} chunks to vector database")
+            self._notify_change("added", file_id, embeddings_array)
             return True
             
         except Exception as e:
@@ -194,34 +608,92 @@ class VectorDBManager:
             # Get file info
             file_info = self.file_registry[file_id]
             
-            # Remove chunk metadata
-            chunks_to_remove = []
-            for chunk_id in list(self.metadata["document_content"].keys()):
-                if chunk_id.startswith(f"{file_id}_chunk_"):
-                    chunks_to_remove.append(chunk_id)
+            # The file's chunk ids follow from its chunk count, so other files' chunks are never scanned
+            chunks_to_remove = [
+                chunk_id for chunk_id in (f"{file_id}_chunk_{i}" for i in range(file_info.get("chunk_count", 0)))
+                if chunk_id in self.metadata["document_content"]
+            ]
+            
+            # Tombstone the file's vectors (no embedding calls)
+            self._remove_vectors(chunks_to_remove)
             
             for chunk_id in chunks_to_remove:
                 del self.metadata["document_content"][chunk_id]
-                del self.metadata["chunk_metadata"][chunk_id]
+                self.metadata["chunk_metadata"].pop(chunk_id, None)
             
             # Remove from file registry
             del self.file_registry[file_id]
             
-            # Rebuild FAISS index (required for removal)
-            await self._rebuild_index()
+            self.save_database()
             
             logger.info(f"Successfully removed file {file_id} from vector database")
+            self._notify_change("removed", file_id)
             return True
             
         except Exception as e:
             logger.error(f"Error removing file {file_id} from database: {str(e)}")
             return False
     
+    def _remove_vectors(self, chunk_ids: List[str]):
+        """
+        Tombstone the vectors of ``chunk_ids`` in O(removed chunks): their ids stop resolving to
+        chunks and searches skip them. The index, the stored vectors and the other chunks' metadata
+        are left alone until removed vectors outnumber the live ones, when _compact_vectors drops
+        them in one pass. No embedding calls are made.
+        """
+        chunk_metadata = self.metadata["chunk_metadata"]
+        vector_ids = [chunk_metadata[chunk_id]["vector_id"] for chunk_id in chunk_ids
+                      if "vector_id" in chunk_metadata.get(chunk_id, {})]
+        if not vector_ids:
+            return
+        for vector_id in vector_ids:
+            self.vector_chunk_ids[vector_id] = None
+        self.removed_ids.update(vector_ids)
+        self._removed_selector = None
+        self._bump_generation()
+        
+        if self.chunk_vectors is not None:
+            removed_rows = len(self.vector_chunk_ids) - self.live_vectors
+        else:
+            removed_rows = len(self.removed_ids)
+        if removed_rows >= max(self.compact_min_vectors, self.live_vectors):
+            self._compact_vectors()
+    
+    def _compact_vectors(self):
+        """
+        Drop removed vectors for good. With stored vectors, the live chunks get consecutive new
+        vector ids, the vector file is rewritten and the index rebuilt from it. Without them,
+        removed ids are deleted from the index where its type allows (HNSW keeps skipping them).
+        """
+        if self.chunk_vectors is None:
+            try:
+                self.index.remove_ids(np.fromiter(self.removed_ids, dtype=np.int64))
+            except RuntimeError as e:
+                logger.warning(f"Index cannot delete vectors, removed chunks stay excluded from searches: {e}")
+                return
+            self.removed_ids = set()
+            self._removed_selector = None
+            return
+        
+        live_ids = np.array([vector_id for vector_id, chunk_id in enumerate(self.vector_chunk_ids)
+                             if chunk_id is not None], dtype=np.int64)
+        chunk_ids = [self.vector_chunk_ids[vector_id] for vector_id in live_ids]
+        vectors = np.asarray(self.chunk_vectors[live_ids], dtype=np.float32)
+        self.metadata["vector_chunk_ids"] = []
+        new_ids = self._assign_vector_ids(chunk_ids)
+        self._save_chunk_vectors(vectors)
+        self.index = index_from_vectors(vectors, new_ids, self.index.d)
+        self.removed_ids = set()
+        self._removed_selector = None
+        logger.info(f"Compacted vector database to {len(new_ids)} vectors")
+    
     async def _rebuild_index(self):
-        """Rebuild FAISS index after file removal"""
+        """Re-embed every chunk and rebuild the FAISS index from the fresh vectors"""
         try:
             # Create new index
-            new_index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+            new_index = create_index(EMBEDDING_DIMENSION)
+            vectors = np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+            self.metadata["vector_chunk_ids"] = []
             
             # Get all remaining chunks
             all_chunks = list(self.metadata["document_content"].values())
@@ -231,16 +703,17 @@ class VectorDBManager:
                 embeddings = await self._generate_embeddings(all_chunks)
                 
                 if embeddings:
-                    embeddings_array = np.array(embeddings).astype('float32')
-                    new_index.add(embeddings_array)
+                    vectors = np.array(embeddings).astype('float32')
                     
-                    # Update vector indices in metadata
+                    # Vector ids restart from 0 in chunk order
                     chunk_ids = list(self.metadata["document_content"].keys())
-                    for i, chunk_id in enumerate(chunk_ids):
-                        self.metadata["chunk_metadata"][chunk_id]["vector_index"] = i
+                    new_index = index_from_vectors(vectors, self._assign_vector_ids(chunk_ids), EMBEDDING_DIMENSION)
             
             # Replace old index
             self.index = new_index
+            self._save_chunk_vectors(vectors)
+            self._sync_removed_ids()
+            self._bump_generation()
             
             # Save updated database
             self.save_database()
@@ -251,7 +724,54 @@ class VectorDBManager:
             logger.error(f"Error rebuilding index: {str(e)}")
             raise
     
-    async def search_similar_chunks(self, query: str, k: int = 5, file_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def _file_vector_ids(self, file_id: str) -> np.ndarray:
+        """Vector ids of a file's chunks, looked up by chunk id in O(chunks of the file)."""
+        chunk_metadata = self.metadata["chunk_metadata"]
+        chunk_count = self.file_registry.get(file_id, {}).get("chunk_count", 0)
+        chunk_ids = (f"{file_id}_chunk_{i}" for i in range(chunk_count))
+        return np.array([chunk_metadata[chunk_id]["vector_id"] for chunk_id in chunk_ids
+                         if "vector_id" in chunk_metadata.get(chunk_id, {})], dtype=np.int64)
+    
+    def _selector_params(self, selector):
+        """FAISS search parameters applying an id ``selector``, keeping efSearch/nprobe."""
+        storage = storage_index(self.index)
+        if isinstance(storage, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=storage.hnsw.efSearch)
+        if isinstance(storage, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=storage.nprobe)
+        return faiss.SearchParameters(sel=selector)
+    
+    def _live_search_params(self):
+        """Search parameters skipping removed vectors that are still in the index, or None if there are none."""
+        if not self.removed_ids:
+            return None
+        if self._removed_selector is None:
+            removed = faiss.IDSelectorBatch(np.fromiter(self.removed_ids, dtype=np.int64))
+            self._removed_selector = (removed, faiss.IDSelectorNot(removed))
+        return self._selector_params(self._removed_selector[1])
+    
+    def _search_file(self, query_embedding: np.ndarray, k: int, file_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (distances, vector ids) among one file's chunks. Only that file's vectors are
+        scored: exactly against the stored full-precision rows, or through an IDSelector on
+        the index when those are unavailable.
+        """
+        vector_ids = self._file_vector_ids(file_id)
+        k = min(k, len(vector_ids))
+        if k == 0:
+            return np.empty(0, dtype=np.float32), vector_ids
+        if self.chunk_vectors is None:
+            selector = faiss.IDSelectorBatch(vector_ids)
+            distances, found = self.index.search(query_embedding, k, params=self._selector_params(selector))
+            return distances[0], found[0]
+        
+        distances = ((self.chunk_vectors[vector_ids] - query_embedding) ** 2).sum(axis=1)
+        order = np.argpartition(distances, k - 1)[:k]
+        order = order[np.argsort(distances[order])]
+        return distances[order], vector_ids[order]
+    
+    async def search_similar_chunks(self, query: str, k: int = 5, file_id: Optional[str] = None,
+                                    query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
         """
         Search for similar chunks in the database
         
@@ -259,97 +779,199 @@ class VectorDBManager:
             query: Search query
             k: Number of results to return
             file_id: Optional file ID to limit search scope
+            query_embedding: Precomputed query embedding; defaults to the shared memoized one
             
         Returns:
             List of similar chunks with metadata
         """
         try:
-            if self.index.ntotal == 0:
+            if self.live_vectors == 0:
                 return []
             
-            # Generate query embedding
-            query_embeddings = await self._generate_embeddings([query])
-            if not query_embeddings:
-                return []
+            # Near-duplicate queries against an unchanged index skip embedding and FAISS search
+            cache_key = (self._retrieval_key(query), k, file_id)
+            hits = self._get_cached_retrieval(cache_key) if cache_key[0] else None
+            if hits is None:
+                generation = self.generation
+                
+                # Reuse the query embedding computed (or still being computed) for the answer cache lookup
+                if query_embedding is None:
+                    query_embedding = await aembed_query(query)
+                if query_embedding is None:
+                    return []
+                
+                query_embedding = truncate_embedding(query_embedding, self.index.d).reshape(1, -1)
+                
+                if file_id:
+                    # Only the file's own vectors are searched, so a file with k chunks always yields k hits
+                    distances, vector_ids = self._search_file(query_embedding, k, file_id)
+                else:
+                    distances, vector_ids = self._search_index(query_embedding, k)[0]
+                hits = self._resolve_hits(distances, vector_ids)
+                if cache_key[0] and generation == self.generation:
+                    self._put_cached_retrieval(cache_key, hits)
             
-            query_embedding = np.array([query_embeddings[0]]).astype('float32')
+            return self._build_results(hits, file_id)
             
-            # Search the index
-            distances, indices = self.index.search(query_embedding, min(k, self.index.ntotal))
+        except Exception as e:
+            logger.error(f"Error searching chunks: {str(e)}")
+            return []
+    
+    async def search_many(self, queries: List[str], k: int = 5,
+                          file_id: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once.
+        
+        Queries answered by the retrieval cache are served from it; the rest are embedded in
+        one batched request (memoized embeddings are reused) and searched with a single
+        FAISS call over the stacked query matrix. Repeated queries are searched once.
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            file_id: Optional file ID to limit search scope
             
-            # Get results
-            results = []
-            chunk_ids = list(self.metadata["document_content"].keys())
+        Returns:
+            One list of similar chunks per query, in query order
+        """
+        try:
+            if self.live_vectors == 0 or not queries:
+                return [[] for _ in queries]
             
-            for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-                if 0 <= idx < len(chunk_ids):
-                    chunk_id = chunk_ids[idx]
-                    
-                    # Handle both old and new chunk formats
-                    if chunk_id in self.metadata["chunk_metadata"]:
-                        # New file management format
-                        chunk_metadata = self.metadata["chunk_metadata"][chunk_id]
-                        
-                        # Filter by file_id if specified
-                        if file_id and chunk_metadata["file_id"] != file_id:
-                            continue
-                        
-                        result = {
-                            "chunk_id": chunk_id,
-                            "content": self.metadata["document_content"][chunk_id],
-                            "distance": float(distance),
-                            "similarity_score": float(1.0 / (1.0 + float(distance))),
-                            "file_id": chunk_metadata["file_id"],
-                            "chunk_index": chunk_metadata["chunk_index"],
-                            "file_metadata": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}),
-                            "source_info": {
-                                "filename": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}).get("original_filename", "Unknown"),
-                                "file_type": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}).get("file_type", "Unknown"),
-                                "description": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}).get("user_description", ""),
-                                "upload_date": self.file_registry.get(chunk_metadata["file_id"], {}).get("added_at", ""),
-                                "chunk_number": chunk_metadata["chunk_index"] + 1,
-                                "source_type": "uploaded_document"
-                            }
-                        }
+            generation = self.generation
+            hits_per_query: List[Optional[List[Tuple[str, float]]]] = []
+            pending: Dict[Any, List[int]] = {}
+            for position, query in enumerate(queries):
+                cache_key = (self._retrieval_key(query), k, file_id)
+                hits = self._get_cached_retrieval(cache_key) if cache_key[0] else None
+                hits_per_query.append(hits)
+                if hits is None:
+                    pending.setdefault(cache_key if cache_key[0] else position, []).append(position)
+            
+            if pending:
+                keys = list(pending)
+                # One batched embeddings request, kept off the event loop
+                embeddings = await asyncio.to_thread(embed_queries, [queries[pending[key][0]] for key in keys])
+                embedded = [(key, embedding) for key, embedding in zip(keys, embeddings) if embedding is not None]
+                if embedded:
+                    query_matrix = np.vstack([truncate_embedding(embedding, self.index.d) for _, embedding in embedded])
+                    if file_id:
+                        searched = [self._search_file(row.reshape(1, -1), k, file_id) for row in query_matrix]
                     else:
-                        # Old knowledge base format
-                        if file_id:
-                            # Skip old format chunks when filtering by file_id
-                            continue
-                        
-                        # Extract file info from old chunk_id format
-                        file_name = chunk_id.rsplit('_', 1)[0] if '_' in chunk_id else chunk_id
-                        chunk_index = chunk_id.rsplit('_', 1)[1] if '_' in chunk_id else "0"
-                        
-                        result = {
-                            "chunk_id": chunk_id,
-                            "content": self.metadata["document_content"][chunk_id],
-                            "distance": float(distance),
-                            "similarity_score": float(1.0 / (1.0 + float(distance))),
-                            "file_id": file_name,  # Use filename as file_id for old chunks
-                            "chunk_index": chunk_index,
-                            "file_metadata": {
-                                "original_filename": file_name,
-                                "file_type": "Knowledge Base Document",
-                                "source": "legacy_knowledge_base"
-                            },
-                            "source_info": {
-                                "filename": file_name,
-                                "file_type": "Knowledge Base Document", 
-                                "description": f"Legacy knowledge base: {file_name.replace('_processed.txt', '').replace('_', ' ')}",
-                                "upload_date": "Legacy Import",
-                                "chunk_number": int(chunk_index) + 1 if chunk_index.isdigit() else 1,
-                                "source_type": "knowledge_base"
-                            }
-                        }
+                        searched = self._search_index(query_matrix, k)
                     
-                    results.append(result)
+                    for (key, _), (distances, vector_ids) in zip(embedded, searched):
+                        hits = self._resolve_hits(distances, vector_ids)
+                        if isinstance(key, tuple) and generation == self.generation:
+                            self._put_cached_retrieval(key, hits)
+                        for position in pending[key]:
+                            hits_per_query[position] = hits
             
-            return results
+            return [self._build_results(hits or [], file_id) for hits in hits_per_query]
             
         except Exception as e:
-            logger.error(f"Error searching chunks: {str(e)}")
-            return []
+            logger.error(f"Error searching {len(queries)} queries: {str(e)}")
+            return [[] for _ in queries]
+    
+    def _search_index(self, query_matrix: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        One FAISS search over a stacked query matrix; (distances, vector ids) per query.
+        Approximate hits are re-ranked by exact distance to the stored chunk vectors.
+        """
+        rescore = self.chunk_vectors is not None and self.approximate
+        fetch = k * RESCORE_FACTOR if rescore else k
+        distances, vector_ids = self.index.search(query_matrix, min(fetch, self.index.ntotal),
+                                                  params=self._live_search_params())
+        if not rescore:
+            return list(zip(distances, vector_ids))
+        
+        searched = []
+        for query_embedding, candidate_ids in zip(query_matrix, vector_ids):
+            candidate_ids = candidate_ids[candidate_ids >= 0]
+            exact_distances = ((self.chunk_vectors[candidate_ids] - query_embedding) ** 2).sum(axis=1)
+            order = np.argsort(exact_distances)[:k]
+            searched.append((exact_distances[order], candidate_ids[order]))
+        return searched
+    
+    def _resolve_hits(self, distances: np.ndarray, vector_ids: np.ndarray) -> List[Tuple[str, float]]:
+        """(chunk id, distance) pairs resolved through the id -> chunk id array, O(k)."""
+        vector_chunk_ids = self.vector_chunk_ids
+        return [
+            (vector_chunk_ids[vector_id], float(distance))
+            for distance, vector_id in zip(distances, vector_ids)
+            if 0 <= vector_id < len(vector_chunk_ids) and vector_chunk_ids[vector_id] is not None
+        ]
+    
+    def _build_results(self, hits: List[Tuple[str, float]], file_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Result dicts with chunk content and source attribution for (chunk id, distance) hits."""
+        results = []
+        for chunk_id, distance in hits:
+            if chunk_id in self.metadata["document_content"]:
+                # Handle both old and new chunk formats
+                if chunk_id in self.metadata["chunk_metadata"]:
+                    # New file management format
+                    chunk_metadata = self.metadata["chunk_metadata"][chunk_id]
+                    
+                    # Filter by file_id if specified
+                    if file_id and chunk_metadata["file_id"] != file_id:
+                        continue
+                    
+                    result = {
+                        "chunk_id": chunk_id,
+                        "content": self.metadata["document_content"][chunk_id],
+                        "distance": float(distance),
+                        "similarity_score": float(1.0 / (1.0 + float(distance))),
+                        "file_id": chunk_metadata["file_id"],
+                        "chunk_index": chunk_metadata["chunk_index"],
+                        "file_metadata": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}),
+                        "source_info": {
+                            "filename": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}).get("original_filename", "Unknown"),
+                            "file_type": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}).get("file_type", "Unknown"),
+                            "description": self.file_registry.get(chunk_metadata["file_id"], {}).get("metadata", {}).get("user_description", ""),
+                            "upload_date": self.file_registry.get(chunk_metadata["file_id"], {}).get("added_at", ""),
+                            "chunk_number": chunk_metadata["chunk_index"] + 1,
+                            "source_type": "uploaded_document",
+                            "file_id": chunk_metadata["file_id"],
+                            "chunk_id": chunk_id
+                        }
+                    }
+                else:
+                    # Old knowledge base format
+                    if file_id:
+                        # Skip old format chunks when filtering by file_id
+                        continue
+                    
+                    # Extract file info from old chunk_id format
+                    file_name = chunk_id.rsplit('_', 1)[0] if '_' in chunk_id else chunk_id
+                    chunk_index = chunk_id.rsplit('_', 1)[1] if '_' in chunk_id else "0"
+                    
+                    result = {
+                        "chunk_id": chunk_id,
+                        "content": self.metadata["document_content"][chunk_id],
+                        "distance": float(distance),
+                        "similarity_score": float(1.0 / (1.0 + float(distance))),
+                        "file_id": file_name,  # Use filename as file_id for old chunks
+                        "chunk_index": chunk_index,
+                        "file_metadata": {
+                            "original_filename": file_name,
+                            "file_type": "Knowledge Base Document",
+                            "source": "legacy_knowledge_base"
+                        },
+                        "source_info": {
+                            "filename": file_name,
+                            "file_type": "Knowledge Base Document", 
+                            "description": f"Legacy knowledge base: {file_name.replace('_processed.txt', '').replace('_', ' ')}",
+                            "upload_date": "Legacy Import",
+                            "chunk_number": int(chunk_index) + 1 if chunk_index.isdigit() else 1,
+                            "source_type": "knowledge_base",
+                            "file_id": file_name,
+                            "chunk_id": chunk_id
+                        }
+                    }
+                
+                results.append(result)
+        
+        return results
     
     def get_file_list(self) -> List[Dict[str, Any]]:
         """Get list of all files in the database"""
@@ -406,7 +1028,7 @@ class VectorDBManager:
         """Get database statistics"""
         try:
             total_files = len(self.file_registry)
-            total_chunks = self.index.ntotal if self.index else 0
+            total_chunks = self.live_vectors if self.index else 0
             
             # Calculate total content size
             total_content_size = sum(
@@ -425,7 +1047,16 @@ class VectorDBManager:
                 "total_content_size": total_content_size,
                 "file_types": file_types,
                 "database_created_at": self.metadata.get("created_at"),
-                "last_updated": datetime.now().isoformat()
+                "last_updated": datetime.now().isoformat(),
+                "index_type": current_layout(self.index)[0],
+                "precision": current_layout(self.index)[1],
+                "index_bytes": index_code_bytes(self.index),
+                "retrieval_cache": {
+                    "size": len(self._retrieval_cache),
+                    "hits": self._retrieval_hits,
+                    "misses": self._retrieval_misses,
+                    "generation": self.generation
+                }
             }
             
         except Exception as e:
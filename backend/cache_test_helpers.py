@@ -0,0 +1,78 @@
+"""
+Shared offline fakes for the answer cache and vector database tests.
+Nothing here calls OpenAI: embeddings come from deterministic local functions.
+"""
+
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from app.utils import query_embedding as query_embedding_module
+from app.utils.answer_cache import AnswerCache
+
+
+def offline_embedding(text: str) -> List[float]:
+    """Deterministic 8-dimensional embedding derived from the folded text."""
+    seed = sum(ord(c) for c in text.lower())
+    return [float((seed * (i + 1)) % 97) / 97.0 + 0.01 for i in range(8)]
+
+
+class OfflineAnswerCache(AnswerCache):
+    """Answer cache with deterministic local embeddings instead of OpenAI calls."""
+
+    def __init__(self, cache_file_path=None, embed: Callable[[str], List[float]] = offline_embedding):
+        self.embed = embed
+        super().__init__(cache_file_path)
+
+    def get_embedding(self, text: str):
+        return self.embed(text)
+
+    async def aget_embedding(self, text: str):
+        return self.embed(text)
+
+    def get_embeddings(self, texts: List[str]):
+        return [self.embed(text) if text and text.strip() else None for text in texts]
+
+
+def make_answer(text: str = "answer", confidence: float = 0.9, age_seconds: float = 0,
+                response_time_ms: float = 2000) -> dict:
+    """Cache entry as stored by /analyze, with only the fields the tests look at."""
+    return {
+        'intent': 'test_intent',
+        'straightforward_answer': text,
+        'meta': {
+            'confidence': confidence,
+            'response_time_ms': response_time_ms,
+            'timestamp': (datetime.now() - timedelta(seconds=age_seconds)).isoformat()
+        }
+    }
+
+
+class CountingEmbeddings:
+    """Stand-in for client.embeddings that counts API calls and records request sizes."""
+
+    def __init__(self, vector: Callable[[str], List[float]] = lambda text: [float(len(text)), 1.0, 0.5]):
+        self.vector = vector
+        self.calls = 0
+        self.requests = []
+
+    def create(self, model, input):
+        inputs = input if isinstance(input, list) else [input]
+        self.calls += 1
+        self.requests.append(len(inputs))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=self.vector(text)) for text in inputs])
+
+
+@contextmanager
+def fake_embeddings_client(embeddings):
+    """Route the shared query-embedding client to ``embeddings`` for the duration of the block."""
+    original_client = query_embedding_module.client
+    query_embedding_module.client = SimpleNamespace(embeddings=embeddings)
+    try:
+        yield embeddings
+    finally:
+        query_embedding_module.client = original_client
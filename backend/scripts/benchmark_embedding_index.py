@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+EmbeddingIndex Benchmark
+
+Measures insert throughput and lookup latency of the answer cache EmbeddingIndex at
+several cache sizes, and compares lookups against the previous implementation
+(per-query row norms plus a full argsort over the similarity vector).
+
+Uses random unit vectors, so no OpenAI calls are made.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.utils.answer_cache import EmbeddingIndex
+
+
+def legacy_find_similar(embeddings: np.ndarray, query_vec: np.ndarray, top_k: int) -> np.ndarray:
+    """The previous lookup: recompute all row norms and sort every similarity."""
+    similarities = np.dot(embeddings, query_vec) / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_vec)
+    )
+    return np.argsort(similarities)[::-1][:top_k]
+
+
+def time_per_call_ms(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def benchmark_size(size: int, dimension: int, queries: int, top_k: int, rng: np.random.Generator) -> dict:
+    vectors = rng.standard_normal((size, dimension)).astype(np.float32)
+    query_vecs = rng.standard_normal((queries, dimension)).astype(np.float32)
+
+    index = EmbeddingIndex()
+    start = time.perf_counter()
+    for i in range(size):
+        index.add_embedding(f"question {i}", vectors[i])
+    insert_us = (time.perf_counter() - start) * 1e6 / size
+
+    query_iter = iter(np.tile(query_vecs, (2, 1)))
+    lookup_ms = time_per_call_ms(lambda: index.find_similar(next(query_iter), top_k=top_k), queries)
+
+    legacy_matrix = vectors.astype(np.float64)
+    query_iter = iter(np.tile(query_vecs.astype(np.float64), (2, 1)))
+    legacy_ms = time_per_call_ms(lambda: legacy_find_similar(legacy_matrix, next(query_iter), top_k), queries)
+
+    return {
+        "size": size,
+        "insert_us": insert_us,
+        "lookup_ms": lookup_ms,
+        "legacy_lookup_ms": legacy_ms,
+        "index_mb": index.embeddings.nbytes / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the answer cache EmbeddingIndex")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Number of cached questions to benchmark")
+    parser.add_argument("--dimension", type=int, default=1536,
+                        help="Embedding dimension (text-embedding-3-small is 1536)")
+    parser.add_argument("--queries", type=int, default=50,
+                        help="Number of lookups to average per size")
+    parser.add_argument("--top-k", type=int, default=5,
+                        help="Number of neighbours returned per lookup")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+
+    print("=" * 72)
+    print(f"{'entries':>10} {'insert (us)':>12} {'lookup (ms)':>12} {'legacy (ms)':>12} {'speedup':>8} {'index MB':>9}")
+    print("-" * 72)
+    for size in args.sizes:
+        result = benchmark_size(size, args.dimension, args.queries, args.top_k, rng)
+        speedup = result["legacy_lookup_ms"] / result["lookup_ms"] if result["lookup_ms"] else float("inf")
+        print(f"{result['size']:>10} {result['insert_us']:>12.2f} {result['lookup_ms']:>12.3f} "
+              f"{result['legacy_lookup_ms']:>12.3f} {speedup:>7.1f}x {result['index_mb']:>9.1f}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Quantized Storage Benchmark
+
+Reports the memory saved and the recall@k lost when embeddings are stored as float16 or
+int8 instead of float32, for both the answer cache EmbeddingIndex and the FAISS chunk index
+(IndexScalarQuantizer against IndexFlatL2). Recall is measured against the exact float32
+top-k, with and without the full-precision re-score of the top candidates.
+
+The index holds the canonical questions; queries are their precomputed paraphrases from
+ANSWER_CACHE_PARAPHRASES_PATH, or the questions themselves with added noise when no
+paraphrase file exists. Embedding the canonical questions makes one batched OpenAI call;
+--synthetic uses random vectors instead and makes no calls. --pad-to adds random rows so
+memory and recall can be read at realistic index sizes.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import faiss
+
+from app.config import ANSWER_CACHE_EMBEDDING_DIMENSION, EMBEDDING_DIMENSION
+from app.utils.answer_cache import AnswerCache, EmbeddingIndex, CACHE_EMBEDDING_MODEL, normalize_embedding
+from app.utils.cache_store import load_paraphrases
+from app.utils.query_embedding import truncate_embedding
+from app.utils.vector_db_manager import SCALAR_QUANTIZER_TYPES, RESCORE_FACTOR
+
+PRECISIONS = ["float32", "float16", "int8"]
+
+
+def canonical_vectors(args, rng: np.random.Generator):
+    """Full-dimension vectors for the index rows and the queries, plus a description of their source."""
+    if args.synthetic:
+        rows = rng.standard_normal((args.questions, EMBEDDING_DIMENSION)).astype(np.float32)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        queries = rows[:args.queries] + args.noise * rng.standard_normal((min(args.queries, len(rows)), rows.shape[1]))
+        return rows, queries.astype(np.float32), "synthetic"
+
+    from app.data.canonical_questions import get_canonical_questions_list
+    from app.utils import query_embedding
+
+    questions = get_canonical_questions_list()
+    embedded = query_embedding.embed_texts(questions)
+    if any(vector is None for vector in embedded):
+        raise SystemExit("Embedding the canonical questions failed; use --synthetic to run offline")
+    rows = np.array(embedded, dtype=np.float32)
+
+    paraphrases = load_paraphrases(args.paraphrases or AnswerCache().paraphrases_path, CACHE_EMBEDDING_MODEL)
+    query_rows = [vector for question in questions for vector in paraphrases.get(question, {}).values()]
+    if query_rows:
+        # Paraphrase vectors are stored at the cache dimension; pad the FAISS comparison with zeros
+        queries = np.zeros((len(query_rows), rows.shape[1]), dtype=np.float32)
+        for i, vector in enumerate(query_rows):
+            queries[i, :len(vector)] = vector
+        return rows, queries[:args.queries], f"{len(questions)} canonical questions, paraphrase queries"
+    queries = rows[:args.queries] + args.noise * rng.standard_normal((min(args.queries, len(rows)), rows.shape[1]))
+    return rows, queries.astype(np.float32), f"{len(questions)} canonical questions, noisy queries"
+
+
+def pad_rows(rows: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    if size <= len(rows):
+        return rows
+    padding = rng.standard_normal((size - len(rows), rows.shape[1])).astype(np.float32)
+    padding /= np.linalg.norm(padding, axis=1, keepdims=True)
+    return np.vstack([rows, padding])
+
+
+def recall(results: list, expected: list) -> float:
+    hits = sum(len(set(found) & set(exact)) for found, exact in zip(results, expected))
+    total = sum(len(exact) for exact in expected)
+    return hits / total if total else 1.0
+
+
+def benchmark_embedding_index(rows: np.ndarray, queries: np.ndarray, top_k: int) -> list:
+    """Memory and recall@k of EmbeddingIndex at each precision, at the cache dimension."""
+    rows = np.array([truncate_embedding(row, ANSWER_CACHE_EMBEDDING_DIMENSION) for row in rows])
+    queries = [normalize_embedding(truncate_embedding(query, ANSWER_CACHE_EMBEDDING_DIMENSION)) for query in queries]
+    questions = {f"q{i}": row for i, row in enumerate(rows)}
+
+    exact_index = EmbeddingIndex()
+    exact_index.build_index(questions)
+    expected = [EmbeddingIndex._top_indices(exact_index.similarities(query), top_k) for query in queries]
+
+    results = []
+    for precision in PRECISIONS:
+        index = EmbeddingIndex(precision=precision)
+        index.build_index(questions)
+        ranked = [EmbeddingIndex._top_indices(index.similarities(query), top_k) for query in queries]
+        index.full_rows = questions.get
+        rescored = [[index.positions[q] for q, _ in index.find_similar(query, top_k=top_k)] for query in queries]
+        # find_similar drops matches below 0.5; compare against the same filtered exact lists
+        exact_filtered = [[exact_index.positions[q] for q, _ in exact_index.find_similar(query, top_k=top_k)]
+                          for query in queries]
+        results.append({
+            "precision": precision,
+            "mb": index.nbytes / 1e6,
+            "recall": recall(ranked, expected),
+            "rescored_recall": recall(rescored, exact_filtered)
+        })
+    return results
+
+
+def faiss_index_bytes(index) -> int:
+    return int(index.ntotal * index.code_size)
+
+
+def benchmark_faiss(rows: np.ndarray, queries: np.ndarray, top_k: int) -> list:
+    """Memory and recall@k of the FAISS chunk index at each precision, at the full dimension."""
+    flat = faiss.IndexFlatL2(rows.shape[1])
+    flat.add(rows)
+    _, expected = flat.search(queries, top_k)
+
+    results = [{"precision": "float32", "mb": faiss_index_bytes(flat) / 1e6, "recall": 1.0, "rescored_recall": 1.0}]
+    for precision in PRECISIONS[1:]:
+        index = faiss.IndexScalarQuantizer(rows.shape[1], getattr(faiss.ScalarQuantizer, SCALAR_QUANTIZER_TYPES[precision]),
+                                           faiss.METRIC_L2)
+        index.train(rows)
+        index.add(rows)
+        _, ranked = index.search(queries, top_k)
+        _, candidates = index.search(queries, top_k * RESCORE_FACTOR)
+        rescored = []
+        for query, row_ids in zip(queries, candidates):
+            row_ids = row_ids[row_ids >= 0]
+            distances = ((rows[row_ids] - query) ** 2).sum(axis=1)
+            rescored.append(row_ids[np.argsort(distances)[:top_k]])
+        results.append({
+            "precision": precision,
+            "mb": faiss_index_bytes(index) / 1e6,
+            "recall": recall(ranked, expected),
+            "rescored_recall": recall(rescored, expected)
+        })
+    return results
+
+
+def print_results(title: str, results: list, top_k: int):
+    baseline = results[0]["mb"]
+    print(f"\n{title}")
+    print(f"{'precision':>10} {'index MB':>10} {'saved':>7} {f'recall@{top_k}':>10} {'re-scored':>10}")
+    for result in results:
+        saved = 1 - result["mb"] / baseline if baseline else 0.0
+        print(f"{result['precision']:>10} {result['mb']:>10.2f} {saved:>6.0%} "
+              f"{result['recall']:>10.3f} {result['rescored_recall']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark float16/int8 embedding storage")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Use random vectors instead of embedding the canonical questions")
+    parser.add_argument("--questions", type=int, default=1000,
+                        help="Number of synthetic index rows (with --synthetic)")
+    parser.add_argument("--pad-to", type=int, default=0,
+                        help="Add random rows until the index holds this many")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Maximum number of queries")
+    parser.add_argument("--noise", type=float, default=0.02,
+                        help="Per-component noise added to questions when no paraphrases are used as queries")
+    parser.add_argument("--paraphrases", default=None,
+                        help="Paraphrase .npz to draw queries from (defaults to the answer cache's)")
+    parser.add_argument("--top-k", type=int, default=5,
+                        help="Number of neighbours compared per query")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    rows, queries, source = canonical_vectors(args, rng)
+    rows = pad_rows(rows, args.pad_to, rng)
+
+    print("=" * 52)
+    print(f"Rows: {len(rows)} ({source}), queries: {len(queries)}")
+    print_results(f"Answer cache EmbeddingIndex ({ANSWER_CACHE_EMBEDDING_DIMENSION}-d)",
+                  benchmark_embedding_index(rows, queries, args.top_k), args.top_k)
+    print_results(f"FAISS chunk index ({rows.shape[1]}-d, re-score x{RESCORE_FACTOR})",
+                  benchmark_faiss(rows, queries, args.top_k), args.top_k)
+    print("=" * 52)
+
+
+if __name__ == "__main__":
+    main()
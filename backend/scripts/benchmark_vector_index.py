@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Vector Index Benchmark
+
+Builds each VECTOR_DB_INDEX_TYPE (flat, hnsw, ivf_flat, ivf_pq) through the same factories
+the vector database uses, and reports build time, search latency, encoded size and
+recall@k against exact search at several corpus sizes. Approximate indexes are searched the
+way VectorDBManager searches them: RESCORE_FACTOR * k candidates re-ranked by exact distance.
+
+For each size, the recommended index type is the fastest one whose recall meets
+--min-recall. Uses clustered random vectors by default, so no OpenAI calls are made;
+--from-db samples the stored chunk vectors of the vector database instead.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.config import EMBEDDING_DIMENSION, VECTOR_DB_PRECISION
+from app.utils import vector_db_manager as vector_db_module
+from app.utils.vector_db_manager import INDEX_TYPES, RESCORE_FACTOR, index_code_bytes, index_from_vectors
+
+
+def clustered_vectors(count: int, dimension: int, rng: np.random.Generator, clusters: int = 64) -> np.ndarray:
+    """Unit vectors around a few topic centers, closer to real embeddings than uniform noise."""
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def corpus(args, size: int, rng: np.random.Generator):
+    """Index rows and held-out queries for one corpus size."""
+    if args.from_db:
+        stored = np.load(vector_db_module.CHUNK_VECTORS_PATH, mmap_mode="r")
+        picked = rng.permutation(len(stored))[:size + args.queries]
+        vectors = np.asarray(stored[np.sort(picked)], dtype=np.float32)
+        return vectors[:-args.queries], vectors[-args.queries:]
+    vectors = clustered_vectors(size + args.queries, args.dimension, rng)
+    return vectors[:size], vectors[size:]
+
+
+def search(index, rows: np.ndarray, queries: np.ndarray, top_k: int, rescore: bool) -> np.ndarray:
+    """Top-k row ids per query, re-ranked exactly like VectorDBManager.search_similar_chunks."""
+    if not rescore:
+        return index.search(queries, top_k)[1]
+    _, candidates = index.search(queries, top_k * RESCORE_FACTOR)
+    results = []
+    for query, ids in zip(queries, candidates):
+        ids = ids[ids >= 0]
+        distances = ((rows[ids] - query) ** 2).sum(axis=1)
+        results.append(ids[np.argsort(distances)[:top_k]])
+    return results
+
+
+def recall(results, expected) -> float:
+    hits = sum(len(set(found) & set(exact)) for found, exact in zip(results, expected))
+    return hits / sum(len(exact) for exact in expected)
+
+
+def benchmark_size(args, size: int, rng: np.random.Generator) -> list:
+    rows, queries = corpus(args, size, rng)
+    ids = np.arange(len(rows))
+    results = []
+    expected = None
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = index_from_vectors(rows, ids, rows.shape[1], index_type=index_type, precision=args.precision)
+        build_s = time.perf_counter() - start
+
+        layout = vector_db_module.current_layout(index)
+        rescore = layout[:2] != ("flat", "float32")
+        search(index, rows, queries[:5], args.top_k, rescore)  # warm-up
+        start = time.perf_counter()
+        found = search(index, rows, queries, args.top_k, rescore)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        if expected is None:
+            exact = index_from_vectors(rows, ids, rows.shape[1], index_type="flat", precision="float32")
+            expected = exact.search(queries, args.top_k)[1]
+        results.append({
+            "index_type": index_type,
+            "layout": layout,
+            "build_s": build_s,
+            "latency_ms": latency_ms,
+            "mb": index_code_bytes(index) / 1e6,
+            "recall": recall(found, expected)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types for the vector database")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="Number of indexed chunks to benchmark")
+    parser.add_argument("--dimension", type=int, default=EMBEDDING_DIMENSION,
+                        help="Vector dimension for synthetic corpora")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES,
+                        help="Index types to compare")
+    parser.add_argument("--precision", default=VECTOR_DB_PRECISION, choices=["float32", "float16", "int8"],
+                        help="Storage precision for flat, hnsw and ivf_flat")
+    parser.add_argument("--queries", type=int, default=100,
+                        help="Number of held-out queries per size")
+    parser.add_argument("--top-k", type=int, default=5,
+                        help="Number of neighbours compared per query")
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="Minimum recall@k for an index type to be recommended")
+    parser.add_argument("--from-db", action="store_true",
+                        help="Sample the vector database's stored chunk vectors instead of synthetic ones")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    recommendations = []
+
+    print("=" * 86)
+    print(f"{'chunks':>8} {'index':>9} {'layout':>26} {'build (s)':>10} {'search (ms)':>12} {'MB':>8} {f'recall@{args.top_k}':>9}")
+    print("-" * 86)
+    for size in args.sizes:
+        results = benchmark_size(args, size, rng)
+        for result in results:
+            index_type, precision, nlist = result["layout"]
+            layout = f"{index_type}/{precision}" + (f"/nlist={nlist}" if nlist else "")
+            print(f"{size:>8} {result['index_type']:>9} {layout:>26} {result['build_s']:>10.2f} "
+                  f"{result['latency_ms']:>12.3f} {result['mb']:>8.1f} {result['recall']:>9.3f}")
+        eligible = [result for result in results if result["recall"] >= args.min_recall] or results[:1]
+        recommendations.append((size, min(eligible, key=lambda result: result["latency_ms"])["index_type"]))
+        print("-" * 86)
+
+    print(f"Recommended VECTOR_DB_INDEX_TYPE (recall@{args.top_k} >= {args.min_recall}):")
+    for size, index_type in recommendations:
+        print(f"  {size:>8} chunks: {index_type}")
+    print("=" * 86)
+
+
+if __name__ == "__main__":
+    main()
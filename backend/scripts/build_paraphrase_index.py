@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Paraphrase Index Builder
+
+Generates N paraphrases per canonical question with the chat model, embeds them in batched
+requests and writes answer_cache.paraphrases.npz. On startup the answer cache adds the
+paraphrases of every cached canonical question to its embedding index, so differently
+phrased live questions match the cached answer without any extra work at query time.
+
+Paraphrases that drift too far from their canonical question (cosine similarity below
+--min-similarity) or that normalize to the same text are dropped.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import OPENAI_MODEL, ANSWER_CACHE_EMBEDDING_DIMENSION
+from app.data.canonical_questions import get_canonical_questions_list
+from app.utils import query_embedding
+from app.utils.answer_cache import AnswerCache, CACHE_EMBEDDING_MODEL, normalize_embedding
+from app.utils.cache_store import save_paraphrases
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PARAPHRASE_PROMPT = """Rewrite the question below in {count} different ways a prospect might ask it out loud on a sales call.
+Vary the wording, length and formality, keep product names and the exact meaning, and do not add new topics.
+Respond with JSON: {{"paraphrases": ["...", "..."]}}
+
+Question: {question}"""
+
+
+def generate_paraphrases(question: str, count: int) -> list:
+    """Ask the chat model for ``count`` paraphrases of one question."""
+    response = query_embedding.client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[{"role": "user", "content": PARAPHRASE_PROMPT.format(count=count, question=question)}],
+        temperature=0.9,
+        response_format={"type": "json_object"}
+    )
+    paraphrases = json.loads(response.choices[0].message.content).get("paraphrases", [])
+    return [text.strip() for text in paraphrases if isinstance(text, str) and text.strip()][:count]
+
+
+def build_paraphrases(cache: AnswerCache, questions: list, count: int, min_similarity: float) -> dict:
+    """Generate, embed and filter paraphrases; returns canonical question -> paraphrase -> embedding."""
+    candidates = {}
+    for i, question in enumerate(questions, 1):
+        try:
+            generated = generate_paraphrases(question, count)
+        except Exception as e:
+            logger.error(f"Failed to paraphrase '{question[:50]}...': {e}")
+            continue
+        seen = {cache.normalize_question(question)}
+        candidates[question] = []
+        for text in generated:
+            key = cache.normalize_question(text)
+            if key and key not in seen:
+                seen.add(key)
+                candidates[question].append(text)
+        logger.info(f"[{i}/{len(questions)}] {len(candidates[question])} paraphrases for '{question[:50]}...'")
+
+    texts = [text for question, paraphrases in candidates.items() for text in [question, *paraphrases]]
+    vectors = iter(query_embedding.embed_texts(texts))
+
+    paraphrases = {}
+    dropped = 0
+    for question, generated in candidates.items():
+        canonical = next(vectors)
+        rows = [next(vectors) for _ in generated]
+        if canonical is None:
+            continue
+        canonical = normalize_embedding(query_embedding.truncate_embedding(canonical, ANSWER_CACHE_EMBEDDING_DIMENSION))
+        for text, row in zip(generated, rows):
+            if row is None:
+                continue
+            row = normalize_embedding(query_embedding.truncate_embedding(row, ANSWER_CACHE_EMBEDDING_DIMENSION))
+            if float(np.dot(canonical, row)) < min_similarity:
+                dropped += 1
+                continue
+            paraphrases.setdefault(question, {})[text] = row
+    logger.info(f"Dropped {dropped} paraphrases below similarity {min_similarity}")
+    return paraphrases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build paraphrase embeddings for canonical cached questions")
+    parser.add_argument("--count", type=int, default=5,
+                        help="Paraphrases to generate per canonical question")
+    parser.add_argument("--min-similarity", type=float, default=0.7,
+                        help="Drop paraphrases whose embedding similarity to the question is lower")
+    parser.add_argument("--cached-only", action="store_true",
+                        help="Only paraphrase canonical questions that are currently cached")
+    parser.add_argument("--output", default=None,
+                        help="Output .npz path (defaults to the answer cache's ANSWER_CACHE_PARAPHRASES_PATH)")
+    args = parser.parse_args()
+
+    cache = AnswerCache()
+    questions = get_canonical_questions_list()
+    if args.cached_only:
+        questions = [question for question in questions if question in cache.question_cache]
+    missing = sum(1 for question in questions if question not in cache.question_cache)
+    if missing:
+        logger.warning(f"{missing} canonical questions are not cached yet; their paraphrases activate once they are")
+
+    paraphrases = build_paraphrases(cache, questions, args.count, args.min_similarity)
+    output = args.output or cache.paraphrases_path
+    save_paraphrases(output, paraphrases, CACHE_EMBEDDING_MODEL)
+
+    total = sum(len(texts) for texts in paraphrases.values())
+    print("\n" + "=" * 60)
+    print("PARAPHRASE INDEX BUILT")
+    print("=" * 60)
+    print(f"Canonical questions: {len(paraphrases)}")
+    print(f"Paraphrases: {total}")
+    print(f"Embedding model: {CACHE_EMBEDDING_MODEL}")
+    print(f"Written to: {output}")
+    print("Restart the backend to load the new paraphrases.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test the batched bulk ingestion path of the answer cache.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import numpy as np
+
+from app.utils.answer_cache import AnswerCache, EmbeddingIndex
+from cache_test_helpers import CountingEmbeddings, fake_embeddings_client
+
+
+def test_add_embeddings_block():
+    """Bulk index inserts match one-by-one inserts and replace existing rows."""
+    print("🧪 Testing EmbeddingIndex.add_embeddings")
+
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((50, 8)).astype(np.float32)
+
+    one_by_one = EmbeddingIndex(initial_capacity=4)
+    for i, vector in enumerate(vectors):
+        one_by_one.add_embedding(f"q{i}", vector)
+
+    bulk = EmbeddingIndex(initial_capacity=4)
+    bulk.add_embedding("q0", vectors[1])
+    bulk.add_embeddings([f"q{i}" for i in range(50)], vectors)
+    assert bulk.size == 50
+    assert np.allclose(bulk.embeddings, one_by_one.embeddings, atol=1e-6)
+    assert bulk.find_similar(vectors[7], top_k=1)[0][0] == "q7"
+    print("   ✅ Block insert matches individual inserts")
+
+
+def test_add_many():
+    """Bulk adds embed in batches, persist once and report per-item failures."""
+    print("🧪 Testing AnswerCache.add_many")
+
+    fake_embeddings = CountingEmbeddings(lambda text: [float(len(text)), float(sum(map(ord, text)) % 13), 1.0])
+    with fake_embeddings_client(fake_embeddings):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "answer_cache.json"
+            cache = AnswerCache(cache_path)
+            cache.update_config(max_entries=10000)
+
+            items = [(f"Question number {i}", AnswerCache.build_simple_answer(f"Question number {i}", f"answer {i}"))
+                     for i in range(250)]
+            items.insert(10, ("   ", AnswerCache.build_simple_answer("", "blank")))
+            items.insert(20, ("Bad answer", "not a dict"))
+
+            result = cache.add_many(items)
+            assert result["added_count"] == 250 and result["total_count"] == 252
+            assert [error["index"] for error in result["errors"]] == [10, 20]
+            assert fake_embeddings.requests == [100, 100, 50], "Questions should be embedded in batches"
+            assert cache.embedding_index.size == 250
+            assert cache.get_cached_answer("Question number 42")["straightforward_answer"] == "answer 42"
+
+            reloaded = AnswerCache(cache_path)
+            assert len(reloaded.question_cache) == 250, "Bulk insert should be persisted"
+            assert reloaded.get_entry_id("Question number 7") == cache.get_entry_id("Question number 7")
+            print("   ✅ 250 answers added with 3 embedding calls and one write")
+
+            failed = cache.add_many([("Question number 1", {"meta": {}})], embeddings=[None])
+            assert failed["added_count"] == 0 and failed["errors"][0]["error"] == "Embedding generation failed"
+            print("   ✅ Embedding failures reported per item")
+
+
+if __name__ == "__main__":
+    test_add_embeddings_block()
+    test_add_many()
+    print("\n🎉 All bulk ingestion tests passed!")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test capacity-bounded eviction of the answer cache.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from cache_test_helpers import OfflineAnswerCache, make_answer
+
+
+def test_eviction_on_insert():
+    """Inserts beyond the entry budget evict cold, cheap, low-confidence entries first."""
+    print("🧪 Testing eviction on insert")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        cache = OfflineAnswerCache(cache_path)
+        cache.update_config(max_entries=4)
+
+        cache.add_to_cache('popular question', make_answer())
+        cache.add_to_cache('expensive question', make_answer(response_time_ms=30000))
+        cache.add_to_cache('cheap question', make_answer(response_time_ms=50))
+        cache.add_to_cache('unsure question', make_answer(confidence=0.3))
+        for _ in range(5):
+            assert cache.get_cached_answer('popular question') is not None
+
+        cache.add_to_cache('new question', make_answer())
+        assert len(cache.question_cache) <= 4, "Cache should stay within its entry budget"
+        assert 'new question' in cache.question_cache, "The inserted entry is never evicted"
+        assert 'popular question' in cache.question_cache
+        assert 'expensive question' in cache.question_cache
+        assert 'unsure question' not in cache.question_cache, "Lowest-value entry should go first"
+        assert cache.embedding_index.size == len(cache.question_cache)
+        assert cache.get_stats()['evictions'] >= 1
+        print("   ✅ Lowest-value entries evicted, hot and expensive ones kept")
+
+        cache.save_cache()
+        reloaded = OfflineAnswerCache(cache_path)
+        assert set(reloaded.question_cache) == set(cache.question_cache), "Evictions should persist"
+        assert reloaded._entry_hits['popular question'] == 5, "Hit counts should survive restarts"
+        print("   ✅ Evictions and hit counts persist")
+
+
+def test_memory_budget():
+    """A memory budget bounds the approximate footprint of answers plus embeddings."""
+    print("🧪 Testing memory budget eviction")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OfflineAnswerCache(Path(tmp_dir) / "answer_cache.json")
+        cache.max_memory_bytes = 2000
+        for i in range(30):
+            cache.add_to_cache(f'question number {i}', make_answer())
+        assert cache._cached_bytes <= 2000
+        assert 0 < len(cache.question_cache) < 30
+        assert cache._cached_bytes == sum(cache._entry_bytes.values())
+        print("   ✅ Memory budget enforced")
+
+
+if __name__ == "__main__":
+    test_eviction_on_insert()
+    test_memory_budget()
+    print("\n🎉 All eviction tests passed!")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory lookup structures behind the answer cache.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import numpy as np
+
+from app.utils.answer_cache import AnswerCache, EmbeddingIndex, QuestionTextIndex, CACHE_EMBEDDING_MODEL
+from app.utils.cache_store import save_paraphrases
+from cache_test_helpers import OfflineAnswerCache
+
+
+def test_embedding_index_growth_and_removal():
+    """Rows grow in a doubling buffer, stay normalized, and removal keeps lookups consistent."""
+    print("🧪 Testing EmbeddingIndex growth and removal")
+
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((100, 16)).astype(np.float32)
+
+    index = EmbeddingIndex(initial_capacity=4)
+    for i, vector in enumerate(vectors):
+        index.add_embedding(f"q{i}", vector * (i + 1))
+    assert index.size == 100
+    assert index._buffer.shape[0] == 128, "Capacity should double from the initial size"
+    assert np.allclose(np.linalg.norm(index.embeddings, axis=1), 1.0, atol=1e-5), "Rows should be unit-normalized"
+    print("   ✅ Buffer grows by doubling with normalized rows")
+
+    results = index.find_similar(vectors[42], top_k=3)
+    assert results[0][0] == "q42" and abs(results[0][1] - 1.0) < 1e-5
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    print("   ✅ Top-k lookup returns the exact match first")
+
+    assert index.remove_embedding("q42")
+    assert not index.remove_embedding("q42")
+    assert index.size == 99 and "q42" not in index.question_texts
+    assert all(index.question_texts[pos] == q for q, pos in index.positions.items())
+    assert all(match != "q42" for match, _ in index.find_similar(vectors[42], top_k=5))
+    results = index.find_similar(vectors[99], top_k=1)
+    assert results[0][0] == "q99", "Row moved into the removed slot should still resolve"
+    print("   ✅ Removal swaps in the last row and keeps positions consistent")
+
+    index.add_embedding("q7", vectors[0])
+    assert index.size == 99, "Re-adding an indexed question should replace its row"
+    assert index.find_similar(vectors[0], top_k=2)[0][1] > 0.999
+    print("   ✅ Re-adding a question replaces its row")
+
+
+def test_text_index_candidates():
+    """Candidates are the questions sharing the most tokens with the query."""
+    print("🧪 Testing QuestionTextIndex candidate generation")
+
+    index = QuestionTextIndex()
+    index.add("q1", "healthassist architecture overview")
+    index.add("q2", "healthassist hipaa security")
+    index.add("q3", "healthassist pricing licensing models")
+    index.add("q4", "citibank use kore")
+
+    assert index.candidates({"hipaa", "security"}, limit=10) == ["q2"]
+    assert set(index.candidates({"healthassist"}, limit=10)) == {"q1", "q2", "q3"}, \
+        "Questions sharing only common tokens are still candidates"
+    assert index.candidates({"healthassist", "pricing", "models"}, limit=1) == ["q3"]
+    assert index.candidates({"weather"}, limit=10) == []
+    index.add("q5", "zebra")
+    assert index.candidates({"healthassist", "zebra"}, limit=1) == ["q5"]
+    assert set(index.candidates({"healthassist", "zebra"}, limit=10)) == {"q1", "q2", "q3", "q5"}, \
+        "A rare token should rank its question first without dropping common-token candidates"
+    index.remove("q5")
+
+    index.remove("q2")
+    assert index.candidates({"hipaa"}, limit=10) == []
+    assert "hipaa" not in index.postings, "Empty postings should be dropped"
+    print("   ✅ Candidates ranked by shared tokens and removal cleans postings")
+
+
+def test_key_tier_lookups():
+    """Exact and normalized keys resolve in O(1) and fall back to other questions sharing a key."""
+    print("🧪 Testing exact and normalized key lookups")
+
+    index = QuestionTextIndex()
+    index.add("What is HealthAssist?", "healthassist")
+    index.add("what is healthassist", "healthassist")
+
+    assert index.lookup_exact("  WHAT IS HEALTHASSIST?  ") == "What is HealthAssist?"
+    assert index.lookup_normalized("healthassist") == "What is HealthAssist?"
+    assert index.lookup_normalized("") is None
+
+    index.remove("What is HealthAssist?")
+    assert index.lookup_exact("What is HealthAssist?") is None
+    assert index.lookup_normalized("healthassist") == "what is healthassist", \
+        "Key should fall back to the remaining question"
+    index.remove("what is healthassist")
+    assert not index.exact_keys and not index.normalized_keys
+    print("   ✅ Key tier stays consistent across add and remove")
+
+
+def test_text_path_uses_index():
+    """STEP 2 text matching finds matches through the token index."""
+    print("🧪 Testing text matching through the token index")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OfflineAnswerCache(Path(tmp_dir) / "answer_cache.json", embed=lambda text: [])
+        for question in ["How does Citibank use kore?", "How does Pfizer use kore?", "List of clients"]:
+            cache.add_to_cache(question, {"intent": "test", "meta": {}})
+
+        assert cache.find_similar_question("How does Pfizer use Kore") == ("How does Pfizer use kore?", 1.0), \
+            "Punctuation and case differences should hit the normalized key tier"
+
+        match, score = cache.find_similar_question("how does pfizer use kore ai")
+        assert match == "How does Pfizer use kore?" and score >= 0.7
+        assert cache.find_similar_question("what is the weather")[0] is None
+
+        cache.delete_entry(cache.get_all_entries()[1]["id"])
+        assert cache.find_similar_question("how does pfizer use kore ai")[0] != "How does Pfizer use kore?"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OfflineAnswerCache(Path(tmp_dir) / "answer_cache.json", embed=lambda text: [])
+        for question in ["kore cost", "kore cost breakdown", "kore cost for hospitals", "zebra integration"]:
+            cache.add_to_cache(question, {"intent": "test", "meta": {}})
+        match, score = cache.find_similar_question("kore cost zebra")
+        assert match == "kore cost" and score >= 0.7, "Common-token matches survive a rare token matching elsewhere"
+        print("   ✅ Text matches resolve through indexed candidates")
+
+
+def test_entry_id_index():
+    """Entries keep a stable stored id that management calls resolve directly."""
+    print("🧪 Testing entry id index and pagination")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        cache = OfflineAnswerCache(cache_path)
+        for i in range(10):
+            cache.add_to_cache(f"Question {i}", {"straightforward_answer": f"answer {i}", "meta": {}})
+
+        entry_id = cache.get_entry_id("Question 3")
+        assert entry_id == AnswerCache.make_entry_id("Question 3")
+        assert cache.update_entry(entry_id, "Question three", "updated answer")
+        assert cache.get_entry_id("Question three") == entry_id, "Id should survive a question edit"
+        assert "Question 3" not in cache.question_cache
+
+        page, total = cache.get_entries_page(offset=2, limit=3)
+        assert total == 10 and [entry["question"] for entry in page] == ["Question 2", "Question 4", "Question 5"]
+        page, total = cache.get_entries_page(offset=0, limit=5, search="UPDATED")
+        assert total == 1 and page[0]["id"] == entry_id
+
+        reloaded = OfflineAnswerCache(cache_path)
+        assert reloaded.delete_entry(entry_id), "Stored ids should resolve after a restart"
+        assert not reloaded.delete_entry(entry_id)
+        assert len(reloaded.question_cache) == 9 and len(reloaded._entry_ids) == 9
+        print("   ✅ Stable ids resolve in O(1) and pages are built on demand")
+
+
+def test_paraphrase_aliases():
+    """Precomputed paraphrases are extra index rows that resolve to their cached question."""
+    print("🧪 Testing paraphrase aliases")
+
+    vectors = {
+        "What security measures ensure HIPAA compliance?": [1.0, 0.0, 0.0],
+        "How do you keep patient data HIPAA compliant?": [0.0, 1.0, 0.0],
+        "What does HIPAA compliance look like for your security?": [0.0, 0.0, 1.0],
+        "List of clients": [0.6, 0.0, 0.8]
+    }
+
+    def embed(text: str):
+        return vectors.get(text, [0.5, 0.5, 0.5])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        canonical = "What security measures ensure HIPAA compliance?"
+        save_paraphrases(cache_path.with_name("answer_cache.paraphrases.npz"), {canonical: {
+            "How do you keep patient data HIPAA compliant?": np.array(vectors["How do you keep patient data HIPAA compliant?"]),
+            "What does HIPAA compliance look like for your security?": np.array(vectors["What does HIPAA compliance look like for your security?"])
+        }}, CACHE_EMBEDDING_MODEL)
+
+        cache = OfflineAnswerCache(cache_path, embed=embed)
+        assert cache.embedding_index.size == 0, "Paraphrases of uncached questions stay out of the index"
+        cache.add_to_cache(canonical, {"straightforward_answer": "HIPAA answer", "meta": {}})
+        cache.add_to_cache("List of clients", {"straightforward_answer": "clients", "meta": {}})
+        assert cache.embedding_index.size == 4 and len(cache.question_cache) == 2
+        assert cache.get_stats()["paraphrase_aliases"] == 2
+
+        match, score = cache._find_semantic_match("How do you keep patient data HIPAA compliant?", 0.7,
+                                                  vectors["How do you keep patient data HIPAA compliant?"])
+        assert match == canonical and score > 0.99, "Paraphrase rows should resolve to the cached question"
+        print("   ✅ Paraphrase match returns the canonical answer")
+
+        reloaded = OfflineAnswerCache(cache_path, embed=embed)
+        assert reloaded.embedding_index.size == 4, "Paraphrases should be indexed again on load"
+        reloaded.delete_entry(reloaded.get_entry_id(canonical))
+        assert reloaded.embedding_index.size == 1 and not reloaded._aliases, "Aliases go with their question"
+        print("   ✅ Aliases follow their question through reload and delete")
+
+
+def test_paraphrase_fanout():
+    """One question's aliases cannot crowd other questions out of the semantic top-k."""
+    print("🧪 Testing paraphrase fan-out in top-k searches")
+
+    canonical = "What security measures ensure HIPAA compliance?"
+    clients = "Which kore clients are live?"
+    vectors = {canonical: [1.0, 0.0], clients: [0.9, 0.436]}
+    paraphrases = {f"HIPAA security question {i}": np.array([1.0, 0.01 * i]) for i in range(1, 7)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        save_paraphrases(cache_path.with_name("answer_cache.paraphrases.npz"), {canonical: paraphrases},
+                         CACHE_EMBEDDING_MODEL)
+        cache = OfflineAnswerCache(cache_path, embed=lambda text: vectors.get(text, [1.0, 0.0]))
+        cache.add_to_cache(canonical, {"straightforward_answer": "HIPAA answer", "meta": {}})
+        cache.add_to_cache(clients, {"straightforward_answer": "clients", "meta": {}})
+        assert cache.embedding_index.size == 8
+
+        results = cache.search_similar("security", limit=2, threshold=0.5)
+        assert [r["question"] for r in results] == [canonical, clients], "Results should be distinct questions"
+
+        match, score = cache._find_semantic_match("Which clients use kore?", 0.7, [1.0, 0.0])
+        assert match == clients and abs(score - 0.9) < 0.01, \
+            "A rejected question and its aliases should not hide the next question"
+        print("   ✅ Top-k counts distinct questions, not alias rows")
+
+
+def test_analyze_query_similarity():
+    """The debugging breakdown scores candidates from the index matrix and the token index."""
+    print("🧪 Testing analyze_query_similarity")
+
+    rng = np.random.default_rng(11)
+    vectors = {}
+
+    def embed(text: str):
+        if text not in vectors:
+            vectors[text] = rng.standard_normal(16).tolist()
+        return vectors[text]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OfflineAnswerCache(Path(tmp_dir) / "answer_cache.json", embed=embed)
+        cache.update_config(max_entries=1000)
+        for i in range(300):
+            cache.add_to_cache(f"Question about topic {i}", {"intent": "test", "meta": {}})
+        query = "Question about topic 42"
+        vectors["what about topic 42"] = vectors[query]
+
+        results = cache.analyze_query_similarity("what about topic 42", top_k=5)
+        assert len(results) == 5 and results[0]["cached_question"] == query
+        assert results[0]["semantic_similarity"] == 1.0
+        expected = max(
+            float(np.dot(vectors[q], vectors[query]) / (np.linalg.norm(vectors[q]) * np.linalg.norm(vectors[query])))
+            for q in cache.question_cache if q != query
+        )
+        assert any(abs(r["semantic_similarity"] - round(expected, 3)) < 1e-3 for r in results[1:]) or \
+            results[1]["combined_score"] >= round(expected, 3), "Semantic scores should match the brute-force cosine"
+        assert [r["combined_score"] for r in results] == sorted((r["combined_score"] for r in results), reverse=True)
+        print("   ✅ Breakdown matches brute-force scores for the top candidates")
+
+
+def test_quantized_embedding_index():
+    """float16 and int8 rows keep top-1 recall and re-score candidates at full precision."""
+    print("🧪 Testing quantized EmbeddingIndex")
+
+    rng = np.random.default_rng(5)
+    vectors = rng.standard_normal((500, 64)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[:50] + 0.05 * rng.standard_normal((50, 64)).astype(np.float32)
+    full_rows = {f"q{i}": vectors[i] for i in range(len(vectors))}
+
+    exact = EmbeddingIndex()
+    exact.build_index({f"q{i}": vectors[i] for i in range(len(vectors))})
+    for precision, ratio in [("float16", 2), ("int8", 3)]:
+        index = EmbeddingIndex(precision=precision, full_rows=full_rows.get)
+        index.build_index({f"q{i}": vectors[i] for i in range(len(vectors))})
+        assert index.nbytes * ratio <= exact.nbytes, f"{precision} rows should shrink the index"
+        for query in queries:
+            expected = exact.find_similar(query, top_k=3)
+            results = index.find_similar(query, top_k=3)
+            assert results[0][0] == expected[0][0]
+            assert abs(results[0][1] - expected[0][1]) < 1e-5, "Top candidates should be re-scored exactly"
+        index.remove_embedding("q0")
+        assert index.find_similar(vectors[499], top_k=1)[0][0] == "q499", "Scales should move with their rows"
+    print("   ✅ Quantized rows keep recall in a fraction of the memory")
+
+
+if __name__ == "__main__":
+    test_embedding_index_growth_and_removal()
+    test_text_index_candidates()
+    test_key_tier_lookups()
+    test_text_path_uses_index()
+    test_entry_id_index()
+    test_paraphrase_aliases()
+    test_paraphrase_fanout()
+    test_analyze_query_similarity()
+    test_quantized_embedding_index()
+    print("\n🎉 All cache index tests passed!")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Test the append-only log persistence of the answer cache (snapshot + log replay).
+"""
+
+import sys
+import os
+import json
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import numpy as np
+
+from app.utils import answer_cache as answer_cache_module
+from app.utils import cache_store
+from app.utils.answer_cache import normalize_embedding
+from cache_test_helpers import OfflineAnswerCache, make_answer, offline_embedding
+
+
+def test_log_replay_and_compaction():
+    """Inserts are appended to the log and replayed on load; compaction folds them into the snapshot."""
+    print("🧪 Testing answer cache log persistence")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        cache = OfflineAnswerCache(cache_path)
+        cache.store.compact_min_records = 3
+
+        cache.add_to_cache('What is HealthAssist?', make_answer())
+        cache.add_to_cache('Is HealthAssist HIPAA compliant?', make_answer())
+        assert cache.store.log_path.exists(), "Inserts should be appended to the log"
+        assert not cache_path.exists(), "No snapshot should be written for small inserts"
+
+        reloaded = OfflineAnswerCache(cache_path)
+        assert set(reloaded.question_cache) == set(cache.question_cache), "Log should replay on load"
+        assert reloaded.embedding_index.is_built, "Replayed embeddings should build the index"
+        print("   ✅ Log replays on load")
+
+        cache.delete_entry(reloaded.get_all_entries()[0]["id"])
+        assert cache_path.exists(), "Third record should trigger a compacted snapshot"
+        assert not cache.store.log_path.exists(), "Compaction should reset the log"
+
+        reloaded = OfflineAnswerCache(cache_path)
+        assert list(reloaded.question_cache) == ['Is HealthAssist HIPAA compliant?']
+        print("   ✅ Compaction folds the log into the snapshot")
+
+
+def test_torn_record_is_dropped():
+    """A partial trailing record from a crash mid-append is discarded on load."""
+    print("🧪 Testing torn log record recovery")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        cache = OfflineAnswerCache(cache_path)
+        cache.add_to_cache('What is HealthAssist?', make_answer())
+
+        with open(cache.store.log_path, 'a', encoding='utf-8') as f:
+            f.write('{"op":"put","question":"Half writ')
+
+        reloaded = OfflineAnswerCache(cache_path)
+        assert list(reloaded.question_cache) == ['What is HealthAssist?']
+
+        reloaded.add_to_cache('How does Pfizer use kore?', make_answer())
+        again = OfflineAnswerCache(cache_path)
+        assert len(again.question_cache) == 2, "Appends after recovery should remain readable"
+        print("   ✅ Torn record dropped and log stays appendable")
+
+
+def test_embeddings_are_memory_mapped():
+    """Compacted embeddings are stored as a float32 matrix and memory-mapped on load."""
+    print("🧪 Testing memory-mapped embedding matrix")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        cache = OfflineAnswerCache(cache_path)
+        for question in ['What is HealthAssist?', 'How does Citibank use kore?', 'List of clients']:
+            cache.add_to_cache(question, make_answer())
+        cache.save_cache()
+
+        matrix_files = list(Path(tmp_dir).glob("answer_cache.embeddings.*.npy"))
+        assert len(matrix_files) == 1, "Compaction should write exactly one embedding matrix"
+
+        reloaded = OfflineAnswerCache(cache_path)
+        assert isinstance(reloaded.embedding_index.embeddings, np.memmap), "Index should use the mapped matrix in place"
+        assert reloaded.embedding_index.embeddings.dtype == np.float32
+        assert reloaded.get_cached_answer('List of clients') is not None
+
+        match, score = reloaded.embedding_index.find_similar(cache.get_embedding('How does Citibank use kore?'), top_k=1)[0]
+        assert match == 'How does Citibank use kore?' and score > 0.99
+        print("   ✅ Embeddings load as a shared memory map")
+
+        reloaded.save_cache()
+        assert len(list(Path(tmp_dir).glob("answer_cache.embeddings.*"))) == 2, "Old generations should be removed"
+        print("   ✅ Old matrix generations are cleaned up")
+
+
+def test_sqlite_backend_shared_between_workers():
+    """Two caches on one SQLite database see each other's writes and deletes."""
+    print("🧪 Testing shared SQLite backend")
+
+    original_backend = cache_store.ANSWER_CACHE_BACKEND
+    cache_store.ANSWER_CACHE_BACKEND = "sqlite"
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "answer_cache.json"
+            worker_a = OfflineAnswerCache(cache_path)
+            worker_b = OfflineAnswerCache(cache_path)
+            assert isinstance(worker_a.store, cache_store.SQLiteAnswerCacheStore)
+
+            worker_a.add_to_cache('What is HealthAssist?', make_answer())
+            hit = worker_b.get_cached_answer('What is HealthAssist?')
+            assert hit is not None, "Writes from one worker should be hits in another"
+            assert worker_b.embedding_index.size == 1
+            print("   ✅ Writes are visible across workers")
+
+            entry_id = worker_b.get_entry_id('What is HealthAssist?')
+            assert entry_id == worker_a.get_entry_id('What is HealthAssist?')
+            worker_b.delete_entry(entry_id)
+            worker_b.add_to_cache('List of clients', make_answer())
+            assert worker_a.get_cached_answer('What is HealthAssist?') is None
+            assert list(worker_a.question_cache) == ['List of clients']
+            print("   ✅ Deletes propagate as tombstones")
+
+            worker_a.store.compact_min_records = 1
+            worker_a.add_to_cache('Temporary', make_answer())
+            worker_a.delete_entry(worker_a.get_entry_id('Temporary'))
+            worker_a.delete_entry(worker_a.get_entry_id('List of clients'))
+            assert worker_b.get_cached_answer('List of clients') is None, \
+                "Workers behind a tombstone purge should reload"
+            assert not worker_b.question_cache
+
+            restarted = OfflineAnswerCache(cache_path)
+            assert not restarted.question_cache
+            print("   ✅ Tombstone purge forces lagging workers to reload")
+
+            worker_a.add_to_cache('What is HealthAssist?', make_answer())
+            worker_a.usage_flush_seconds = 0
+            worker_b.usage_flush_seconds = 0
+            worker_a.get_cached_answer('What is HealthAssist?')
+            worker_b.get_cached_answer('What is HealthAssist?')
+            worker_b.get_cached_answer('What is HealthAssist?')
+            restarted = OfflineAnswerCache(cache_path)
+            assert restarted._entry_hits['What is HealthAssist?'] == 3, "Hits from every worker should be persisted"
+            assert restarted.question_cache['What is HealthAssist?']['meta']['last_hit_at'] > 0
+            print("   ✅ Hit counts persist without compaction")
+
+            worker_a.add_to_cache('List of clients', make_answer())
+            worker_b.sync_from_store()
+            worker_a.get_cached_answer('List of clients')
+            worker_a.get_cached_answer('List of clients')
+            worker_b.usage_flush_seconds = 3600
+            worker_b.get_cached_answer('List of clients')
+            worker_b.save_cache()
+            restarted = OfflineAnswerCache(cache_path)
+            assert restarted._entry_hits['List of clients'] == 3, \
+                "Compaction should keep other workers' hits and add its own unflushed ones"
+            print("   ✅ Compaction merges hit counts")
+    finally:
+        cache_store.ANSWER_CACHE_BACKEND = original_backend
+
+
+def test_sqlite_backend_imports_file_cache():
+    """Switching to SQLite imports the existing snapshot + log cache once."""
+    print("🧪 Testing import of file cache into SQLite")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        file_cache = OfflineAnswerCache(cache_path)
+        file_cache.add_to_cache('What is HealthAssist?', make_answer())
+
+        original_backend = cache_store.ANSWER_CACHE_BACKEND
+        cache_store.ANSWER_CACHE_BACKEND = "sqlite"
+        try:
+            sqlite_cache = OfflineAnswerCache(cache_path)
+            assert list(sqlite_cache.question_cache) == ['What is HealthAssist?']
+            assert sqlite_cache.embedding_index.size == 1
+        finally:
+            cache_store.ANSWER_CACHE_BACKEND = original_backend
+        print("   ✅ Existing entries imported")
+
+
+def test_quantized_cache_reads_full_rows_from_store():
+    """With a quantized index the cache holds no float32 rows; re-scoring reads them from the store."""
+    print("🧪 Testing full-precision rows served by the store")
+
+    original_precision = answer_cache_module.ANSWER_CACHE_EMBEDDING_PRECISION
+    original_backend = cache_store.ANSWER_CACHE_BACKEND
+    answer_cache_module.ANSWER_CACHE_EMBEDDING_PRECISION = "int8"
+    questions = ['What is HealthAssist?', 'How does Citibank use kore?', 'List of clients']
+    try:
+        for backend in ["file", "sqlite"]:
+            cache_store.ANSWER_CACHE_BACKEND = backend
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                cache_path = Path(tmp_dir) / "answer_cache.json"
+                cache = OfflineAnswerCache(cache_path)
+                cache.max_memory_bytes = 10 ** 9
+                for question in questions[:2]:
+                    cache.add_to_cache(question, make_answer())
+                cache.save_cache()
+                cache.add_to_cache(questions[2], make_answer())
+                assert not cache.question_embeddings, f"{backend}: persisted rows should not stay in memory"
+                for question in questions:
+                    assert np.allclose(cache.store.embedding(question), normalize_embedding(offline_embedding(question)))
+                    match, score = cache.embedding_index.find_similar(offline_embedding(question), top_k=1)[0]
+                    assert match == question and abs(score - 1.0) < 1e-6, "Candidates should be re-scored exactly"
+
+                cache._track_bytes(questions[0])
+                entry_bytes = cache._entry_bytes[questions[0]]
+                answer_bytes = len(json.dumps(cache.question_cache[questions[0]], default=str))
+                assert entry_bytes == answer_bytes + 8 + 4, "Embeddings should be counted at int8 size"
+
+                cache.save_cache()
+                restarted = OfflineAnswerCache(cache_path)
+                assert not restarted.question_embeddings and restarted.embedding_index.size == 3
+                match, score = restarted.embedding_index.find_similar(offline_embedding(questions[2]), top_k=1)[0]
+                assert match == questions[2] and abs(score - 1.0) < 1e-6, "Compaction should keep every stored row"
+                print(f"   ✅ {backend}: only int8 rows stay in memory")
+    finally:
+        answer_cache_module.ANSWER_CACHE_EMBEDDING_PRECISION = original_precision
+        cache_store.ANSWER_CACHE_BACKEND = original_backend
+
+
+if __name__ == "__main__":
+    test_log_replay_and_compaction()
+    test_torn_record_is_dropped()
+    test_embeddings_are_memory_mapped()
+    test_sqlite_backend_shared_between_workers()
+    test_sqlite_backend_imports_file_cache()
+    test_quantized_cache_reads_full_rows_from_store()
+    print("\n🎉 All persistence tests passed!")
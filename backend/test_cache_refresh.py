@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test stale-while-revalidate refreshing of cached answers.
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from cache_test_helpers import OfflineAnswerCache, make_answer
+
+
+def test_stale_hit_is_served_and_refreshed():
+    """A stale hit returns immediately and the refreshed answer is swapped in afterwards."""
+    print("🧪 Testing stale-while-revalidate")
+
+    async def scenario(cache_path):
+        cache = OfflineAnswerCache(cache_path)
+        cache.ttl_seconds = 60
+        cache.add_to_cache('What is HealthAssist?', make_answer('old answer', age_seconds=120))
+        cache.add_to_cache('List of clients', make_answer('fresh answer'))
+
+        calls = []
+
+        async def refresh(question):
+            calls.append(question)
+            await asyncio.sleep(0.01)
+            return make_answer('new answer')
+
+        cache.set_refresh_handler(refresh)
+
+        hit = await cache.aget_cached_answer('What is HealthAssist?')
+        assert hit['straightforward_answer'] == 'old answer' and hit['meta']['stale'] is True
+        assert 'cache_hit' not in cache.question_cache['What is HealthAssist?']['meta'], \
+            "Hit metadata should not leak into the stored entry"
+
+        await cache.aget_cached_answer('What is HealthAssist?')
+        await asyncio.gather(*cache._background_tasks)
+        assert calls == ['What is HealthAssist?'], "Concurrent stale hits should refresh once"
+
+        hit = await cache.aget_cached_answer('What is HealthAssist?')
+        assert hit['straightforward_answer'] == 'new answer' and 'stale' not in hit['meta']
+
+        await cache.aget_cached_answer('List of clients')
+        assert calls == ['What is HealthAssist?'], "Fresh entries should not be refreshed"
+        assert cache.get_stats()['background_refreshes'] == 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = Path(tmp_dir) / "answer_cache.json"
+        asyncio.run(scenario(cache_path))
+
+        reloaded = OfflineAnswerCache(cache_path)
+        assert reloaded.question_cache['What is HealthAssist?']['straightforward_answer'] == 'new answer', \
+            "Refreshed answer should be persisted"
+    print("   ✅ Stale answer served immediately, refreshed in the background")
+
+
+def test_failed_refresh_keeps_answer():
+    """Low-confidence refreshes keep the cached answer and back off before retrying."""
+    print("🧪 Testing failed refresh handling")
+
+    async def scenario(cache_path):
+        cache = OfflineAnswerCache(cache_path)
+        cache.ttl_seconds = 60
+        answer = make_answer('old answer', age_seconds=30)
+        answer['meta']['ttl_seconds'] = 10
+        cache.add_to_cache('What is HealthAssist?', answer)
+        assert cache.is_stale(cache.question_cache['What is HealthAssist?']), "Per-entry TTL should apply"
+
+        calls = []
+
+        async def refresh(question):
+            calls.append(question)
+            return make_answer('weak answer', confidence=0.2)
+
+        cache.set_refresh_handler(refresh)
+        await cache.aget_cached_answer('What is HealthAssist?')
+        await asyncio.gather(*cache._background_tasks)
+        await cache.aget_cached_answer('What is HealthAssist?')
+        assert calls == ['What is HealthAssist?'], "Failed refreshes should back off"
+        assert cache.question_cache['What is HealthAssist?']['straightforward_answer'] == 'old answer'
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(scenario(Path(tmp_dir) / "answer_cache.json"))
+    print("   ✅ Failed refresh keeps the cached answer")
+
+
+def test_knowledge_change_invalidation():
+    """Answers citing a removed file are evicted; answers close to an added file's chunks are refreshed."""
+    print("🧪 Testing source-aware invalidation")
+
+    async def scenario(cache_path):
+        cache = OfflineAnswerCache(cache_path)
+        cited = make_answer('cites pricing doc')
+        cited['meta']['sources'] = [{'filename': 'pricing.pdf', 'file_id': 'file-1', 'chunk_id': 'file-1_chunk_0'}]
+        cache.add_to_cache('What is HealthAssist pricing?', cited)
+        cache.add_to_cache('List of clients', make_answer('unrelated'))
+        assert cache.questions_for_source('file-1_chunk_0') == ['What is HealthAssist pricing?']
+
+        calls = []
+
+        async def refresh(question):
+            calls.append(question)
+            answer = make_answer('regenerated')
+            answer['meta']['source_files'] = ['file-2']
+            return answer
+
+        cache.set_refresh_handler(refresh)
+
+        assert cache.on_knowledge_change("removed", "file-1") == 1
+        assert 'What is HealthAssist pricing?' not in cache.question_cache, \
+            "Answers citing a removed file should never be served again"
+        assert cache.questions_for_source('file-1') == [] and calls == []
+        hit = await cache.aget_cached_answer('List of clients')
+        assert 'stale' not in hit['meta'], "Unrelated answers should stay fresh"
+
+        chunk = [[float(v) for v in cache.get_embedding('List of clients')]]
+        assert cache.on_knowledge_change("added", "file-3", chunk) >= 1
+        hit = await cache.aget_cached_answer('List of clients')
+        assert hit['meta']['stale'] is True, "Answers close to an added file are served stale while refreshing"
+
+        await asyncio.gather(*cache._background_tasks)
+        assert calls == ['List of clients']
+        assert not cache.is_stale(cache.question_cache['List of clients'])
+        assert cache.questions_for_source('file-2') == ['List of clients'], \
+            "Refreshed answers should be indexed under their new sources"
+
+        cache.set_refresh_handler(None)
+        assert cache.on_knowledge_change("added", "file-4", chunk) >= 1
+        assert 'List of clients' not in cache.question_cache, \
+            "Without a refresh handler affected answers are evicted"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(scenario(Path(tmp_dir) / "answer_cache.json"))
+    print("   ✅ Affected answers invalidated, others kept hot")
+
+
+if __name__ == "__main__":
+    test_stale_hit_is_served_and_refreshed()
+    test_failed_refresh_keeps_answer()
+    test_knowledge_change_invalidation()
+    print("\n🎉 All refresh tests passed!")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Test the query-embedding memo used by the answer cache.
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from app.utils import answer_cache as answer_cache_module
+from app.utils import cache_store
+from app.utils import query_embedding as query_embedding_module
+from app.utils.answer_cache import AnswerCache
+from app.utils.cache_store import AnswerCacheStore, SQLiteAnswerCacheStore, LEGACY_EMBEDDING_MODEL
+from app.utils.embedding_memo import EmbeddingMemo
+from app.utils.query_embedding import aembed_query, embed_query, truncate_embedding
+from cache_test_helpers import CountingEmbeddings, fake_embeddings_client
+
+import numpy as np
+
+
+def test_memo_lru_and_ttl():
+    """Entries are evicted least-recently-used first and expire after the TTL."""
+    print("🧪 Testing EmbeddingMemo LRU and TTL")
+
+    memo = EmbeddingMemo(max_entries=2, ttl_seconds=60)
+    memo.put("first", "model", [1.0, 0.0])
+    memo.put("second", "model", [0.0, 1.0])
+    assert memo.get("  FIRST ", "model") is not None, "Keys should fold case and whitespace"
+    memo.put("third", "model", [1.0, 1.0])
+    assert memo.get("second", "model") is None, "Least recently used entry should be evicted"
+    assert memo.get("first", "other-model") is None, "Keys should include the model"
+
+    memo.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert memo.get("first", "model") is None, "Expired entries should not be served"
+    stats = memo.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3
+    print("   ✅ LRU eviction, TTL expiry and counters work")
+
+
+def test_memo_persistence():
+    """Memoized embeddings survive a restart when a persist path is configured."""
+    print("🧪 Testing EmbeddingMemo persistence")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "embedding_memo.npz"
+        memo = EmbeddingMemo(persist_path=str(path), persist_every=2)
+        memo.put("What is HealthAssist?", "model", [0.1, 0.2, 0.3])
+        assert not path.exists()
+        memo.put("List of clients", "model", [0.3, 0.2, 0.1])
+        assert path.exists(), "Memo should persist after persist_every new entries"
+
+        reloaded = EmbeddingMemo(persist_path=str(path))
+        assert reloaded.get("what is healthassist?", "model") is not None
+        print("   ✅ Memo persists and reloads")
+
+
+def test_get_embedding_uses_memo():
+    """Repeated text only pays one embedding call."""
+    print("🧪 Testing AnswerCache.get_embedding memoization")
+
+    fake_embeddings = CountingEmbeddings()
+    with fake_embeddings_client(fake_embeddings):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = AnswerCache(Path(tmp_dir) / "answer_cache.json")
+            cache.embedding_memo = EmbeddingMemo()
+            first = cache.get_embedding("How does Pfizer use kore?")
+            second = cache.get_embedding("how does pfizer use kore?")
+            assert first == second and fake_embeddings.calls == 1
+
+            cache.calculate_semantic_similarity("How does Pfizer use kore?", "How does Pfizer use kore?")
+            assert fake_embeddings.calls == 1, "Similarity should reuse memoized embeddings"
+            assert cache.get_stats()["embedding_memo"]["hits"] == 3
+            print("   ✅ Repeated phrases skip the embedding round-trip")
+
+
+def test_async_lookup_budget():
+    """A slow embedding call turns into a miss, then warms the memo for the next ask."""
+    print("🧪 Testing async cache lookup latency budget")
+
+    class SlowEmbeddings(CountingEmbeddings):
+        def create(self, model, input):
+            time.sleep(0.2)
+            return super().create(model, input)
+
+    async def scenario(cache, fake_embeddings):
+        query = "Pfizer kore adoption"
+        calls = fake_embeddings.calls
+        assert await cache.aget_cached_answer(query, budget_ms=20) is None
+        assert cache.get_stats()["semantic_lookup_timeouts"] == 1
+
+        assert await aembed_query(query, cache.embedding_memo) is not None
+        assert fake_embeddings.calls == calls + 1, "Vector search should await the lookup's in-flight embedding"
+
+        await asyncio.gather(*cache._background_tasks)
+        calls = fake_embeddings.calls
+        hit = await cache.aget_cached_answer(query, budget_ms=20)
+        assert fake_embeddings.calls == calls, "Second ask should be served from the warmed memo"
+        assert hit is not None and hit["meta"]["cached_question"] == "How does Pfizer use kore?"
+
+    fake_embeddings = SlowEmbeddings()
+    with fake_embeddings_client(fake_embeddings):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = AnswerCache(Path(tmp_dir) / "answer_cache.json")
+            cache.embedding_memo = EmbeddingMemo()
+            cache.add_to_cache("How does Pfizer use kore?", {"intent": "test", "meta": {}})
+            asyncio.run(scenario(cache, fake_embeddings))
+            print("   ✅ Budget exceeded -> miss, background embedding warms the memo")
+
+
+def test_shared_query_embedding_and_migration():
+    """The cache reads a truncated view of the shared embedding and re-embeds legacy vectors."""
+    print("🧪 Testing shared query embedding and legacy migration")
+
+    vector = truncate_embedding(np.array([3.0, 4.0, 12.0]), 2)
+    assert np.allclose(vector, [0.6, 0.8]), "Truncated views should be re-normalized"
+
+    fake_embeddings = CountingEmbeddings()
+    with fake_embeddings_client(fake_embeddings):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "answer_cache.json"
+            legacy_store = AnswerCacheStore(cache_path)
+            questions = {"What is HealthAssist?": {"meta": {}}, "List of clients": {"meta": {}}}
+            legacy_store.compact(questions, {q: np.ones(5, dtype=np.float32) for q in questions})
+
+            cache = AnswerCache(cache_path)
+            assert fake_embeddings.calls == 0, "Loading should not block on re-embedding"
+            assert cache.embedding_index.size == 0, "Legacy vectors are not comparable with query embeddings"
+
+            def unavailable(text):
+                raise RuntimeError("Embeddings API unavailable")
+
+            outage = CountingEmbeddings(unavailable)
+            with fake_embeddings_client(outage):
+                assert not cache.migrate_embeddings()
+            assert outage.calls == 1 and cache.embedding_index.size == 0
+            cache.save_cache()
+            restarted = AnswerCache(cache_path)
+            assert restarted.store.loaded_embedding_models == {LEGACY_EMBEDDING_MODEL}, \
+                "A failed migration should keep the stored vectors for the next start"
+
+            assert asyncio.run(restarted.amigrate_embeddings())
+            assert fake_embeddings.calls == 1, "Legacy vectors should be re-embedded in one batch"
+            assert restarted.embedding_index.embeddings.shape == (2, 3)
+            assert restarted.store.loaded_embedding_models == {answer_cache_module.CACHE_EMBEDDING_MODEL}
+
+            AnswerCache(cache_path)
+            assert fake_embeddings.calls == 1, "Migrated snapshots should not be re-embedded again"
+
+            cache.embedding_memo = query_embedding_module.query_embedding_memo
+            cache.get_embedding("How does Pfizer use kore?")
+            calls = fake_embeddings.calls
+            embed_query("How does Pfizer use kore?")
+            assert fake_embeddings.calls == calls, "Vector search should reuse the cache lookup's embedding"
+            print("   ✅ One embedding per query, legacy vectors migrated")
+
+
+def test_shared_store_migrates_once():
+    """Workers sharing a SQLite store re-embed legacy vectors once; the others reload the result."""
+    print("🧪 Testing one migration across workers")
+
+    original_backend = cache_store.ANSWER_CACHE_BACKEND
+    original_poll = answer_cache_module.MIGRATION_POLL_SECONDS
+    cache_store.ANSWER_CACHE_BACKEND = "sqlite"
+    answer_cache_module.MIGRATION_POLL_SECONDS = 0.01
+    fake_embeddings = CountingEmbeddings()
+    try:
+        with fake_embeddings_client(fake_embeddings), tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "answer_cache.json"
+            legacy_store = SQLiteAnswerCacheStore(cache_path.with_suffix(".db"), embedding_model=LEGACY_EMBEDDING_MODEL)
+            questions = {"What is HealthAssist?": {"meta": {}}, "List of clients": {"meta": {}}}
+            legacy_store.compact(questions, {q: np.ones(5, dtype=np.float32) for q in questions})
+
+            workers = [AnswerCache(cache_path) for _ in range(3)]
+            assert all(worker._migration_pending for worker in workers)
+
+            async def startup():
+                return await asyncio.gather(workers[0].amigrate_embeddings(), workers[1].amigrate_embeddings())
+
+            assert asyncio.run(startup()) == [True, True]
+            assert fake_embeddings.calls == 1, "Only the worker holding the claim should re-embed"
+            assert workers[1].embedding_index.size == 2 and not workers[1]._migration_pending
+            print("   ✅ A waiting worker reloads the migrated vectors")
+
+            assert workers[2].migrate_embeddings() and fake_embeddings.calls == 1, \
+                "A worker that loaded before the migration should not re-embed again"
+            assert not workers[2].store.migration_claimed()
+            print("   ✅ A stale worker finds nothing left to migrate")
+    finally:
+        cache_store.ANSWER_CACHE_BACKEND = original_backend
+        answer_cache_module.MIGRATION_POLL_SECONDS = original_poll
+
+
+if __name__ == "__main__":
+    test_memo_lru_and_ttl()
+    test_memo_persistence()
+    test_get_embedding_uses_memo()
+    test_async_lookup_budget()
+    test_shared_query_embedding_and_migration()
+    test_shared_store_migrates_once()
+    print("\n🎉 All embedding memo tests passed!")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the negative cache and worth-analyzing gate in front of /analyze.
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from app.utils.negative_cache import NegativeCache, is_worth_analyzing
+from cache_test_helpers import OfflineAnswerCache
+
+
+def test_worth_analyzing_gate():
+    """Filler-only utterances are rejected, anything with a substantive word passes."""
+    print("🧪 Testing worth-analyzing gate")
+
+    for utterance in ["yeah, okay", "Um... so, yeah.", "uh-huh", "Thank you!", "I mean, you know", "okay so what"]:
+        assert not is_worth_analyzing(utterance), utterance
+    for utterance in ["What is HealthAssist?", "pricing?", "How does Pfizer use kore", "Is it HIPAA compliant", "tier 2"]:
+        assert is_worth_analyzing(utterance), utterance
+    print("   ✅ Filler skipped, questions pass")
+
+
+def test_negative_cache_ttl_and_lru():
+    """Known misses expire after the TTL, are bounded and hand out independent copies."""
+    print("🧪 Testing NegativeCache TTL and LRU")
+
+    cache = NegativeCache(max_entries=2, ttl_seconds=60)
+    cache.put("first", {"response": "low confidence", "meta": {}})
+    cache.put("second", {"response": "other", "meta": {}})
+    hit = cache.get("first")
+    hit["meta"]["mutated"] = True
+    assert "mutated" not in cache.get("first")["meta"], "Hits should be independent copies"
+    cache.put("third", {"response": "newest", "meta": {}})
+    assert cache.get("second") is None, "Least recently used entry should be evicted"
+
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.get("first") is None and len(cache) == 1
+    assert cache.stats()["hits"] == 2
+    print("   ✅ TTL expiry, LRU bound and copies work")
+
+
+def test_answer_cache_known_misses():
+    """Recorded misses are keyed by normalized text and dropped once the question is cached."""
+    print("🧪 Testing AnswerCache known misses")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OfflineAnswerCache(Path(tmp_dir) / "answer_cache.json")
+        cache.record_miss("What is the weather in Paris?", {"response": "not sure", "meta": {"confidence": 0.3}})
+
+        known = cache.get_known_miss("what is the weather in paris")
+        assert known is not None and known["response"] == "not sure", "Repeats should resolve by normalized text"
+        assert cache.get_stats()["negative_cache"]["hits"] == 1
+
+        casual = (500, "casual", True)
+        assert cache.get_known_miss("What is the weather in Paris?", casual) is None, \
+            "Results built with other pipeline parameters should not be reused"
+        cache.record_miss("What is the weather in Paris?", {"response": "dunno", "meta": {}}, casual)
+        assert cache.get_known_miss("what is the weather in paris", casual)["response"] == "dunno"
+        assert cache.get_known_miss("what is the weather in paris")["response"] == "not sure"
+
+        cache.add_to_cache("What is the weather in Paris", {"intent": "test", "meta": {}})
+        assert cache.get_known_miss("What is the weather in Paris?") is None, "Cached questions are no longer misses"
+
+        cache.record_miss("Who is the CEO?", {"response": "unknown", "meta": {}})
+        cache.on_knowledge_change("removed", "file-1")
+        assert cache.get_known_miss("Who is the CEO?") is None, "Knowledge-base changes should clear known misses"
+        print("   ✅ Known misses resolve by key and are invalidated by new answers")
+
+
+def test_single_store_sync_per_request():
+    """The known-miss check and the cache lookup of one request poll the shared store once."""
+    print("🧪 Testing one store sync per request")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OfflineAnswerCache(Path(tmp_dir) / "answer_cache.json")
+        cache.add_to_cache("What is HealthAssist?", {"intent": "test", "meta": {}})
+        polls = []
+        poll_changes = cache.store.poll_changes
+        cache.store.poll_changes = lambda: polls.append(1) or poll_changes()
+
+        assert cache.get_known_miss("What is HealthAssist?") is None
+        hit = asyncio.run(cache.aget_cached_answer("What is HealthAssist?", sync=False))
+        assert hit is not None and len(polls) == 1, "The lookup should reuse the known-miss check's sync"
+        print("   ✅ Store polled once per /analyze request")
+
+
+if __name__ == "__main__":
+    test_worth_analyzing_gate()
+    test_negative_cache_ttl_and_lru()
+    test_answer_cache_known_misses()
+    test_single_store_sync_per_request()
+    print("\n🎉 All negative cache tests passed!")
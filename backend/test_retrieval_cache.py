@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Test the retrieval-result cache, batched search, index types, storage precision and file removal of the vector database.
+"""
+
+import asyncio
+import pickle
+import sys
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import faiss
+import numpy as np
+
+from app.config import EMBEDDING_DIMENSION
+from app.utils import query_embedding as query_embedding_module
+from app.utils import vector_db_manager as vector_db_module
+from app.utils.embedding_memo import EmbeddingMemo
+from cache_test_helpers import CountingEmbeddings
+
+
+def fake_vector(text: str) -> list:
+    rng = np.random.default_rng(sum(map(ord, text.lower())))
+    return rng.standard_normal(EMBEDDING_DIMENSION).tolist()
+
+
+@contextmanager
+def offline_vector_db(precision: str = "float32", index_type: str = "flat"):
+    """Point the vector DB at a temporary directory and a fake embeddings client."""
+    names = ["INDEX_PATH", "METADATA_PATH", "FILE_REGISTRY_PATH", "CHUNK_VECTORS_PATH",
+             "VECTOR_DB_PRECISION", "VECTOR_DB_INDEX_TYPE", "client"]
+    original = {name: getattr(vector_db_module, name) for name in names}
+    original_client, original_memo = query_embedding_module.client, query_embedding_module.query_embedding_memo
+    fake_embeddings = CountingEmbeddings(fake_vector)
+    query_embedding_module.client = SimpleNamespace(embeddings=fake_embeddings)
+    query_embedding_module.query_embedding_memo = EmbeddingMemo()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in names[:4]:
+                setattr(vector_db_module, name, Path(tmp_dir) / Path(str(original[name])).name)
+            vector_db_module.VECTOR_DB_PRECISION = precision
+            vector_db_module.VECTOR_DB_INDEX_TYPE = index_type
+            vector_db_module.client = SimpleNamespace(embeddings=fake_embeddings)
+            yield fake_embeddings
+    finally:
+        for name, value in original.items():
+            setattr(vector_db_module, name, value)
+        query_embedding_module.client, query_embedding_module.query_embedding_memo = original_client, original_memo
+
+
+def test_retrieval_cache_and_generation():
+    """Repeated queries reuse search results until the index changes."""
+    print("🧪 Testing retrieval cache and index generation")
+
+    async def scenario(fake_embeddings):
+        manager = vector_db_module.VectorDBManager()
+        content = "HealthAssist integrates with Epic and Cerner. " * 40
+        assert await manager.add_file_to_database("file-1", content, {"original_filename": "a.txt"})
+
+        first = await manager.search_similar_chunks("What is HealthAssist?", k=3)
+        calls = fake_embeddings.calls
+        second = await manager.search_similar_chunks("what is  healthassist", k=3)
+        assert fake_embeddings.calls == calls, "Near-duplicate query should skip the embedding"
+        assert [r["chunk_id"] for r in first] == [r["chunk_id"] for r in second]
+        stats = manager.get_database_stats()["retrieval_cache"]
+        assert stats["hits"] == 1 and stats["size"] == 1
+        print("   ✅ Near-duplicate query served from the retrieval cache")
+
+        generation = manager.generation
+        assert await manager.add_file_to_database("file-2", "Pricing is per conversation. " * 40, {})
+        assert manager.generation > generation and not manager._retrieval_cache
+        await manager.search_similar_chunks("What is HealthAssist?", k=3)
+        assert manager.get_database_stats()["retrieval_cache"]["misses"] == 2
+        print("   ✅ Index changes invalidate cached results")
+
+    with offline_vector_db() as fake_embeddings:
+        asyncio.run(scenario(fake_embeddings))
+
+
+def test_quantized_vector_search():
+    """int8 and float16 indexes re-rank to the same hits as the float32 index, in less memory."""
+    print("🧪 Testing quantized vector search")
+
+    contents = {f"file-{i}": " ".join(f"Topic {i} sentence {j}." for j in range(150)) for i in range(4)}
+    queries = ["What is topic 1?", "Tell me about sentence 7", "pricing"]
+
+    async def search_all():
+        manager = vector_db_module.VectorDBManager()
+        for file_id, content in contents.items():
+            assert await manager.add_file_to_database(file_id, content, {})
+        results = [[(r["chunk_id"], round(r["distance"], 3)) for r in await manager.search_similar_chunks(q, k=3)]
+                   for q in queries]
+        return results, manager.get_database_stats()["index_bytes"], manager
+
+    with offline_vector_db("float32"):
+        exact, exact_bytes, _ = asyncio.run(search_all())
+    for precision in ["float16", "int8"]:
+        with offline_vector_db(precision):
+            results, index_bytes, manager = asyncio.run(search_all())
+            assert results == exact, f"{precision} results should be re-ranked at full precision"
+            assert index_bytes * (2 if precision == "float16" else 4) == exact_bytes
+            assert manager.chunk_vectors.shape[0] == manager.index.ntotal
+
+            reloaded = vector_db_module.VectorDBManager()
+            assert reloaded.index.ntotal == manager.index.ntotal and reloaded.chunk_vectors is not None
+    print("   ✅ Quantized indexes return the float32 hits")
+
+    with offline_vector_db("float32"):
+        asyncio.run(search_all())
+        vector_db_module.CHUNK_VECTORS_PATH.unlink()
+        vector_db_module.VECTOR_DB_PRECISION = "int8"
+        converted = vector_db_module.VectorDBManager()
+        assert converted.get_database_stats()["precision"] == "int8"
+        assert converted.chunk_vectors.shape[0] == converted.index.ntotal, \
+            "Vectors should be recovered from a flat index without embedding calls"
+    print("   ✅ Existing flat indexes convert without re-embedding")
+
+
+def test_remove_file_without_reembedding():
+    """Removing a file tombstones its vectors, makes no embedding calls and compacts once removals dominate."""
+    print("🧪 Testing file removal without re-embedding")
+
+    contents = {f"file-{i}": " ".join(f"Topic {i} sentence {j}." for j in range(150)) for i in range(3)}
+    query = "Topic 2 sentence 3."
+
+    async def build(file_ids):
+        manager = vector_db_module.VectorDBManager()
+        for file_id in file_ids:
+            assert await manager.add_file_to_database(file_id, contents[file_id], {})
+        return manager
+
+    async def search(manager):
+        return [(r["chunk_id"], round(r["distance"], 2)) for r in await manager.search_similar_chunks(query, k=3)]
+
+    async def scenario(fake_embeddings, precision):
+        manager = await build(contents)
+        vectors_inode = os.stat(vector_db_module.CHUNK_VECTORS_PATH).st_ino
+        calls = fake_embeddings.calls
+        assert await manager.remove_file_from_database("file-1")
+        assert fake_embeddings.calls == calls, "Removal should not re-embed the remaining chunks"
+        chunk_metadata = manager.metadata["chunk_metadata"]
+        assert manager.live_vectors == len(chunk_metadata) and manager.removed_ids
+        assert manager.chunk_vectors.shape[0] == len(manager.vector_chunk_ids), "Removed rows stay until compaction"
+        assert os.stat(vector_db_module.CHUNK_VECTORS_PATH).st_ino == vectors_inode, \
+            "Adds and removals should not rewrite the stored vectors"
+        after = await search(manager)
+        assert after == await search(vector_db_module.VectorDBManager()), "Removal should survive a reload"
+
+        manager.compact_min_vectors = 1
+        assert await manager.remove_file_from_database("file-0")
+        assert not manager.removed_ids and manager.index.ntotal == manager.chunk_vectors.shape[0] == \
+            len(manager.vector_chunk_ids) == len(manager.metadata["chunk_metadata"]), "Removals beyond the live count compact"
+        assert sorted(info["vector_id"] for info in manager.metadata["chunk_metadata"].values()) == \
+            list(range(manager.index.ntotal))
+        assert [hit[0] for hit in await search(manager)] == [hit[0] for hit in after if hit[0].startswith("file-2")]
+        return after
+
+    for precision in ["float32", "int8"]:
+        with offline_vector_db(precision) as fake_embeddings:
+            after = asyncio.run(scenario(fake_embeddings, precision))
+        with offline_vector_db(precision):
+            expected = asyncio.run(search(asyncio.run(build(["file-0", "file-2"]))))
+        assert after == expected, f"{precision} rows should stay aligned with their chunks"
+    print("   ✅ Remaining chunks stay searchable and aligned after a removal")
+
+
+def test_vector_id_mapping():
+    """Chunks keep their vector id across removals, and legacy row-numbered indexes are migrated."""
+    print("🧪 Testing vector id <-> chunk id mapping")
+
+    contents = {f"file-{i}": " ".join(f"Topic {i} sentence {j}." for j in range(150)) for i in range(3)}
+
+    async def scenario():
+        manager = vector_db_module.VectorDBManager()
+        for file_id, content in contents.items():
+            assert await manager.add_file_to_database(file_id, content, {})
+        vector_id = manager.metadata["chunk_metadata"]["file-2_chunk_0"]["vector_id"]
+        assert await manager.remove_file_from_database("file-0")
+        assert manager.metadata["chunk_metadata"]["file-2_chunk_0"]["vector_id"] == vector_id
+        assert manager.vector_chunk_ids[vector_id] == "file-2_chunk_0" and manager.vector_chunk_ids[0] is None
+        assert await manager.add_file_to_database("file-3", "Pricing is per conversation. " * 40, {})
+        assert manager.metadata["chunk_metadata"]["file-3_chunk_0"]["vector_id"] == \
+            len(manager.vector_chunk_ids) - manager.file_registry["file-3"]["chunk_count"], "Vector ids are never reused"
+
+        chunk_text = manager.metadata["document_content"]["file-2_chunk_1"]
+        results = await manager.search_similar_chunks(chunk_text, k=2)
+        assert results[0]["chunk_id"] == "file-2_chunk_1" and results[0]["distance"] < 1e-3
+        print("   ✅ Vector ids stay stable and resolve directly to chunk ids")
+
+        # Earlier databases stored the vectors in index row order, without removed rows
+        manager._index_stored_vectors()
+        manager.save_database()
+        np.save(vector_db_module.CHUNK_VECTORS_PATH, manager.chunk_vectors[manager._vector_ids_by_row()])
+        reloaded = vector_db_module.VectorDBManager()
+        assert reloaded.chunk_vectors.shape[0] == len(reloaded.vector_chunk_ids)
+        vector_id = reloaded.metadata["chunk_metadata"]["file-2_chunk_1"]["vector_id"]
+        assert np.allclose(reloaded.chunk_vectors[vector_id], fake_vector(chunk_text))
+        print("   ✅ Row-ordered vector files are rearranged by vector id")
+
+    with offline_vector_db():
+        asyncio.run(scenario())
+
+    with offline_vector_db():
+        # A database written before vector ids: plain flat index, rows in metadata order
+        content = {f"legacy_{i}": f"Legacy knowledge chunk {i}" for i in range(5)}
+        index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+        index.add(np.array([fake_vector(text) for text in content.values()], dtype=np.float32))
+        faiss.write_index(index, str(vector_db_module.INDEX_PATH))
+        with open(vector_db_module.METADATA_PATH, "wb") as f:
+            pickle.dump({"document_content": content, "chunk_metadata": {}}, f)
+
+        manager = vector_db_module.VectorDBManager()
+        assert isinstance(manager.index, faiss.IndexIDMap2) and manager.vector_chunk_ids == list(content)
+        results = asyncio.run(manager.search_similar_chunks("Legacy knowledge chunk 3", k=1))
+        assert results[0]["chunk_id"] == "legacy_3"
+        assert isinstance(vector_db_module.VectorDBManager().index, faiss.IndexIDMap2), "Migration should be saved"
+        print("   ✅ Legacy indexes get vector ids in their original row order")
+
+
+def test_ann_index_types():
+    """HNSW and IVF indexes are built from the factories, re-scored exactly and rebuilt on removal."""
+    print("🧪 Testing approximate index types")
+
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((1000, 64)).astype(np.float32)
+    for index_type in ["hnsw", "ivf_flat"]:
+        index = vector_db_module.index_from_vectors(vectors, np.arange(1000) + 10, 64, index_type=index_type)
+        layout = vector_db_module.current_layout(index)
+        assert layout[0] == index_type and layout == vector_db_module.index_layout(1000, index_type)
+        _, found = index.search(vectors[:20], 20)
+        assert all(i + 10 in row for i, row in enumerate(found)), f"{index_type} should find the query vector"
+    # PQ codebook training is slow, so only the factory layout is checked
+    index = vector_db_module.create_index(64, 1000, index_type="ivf_pq")
+    assert vector_db_module.current_layout(index) == vector_db_module.index_layout(1000, "ivf_pq") == ("ivf_pq", "pq", 25)
+    assert vector_db_module.index_layout(100, "ivf_pq")[0] == "flat", "Too few vectors to train PQ codebooks"
+    print("   ✅ Factories build each index type and small corpora stay flat")
+
+    contents = {f"file-{i}": " ".join(f"Topic {i} sentence {j}." for j in range(150)) for i in range(3)}
+    query = "Topic 2 sentence 3."
+
+    async def build(file_ids):
+        manager = vector_db_module.VectorDBManager()
+        for file_id in file_ids:
+            assert await manager.add_file_to_database(file_id, contents[file_id], {})
+        return manager
+
+    async def search(manager):
+        return [(r["chunk_id"], round(r["distance"], 2)) for r in await manager.search_similar_chunks(query, k=3)]
+
+    async def scenario(fake_embeddings):
+        manager = await build(contents)
+        assert manager.get_database_stats()["index_type"] == "hnsw"
+        calls = fake_embeddings.calls
+        assert await manager.remove_file_from_database("file-1")
+        assert fake_embeddings.calls == calls, "Removal should make no embedding calls"
+        assert manager.live_vectors == len(manager.metadata["chunk_metadata"])
+        return await search(manager)
+
+    with offline_vector_db(index_type="hnsw") as fake_embeddings:
+        results = asyncio.run(scenario(fake_embeddings))
+    with offline_vector_db():
+        expected = asyncio.run(search(asyncio.run(build(["file-0", "file-2"]))))
+    assert results == expected, "HNSW searches should skip removed vectors and match the exact index"
+    print("   ✅ HNSW search matches the flat index and removal needs no embeddings")
+
+def test_file_scoped_search():
+    """A file filter searches only that file's vectors and returns k hits however it ranks globally."""
+    print("🧪 Testing file-scoped vector search")
+
+    contents = {f"file-{i}": " ".join(f"Topic {i} sentence {j}." for j in range(150)) for i in range(3)}
+
+    async def scenario():
+        manager = vector_db_module.VectorDBManager()
+        for file_id, content in contents.items():
+            assert await manager.add_file_to_database(file_id, content, {})
+        query = manager.metadata["document_content"]["file-0_chunk_1"]
+        chunk_count = manager.file_registry["file-2"]["chunk_count"]
+
+        results = await manager.search_similar_chunks(query, k=3, file_id="file-2")
+        assert len(results) == min(3, chunk_count) and all(r["file_id"] == "file-2" for r in results)
+        vector_ids = [manager.metadata["chunk_metadata"][f"file-2_chunk_{i}"]["vector_id"] for i in range(chunk_count)]
+        query_vec = np.asarray(fake_vector(query), dtype=np.float32)
+        exact = sorted(float(((manager.chunk_vectors[vector_id] - query_vec) ** 2).sum()) for vector_id in vector_ids)[:3]
+        assert np.allclose([r["distance"] for r in results], exact, rtol=1e-4)
+        print("   ✅ Low-ranked files still return their k nearest chunks")
+
+        manager.chunk_vectors = None
+        manager._retrieval_cache.clear()
+        selected = await manager.search_similar_chunks(query, k=3, file_id="file-2")
+        assert [r["chunk_id"] for r in selected] == [r["chunk_id"] for r in results]
+        assert await manager.search_similar_chunks(query, k=3, file_id="missing") == []
+        print("   ✅ IDSelector search gives the same hits without stored vectors")
+
+    with offline_vector_db():
+        asyncio.run(scenario())
+
+
+def test_search_many():
+    """A batch of queries is embedded in one request and returns the per-query search results."""
+    print("🧪 Testing batched multi-query search")
+
+    contents = {f"file-{i}": " ".join(f"Topic {i} sentence {j}." for j in range(150)) for i in range(3)}
+    queries = ["What is topic 1?", "Tell me about sentence 7", "pricing", "what is  topic 1"]
+
+    async def scenario(fake_embeddings):
+        manager = vector_db_module.VectorDBManager()
+        for file_id, content in contents.items():
+            assert await manager.add_file_to_database(file_id, content, {})
+
+        threads = []
+        create = fake_embeddings.create
+        fake_embeddings.create = lambda model, input: threads.append(threading.get_ident()) or create(model, input)
+        calls = fake_embeddings.calls
+        batched = await manager.search_many(queries, k=3)
+        assert fake_embeddings.calls == calls + 1, "Uncached queries should share one embeddings request"
+        assert threading.get_ident() not in threads, "The embeddings request should not block the event loop"
+        assert batched[0] == batched[3], "Near-duplicate queries should be searched once"
+        print("   ✅ Uncached queries embedded in one request")
+
+        manager._retrieval_cache.clear()
+        single = [await manager.search_similar_chunks(query, k=3) for query in queries]
+        assert [[r["chunk_id"] for r in results] for results in batched] == \
+            [[r["chunk_id"] for r in results] for results in single]
+        assert [r["distance"] for r in batched[1]] == [r["distance"] for r in single[1]]
+        print("   ✅ Batched results match per-query search")
+
+        calls = fake_embeddings.calls
+        again = await manager.search_many(queries[:2] + ["Topic 2 sentence 9."], k=3, file_id="file-2")
+        assert fake_embeddings.calls == calls + 1
+        assert all(r["file_id"] == "file-2" for results in again for r in results)
+        assert await manager.search_many(queries, k=3) == batched
+        assert fake_embeddings.calls == calls + 1, "Cached queries should skip embedding"
+        print("   ✅ Cached queries and file filters served without extra requests")
+
+    for precision in ["float32", "int8"]:
+        with offline_vector_db(precision) as fake_embeddings:
+            asyncio.run(scenario(fake_embeddings))
+
+
+if __name__ == "__main__":
+    test_retrieval_cache_and_generation()
+    test_quantized_vector_search()
+    test_remove_file_without_reembedding()
+    test_vector_id_mapping()
+    test_ann_index_types()
+    test_file_scoped_search()
+    test_search_many()
+    print("\n🎉 All retrieval cache tests passed!")
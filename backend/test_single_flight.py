@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test single-flight de-duplication of concurrent /analyze pipeline runs.
+"""
+
+import asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    """Concurrent callers with the same key await one execution and get independent copies."""
+    print("🧪 Testing single-flight sharing")
+
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def pipeline():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"response": "shared answer", "meta": {}}
+
+        results = await asyncio.gather(*(flights.run("what is healthassist", pipeline) for _ in range(5)))
+        assert calls == 1, "Only one pipeline execution should run"
+        assert [shared for _, shared in results].count(False) == 1
+        results[1][0]["meta"]["mutated"] = True
+        assert "mutated" not in results[2][0]["meta"], "Shared results should be independent copies"
+        assert len(flights) == 0, "Finished flights should be forgotten"
+
+        await flights.run("what is healthassist", pipeline)
+        assert calls == 2, "A later request should run the pipeline again"
+        other = await asyncio.gather(flights.run("a", pipeline), flights.run("b", pipeline))
+        assert calls == 4 and not any(shared for _, shared in other)
+
+    asyncio.run(scenario())
+    print("   ✅ Duplicate requests share one execution")
+
+
+def test_errors_and_cancellation():
+    """Errors reach every caller; a cancelled caller does not cancel the shared work."""
+    print("🧪 Testing single-flight errors and cancellation")
+
+    async def scenario():
+        flights = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("pipeline failed")
+
+        results = await asyncio.gather(flights.run("q", failing), flights.run("q", failing), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(flights.run("q", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run("q", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ("done", True)
+
+    asyncio.run(scenario())
+    print("   ✅ Errors propagate and cancellation is isolated")
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_execution()
+    test_errors_and_cancellation()
+    print("\n🎉 All single-flight tests passed!")